@@ -16,6 +16,10 @@ corepack enable
 echo "📥 Installing dependencies..."
 yarn install --frozen-lockfile --network-timeout 100000
 
+# Export the agent catalog to public/catalog (needs the packages in uagents/requirements.txt)
+echo "📚 Exporting agent catalog..."
+python3 uagents/export_catalog.py --prune
+
 # Clean previous build
 echo "🧹 Cleaning previous build..."
 rm -rf .next
@@ -1,3 +1,5 @@
+const fs = require('fs');
+const path = require('path');
 const { version } = require('./package.json');
 const { withSentryConfig } = require('@sentry/nextjs');
 const withBundleAnalyzer = require('@next/bundle-analyzer')({
@@ -67,6 +69,39 @@ const securityHeaders = [
     : []),
 ];
 
+// === Catalog Bundles ===
+
+// uagents/export_catalog.py writes every catalog file with precompressed variants next to it. The manifest
+// lists the encodings it wrote, so only variants that exist are served. Most preferred first.
+const CATALOG_ENCODINGS = [
+  { name: 'br', extension: 'br' },
+  { name: 'gzip', extension: 'gz' },
+];
+
+function exportedCatalogEncodings() {
+  try {
+    const manifest = JSON.parse(
+      fs.readFileSync(path.join(__dirname, 'public', 'catalog', 'manifest.json'), 'utf8'),
+    );
+    return CATALOG_ENCODINGS.filter(({ name }) => manifest.encodings.includes(name));
+  } catch (error) {
+    return [];
+  }
+}
+
+// Requests for /catalog/*.json that accept an encoding get its precompressed file; clients that accept a
+// more preferred one are left to that encoding's rule
+function catalogEncodingRules() {
+  const encodings = exportedCatalogEncodings();
+  return encodings.map((encoding, i) => ({
+    encoding,
+    has: [{ type: 'header', key: 'accept-encoding', value: `.*\\b${encoding.name}\\b.*` }],
+    missing: encodings
+      .slice(0, i)
+      .map(({ name }) => ({ type: 'header', key: 'accept-encoding', value: `.*\\b${name}\\b.*` })),
+  }));
+}
+
 // === Solana Bootstrap Code ===
 
 const bootstrapSchema = borsh.struct([
@@ -371,8 +406,42 @@ const createNextConfig = async () => {
           source: '/(.*)',
           headers: securityHeaders,
         },
+        // Catalog bundles from uagents/export_catalog.py are content-hashed; only the manifest changes in place
+        {
+          source: '/catalog/:path*',
+          headers: [{ key: 'Cache-Control', value: 'public, max-age=31536000, immutable' }],
+        },
+        {
+          source: '/catalog/manifest.json',
+          headers: [{ key: 'Cache-Control', value: 'public, max-age=60, stale-while-revalidate=300' }],
+        },
+        // Matched on the requested .json path, before the rewrites below swap in the compressed file
+        ...catalogEncodingRules().map(({ encoding, has, missing }) => ({
+          source: '/catalog/:file*.json',
+          has,
+          missing,
+          headers: [
+            { key: 'Content-Encoding', value: encoding.name },
+            { key: 'Content-Type', value: 'application/json; charset=utf-8' },
+          ],
+        })),
+        {
+          source: '/catalog/:file*.json',
+          headers: [{ key: 'Vary', value: 'Accept-Encoding' }],
+        },
       ];
     },
+    async rewrites() {
+      return {
+        // beforeFiles, because the uncompressed file in public/ would otherwise be served first
+        beforeFiles: catalogEncodingRules().map(({ encoding, has, missing }) => ({
+          source: '/catalog/:file*.json',
+          has,
+          missing,
+          destination: `/catalog/:file*.json.${encoding.extension}`,
+        })),
+      };
+    },
     typescript: { ignoreBuildErrors: true },
     eslint: { ignoreDuringBuilds: true },
   };
@@ -0,0 +1,60 @@
+from collections import OrderedDict, deque
+
+
+class AdmissionController:
+    """
+    Bound the number of chat turns waiting on the LLM at once.
+    Turns beyond max_in_flight, and turns in a session whose previous turn is still in flight, wait in
+    per-sender queues that are served round-robin, so one chatty sender can't starve everyone else;
+    beyond max_queued they are shed.
+    """
+
+    def __init__(self, max_in_flight: int = 32, max_queued: int = 64):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.in_flight = set()
+        # sender -> deque of queued items, in round-robin order
+        self.queues = OrderedDict()
+        self.queued = 0
+
+    def try_admit(self, session_id: str) -> bool:
+        """Take a slot for a session's turn; a session's next turn waits until its current one is released"""
+        if session_id in self.in_flight or len(self.in_flight) >= self.max_in_flight:
+            return False
+        self.in_flight.add(session_id)
+        return True
+
+    def enqueue(self, sender: str, session_id: str, item) -> bool:
+        """Queue an item for later admission; returns False if the queue is full"""
+        if self.queued >= self.max_queued:
+            return False
+        if sender not in self.queues:
+            self.queues[sender] = deque()
+        self.queues[sender].append((session_id, item))
+        self.queued += 1
+        return True
+
+    def release(self, session_id: str) -> list:
+        """Free a session's slot and admit queued items in its place, returning them"""
+        if session_id not in self.in_flight:
+            return []
+        self.in_flight.discard(session_id)
+
+        admitted = []
+        for sender in list(self.queues):
+            if len(self.in_flight) >= self.max_in_flight:
+                break
+            queue = self.queues[sender]
+            # The sender's oldest item whose session isn't still being served
+            index = next((i for i, (queued_session, _) in enumerate(queue) if queued_session not in self.in_flight), None)
+            if index is None:
+                continue
+            next_session_id, item = queue[index]
+            del queue[index]
+            self.queued -= 1
+            self.in_flight.add(next_session_id)
+            admitted.append(item)
+            del self.queues[sender]
+            if queue:
+                self.queues[sender] = queue  # Back of the line for this sender's next item
+        return admitted
@@ -6,11 +6,43 @@ from pydantic import BaseModel
 
 from uagents import Agent, Context, Model
 from uagents.setup import fund_agent_if_low
-from uagents.experimental.quota import QuotaProtocol, RateLimit
+from uagents.experimental.quota import AccessControlList, RateLimit
 from uagents_core.models import ErrorMessage
 
-from chat_proto import chat_proto, struct_output_client_proto
-from defi_protocol import get_defi_protocol_info, DeFiProtocolRequest, DeFiProtocolResponse, DEFI_PROTOCOLS
+from chat_proto import chat_proto, struct_output_client_proto, outbound, STRUCTURED_OUTPUT_AGENT_ADDRESSES
+from resolver_cache import endpoint_resolver
+from http_pool import PooledDispenser, check_dispenser_running, install_dispenser
+from rest_api import CachingRestServer, HttpError, check_rest_server, install_rest_server
+from warm_state import restore_warm_state, save_warm_state
+from analytics import analytics
+from capture import capture_inbound, close_capture
+from loop_monitor import loop_monitor, watch_handlers
+from metrics import metrics
+from quota_ledger import QuotaLedger, WeightedQuotaProtocol
+from dedup import MessageDedupCache
+from catalog import CatalogPager, InvalidCursor, entry_to_dict
+from compact import CompactDeFiProtocolRequest, CompactProtocolInfoRequest, CompactResponse, compact_response, negotiate
+from defi_protocol import (
+    get_defi_protocol_info,
+    query_protocols,
+    rank_protocols,
+    resolve_protocol_locally,
+    render_protocol,
+    DeFiProtocolRequest,
+    DeFiProtocolResponse,
+    ProtocolQueryRequest,
+    ProtocolQueryResponse,
+    DEFI_CATALOG,
+)
+from model import (
+    PagedProtocolsListRequest,
+    PagedProtocolsListResponse,
+    ProtocolInfoRequest,
+    ProtocolInfoResponse,
+    ProtocolsListRequest,
+    ProtocolsListResponse,
+)
+from wire_cache import WirePayloadCache, EncodedMessage, encode_message, json_fragment, schema_digest, send_encoded
 
 # Get environment variables or use defaults
 AGENT_NAME = os.getenv("UAGENT_NAME", "emrys-defi-agent")
@@ -26,6 +58,35 @@ if not RAILWAY_URL.startswith(("http://", "https://")):
     RAILWAY_URL = f"https://{RAILWAY_URL}"
 AGENT_ENDPOINT = f"{RAILWAY_URL}/submit"
 
+# Quota usage is kept in memory and snapshotted to this file periodically
+QUOTA_SNAPSHOT_PATH = os.getenv("QUOTA_SNAPSHOT_PATH", "quota_snapshot.json")
+QUOTA_SNAPSHOT_SECONDS = float(os.getenv("QUOTA_SNAPSHOT_SECONDS", "30"))
+
+# Front agents (front_agent.py) that forward requests for many clients; they enforce quotas themselves
+TRUSTED_FRONT_ADDRESSES = {a.strip() for a in os.getenv("TRUSTED_FRONT_ADDRESSES", "").split(",") if a.strip()}
+
+# Caches, latency history and pending chat turns are saved here on shutdown and restored on startup
+WARM_STATE_PATH = os.getenv("WARM_STATE_PATH", "warm_state.json")
+
+# How often pinned destinations (the LLM agents) are checked for endpoints about to expire
+RESOLVER_REFRESH_INTERVAL_SECONDS = float(os.getenv("RESOLVER_REFRESH_INTERVAL_SECONDS", "30"))
+
+# Outbound envelope delivery over a shared keep-alive connection pool
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))  # Open connections across all hosts
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "16"))  # Open connections to any one host
+HTTP_DNS_TTL_SECONDS = int(os.getenv("HTTP_DNS_TTL_SECONDS", "300"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))  # Idle time before a pooled connection is closed
+HTTP_MAX_CONCURRENT_ENVELOPES = int(os.getenv("HTTP_MAX_CONCURRENT_ENVELOPES", "32"))
+
+# Protocol list pagination
+PROTOCOLS_PAGE_SIZE = int(os.getenv("PROTOCOLS_PAGE_SIZE", "50"))  # Entries per page when the client sets no limit
+PROTOCOLS_MAX_PAGE_SIZE = int(os.getenv("PROTOCOLS_MAX_PAGE_SIZE", "200"))  # Upper bound on a client-requested limit
+
+# Read-only catalog routes on the agent's HTTP port, sized for a CDN or browser cache in front
+REST_CACHE_MAX_AGE_SECONDS = int(os.getenv("REST_CACHE_MAX_AGE_SECONDS", "60"))
+REST_STALE_WHILE_REVALIDATE_SECONDS = int(os.getenv("REST_STALE_WHILE_REVALIDATE_SECONDS", "300"))
+REST_SEARCH_LIMIT = int(os.getenv("REST_SEARCH_LIMIT", "10"))  # Results returned by /search when no limit is given
+
 print(f"Agent endpoint configured as: {AGENT_ENDPOINT}")
 print(f"Agent will run on port: {PORT}")
 
@@ -34,95 +95,356 @@ agent = Agent(
     name=AGENT_NAME,
     port=PORT,
     endpoint=[AGENT_ENDPOINT],
+    resolve=endpoint_resolver,
+)
+
+# uagents' default dispenser opens a new HTTP session per envelope and sends one envelope at a time
+install_dispenser(agent, PooledDispenser(
+    limit=HTTP_POOL_LIMIT,
+    limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+    dns_ttl_seconds=HTTP_DNS_TTL_SECONDS,
+    keepalive_seconds=HTTP_KEEPALIVE_SECONDS,
+    max_concurrency=HTTP_MAX_CONCURRENT_ENVELOPES,
+))
+
+# Serve cacheable GET routes alongside the envelope endpoint and the uagents REST handlers
+rest_server = CachingRestServer(
+    port=PORT,
+    loop=agent._loop,
+    queries=agent._queries,
+    logger=agent._logger,
+    max_age_seconds=REST_CACHE_MAX_AGE_SECONDS,
+    stale_while_revalidate_seconds=REST_STALE_WHILE_REVALIDATE_SECONDS,
 )
+install_rest_server(agent, rest_server)
 
 # Create protocol for DeFi protocol information
-proto = QuotaProtocol(
-    storage_reference=agent.storage,
+# Handlers share a budget of 60 cost units per sender per hour; each handler declares its cost
+quota_ledger = QuotaLedger(QUOTA_SNAPSHOT_PATH)
+# Recently answered requests, so retried messages get the same reply without repeating the work or being charged
+request_dedup = MessageDedupCache("requests")
+
+# Catalog replies never change between catalog reloads, so their JSON is encoded once and reused
+wire_cache = WirePayloadCache()
+protocols_pager = CatalogPager(max_page_size=PROTOCOLS_MAX_PAGE_SIZE)
+
+proto = WeightedQuotaProtocol(
+    quota_ledger,
     name="Emrys-Solana-Cosmos-DeFi-Protocol-Education",
     version="0.1.0",
-    default_rate_limit=RateLimit(window_size_minutes=60, max_requests=30),
+    default_rate_limit=RateLimit(window_size_minutes=60, max_requests=60),
+    default_acl=AccessControlList(default=True, bypass_rate_limit=set(TRUSTED_FRONT_ADDRESSES)),
+)
+# Version 0.2.0 answers the same questions with msgpack-encoded, compressed replies (see compact.py).
+# Clients that only know 0.1.0 keep getting plain JSON. Both versions charge the same quota budget.
+proto_v2 = WeightedQuotaProtocol(
+    quota_ledger,
+    name="Emrys-Solana-Cosmos-DeFi-Protocol-Education",
+    version="0.2.0",
+    default_rate_limit=RateLimit(window_size_minutes=60, max_requests=60),
+    default_acl=proto.default_acl,
 )
 
-# Create protocol info request/response models for agent messaging
-class ProtocolInfoRequest(Model):
-    protocol_name: str
-
-class ProtocolInfoResponse(Model):
+class MetricsResponse(Model):
     timestamp: int
-    protocol_name: str
-    information: str
-    agent_address: str
+    metrics: dict
 
-class ProtocolsListRequest(Model):
-    pass
-
-class ProtocolsListResponse(Model):
-    timestamp: int
-    protocols: dict
-    count: int
+# Registered first, so a uagents release that stopped using the swapped-in internals is reported at once
+@agent.on_event("startup")
+async def check_uagents_internals(ctx: Context):
+    check_dispenser_running(ctx, agent)
+    check_rest_server(agent, rest_server)
 
 # Define health check endpoint handler
 @agent.on_event("startup")
 async def startup(ctx: Context):
     ctx.logger.info("Agent started successfully")
+    loop_monitor.start()
+    restored = await restore_warm_state(WARM_STATE_PATH, ctx)
+    if restored is not None:
+        ctx.logger.info(
+            f"Restored warm state after {restored['downtime_seconds']:.1f}s down: "
+            f"{restored['requeued_turns']} pending chat turns requeued, {restored['resolved_endpoints']} resolved endpoints"
+        )
+    # Resolve the LLM agents' endpoints before the first chat turn needs them
+    endpoint_resolver.warm(STRUCTURED_OUTPUT_AGENT_ADDRESSES)
 
-# Define protocol info endpoint handler
-@proto.on_message(ProtocolInfoRequest, replies={ProtocolInfoResponse, ErrorMessage})
-async def get_protocol_info(ctx: Context, sender: str, msg: ProtocolInfoRequest):
-    ctx.logger.info(f"Received protocol info request for {msg.protocol_name}")
+@agent.on_event("shutdown")
+async def shutdown(ctx: Context):
+    quota_ledger.snapshot()
+    # Deliver replies still waiting in the outbound queues
+    await outbound.join()
+    state = save_warm_state(WARM_STATE_PATH, ctx.storage)
+    ctx.logger.info(f"Saved warm state with {len(state['pending_turns'])} pending chat turns")
+    await analytics.close()
+    await close_capture()
+    await loop_monitor.stop()
+
+@proto.on_interval(period=RESOLVER_REFRESH_INTERVAL_SECONDS)
+async def refresh_endpoints(ctx: Context):
+    endpoint_resolver.refresh_expiring()
+
+@proto.on_interval(period=QUOTA_SNAPSHOT_SECONDS)
+async def snapshot_quota_usage(ctx: Context):
+    quota_ledger.snapshot()
+
+# Expose in-process performance metrics over the agent's HTTP port
+@agent.on_rest_get("/metrics", MetricsResponse)
+async def get_metrics(ctx: Context) -> MetricsResponse:
+    return MetricsResponse(timestamp=int(time.time()), metrics=metrics.snapshot())
+
+def _int_param(query: dict, name: str, default=None):
     try:
-        information = await get_defi_protocol_info(msg.protocol_name)
-        ctx.logger.info(f"Retrieved information for {msg.protocol_name}")
-        
-        response = ProtocolInfoResponse(
-            timestamp=int(time.time()),
-            protocol_name=msg.protocol_name,
-            information=information,
-            agent_address=agent.address
+        return int(query[name]) if name in query else default
+    except ValueError:
+        raise HttpError(400, f"{name} must be an integer")
+
+def _limit_param(query: dict, default: int) -> int:
+    limit = _int_param(query, "limit", default)
+    if limit < 1:
+        raise HttpError(400, "limit must be at least 1")
+    return min(limit, PROTOCOLS_MAX_PAGE_SIZE)
+
+# Bodies carry no timestamp, so they (and their ETags) only change when the catalog does
+@rest_server.get(r"/protocols")
+async def rest_protocols_list(query: dict) -> str:
+    limit = _limit_param(query, PROTOCOLS_PAGE_SIZE)
+    cursor = query.get("cursor")
+    try:
+        version, items, next_cursor = protocols_pager.page(DEFI_CATALOG, limit, cursor)
+    except InvalidCursor as err:
+        raise HttpError(400, str(err))
+    
+    def build_page() -> str:
+        return json_fragment(
+            {"protocols": dict(items), "count": len(items), "catalog_version": version, "next_cursor": next_cursor}
         )
-        
-        await ctx.send(sender, response)
+    
+    if limit == PROTOCOLS_PAGE_SIZE:
+        return wire_cache.get(("rest_protocols", version, cursor), build_page)
+    return build_page()
+
+@rest_server.get(r"/protocols/(?P<name>[^/]+)")
+async def rest_protocol_info(query: dict, name: str) -> str:
+    key = name.lower() if name.lower() in DEFI_CATALOG else resolve_protocol_locally(name)
+    if key is None:
+        raise HttpError(404, await get_defi_protocol_info(name))
+    
+    return wire_cache.get(
+        ("rest_protocol", key),
+        lambda: json_fragment(
+            {"key": key, **entry_to_dict(DEFI_CATALOG[key]), "information": render_protocol(DEFI_CATALOG[key])}
+        ),
+    )
+
+@rest_server.get(r"/search")
+async def rest_search(query: dict) -> str:
+    text = query.get("q", "").strip()
+    filters = {
+        "ecosystem": query.get("ecosystem"),
+        "category": query.get("category"),
+        "blockchain": query.get("blockchain"),
+        "launched_year": _int_param(query, "launched_year"),
+    }
+    if not text and all(value is None for value in filters.values()):
+        raise HttpError(400, "Provide q and/or at least one of ecosystem, category, blockchain, launched_year")
+    limit = _limit_param(query, REST_SEARCH_LIMIT)
+    
+    filtered = query_protocols(**filters) if any(value is not None for value in filters.values()) else None
+    if text:
+        # With filters, rank the whole catalog so the filter can't leave fewer than limit results
+        k = len(DEFI_CATALOG) if filtered is not None else limit
+        allowed = set(filtered) if filtered is not None else None
+        ranked = [match for match in rank_protocols([text], k)[0] if allowed is None or match.key in allowed]
+        results = [(match.key, round(match.score, 4)) for match in ranked[:limit]]
+    else:
+        results = [(key, None) for key in filtered[:limit]]
+    
+    return json_fragment({
+        "results": [
+            {
+                "key": key,
+                "name": DEFI_CATALOG[key].name,
+                "category": DEFI_CATALOG[key].category,
+                "ecosystem": DEFI_CATALOG[key].ecosystem,
+                "score": score,
+            }
+            for key, score in results
+        ],
+        "count": len(results),
+    })
+
+def encoded_information(key: str) -> str:
+    """JSON-encoded rendering of a catalog entry"""
+    return wire_cache.get(("information", key), lambda: json_fragment(render_protocol(DEFI_CATALOG[key])))
+
+async def catalog_reply(ctx: Context, msg, description: str, encode) -> EncodedMessage:
+    """
+    Answer a request for msg.protocol_name. encode(ctx, msg, key, information) builds the reply: key is the
+    catalog key when the name is one (information is then None), otherwise information is the looked-up text.
+    Failures are answered with an ErrorMessage.
+    """
+    ctx.logger.info(f"Received {description} request for {msg.protocol_name}")
+    try:
+        key = msg.protocol_name.lower()
+        if key in DEFI_CATALOG:
+            response = encode(ctx, msg, key, None)
+        else:
+            response = encode(ctx, msg, None, await get_defi_protocol_info(msg.protocol_name))
+        ctx.logger.info(f"Retrieved information for {msg.protocol_name}")
+        return response
     except Exception as err:
-        ctx.logger.error(f"Error retrieving protocol info: {err}")
-        await ctx.send(sender, ErrorMessage(error=str(err)))
+        ctx.logger.error(f"Error retrieving {description}: {err}")
+        return encode_message(ErrorMessage(error=str(err)))
+
+def info_reply(ctx: Context, msg: ProtocolInfoRequest, key, information) -> EncodedMessage:
+    information = encoded_information(key) if key else json_fragment(information)
+    # Same layout as ProtocolInfoResponse.model_dump_json(); only the timestamp and echoed name vary per reply
+    return EncodedMessage(
+        schema_digest(ProtocolInfoResponse),
+        f'{{"timestamp": {int(time.time())}, "protocol_name": {json_fragment(msg.protocol_name)}, '
+        f'"information": {information}, "agent_address": {json_fragment(ctx.agent.address)}}}',
+    )
+
+def results_reply(ctx: Context, msg: DeFiProtocolRequest, key, information) -> EncodedMessage:
+    if key:
+        return EncodedMessage(schema_digest(DeFiProtocolResponse), f'{{"results": {encoded_information(key)}}}')
+    return encode_message(DeFiProtocolResponse(results=information))
+
+def compact_info_reply(ctx: Context, msg: CompactProtocolInfoRequest, key, information) -> EncodedMessage:
+    compression = negotiate(msg.accept_encoding)
+    reply = ProtocolInfoResponse(
+        timestamp=int(time.time()),
+        protocol_name=msg.protocol_name,
+        information=render_protocol(DEFI_CATALOG[key]) if key else information,
+        agent_address=ctx.agent.address,
+    )
+    response = encode_message(compact_response(reply, compression))
+    metrics.increment("compact_replies_total", compression=compression or "none")
+    return response
+
+def compact_results_reply(ctx: Context, msg: CompactDeFiProtocolRequest, key, information) -> EncodedMessage:
+    compression = negotiate(msg.accept_encoding)
+    if key:
+        # Catalog replies carry no timestamp, so each is compressed once per compression
+        body = wire_cache.get(
+            ("compact_results", key, compression),
+            lambda: encode_message(
+                compact_response(DeFiProtocolResponse(results=render_protocol(DEFI_CATALOG[key])), compression)
+            ).body,
+        )
+        response = EncodedMessage(schema_digest(CompactResponse), body)
+    else:
+        response = encode_message(compact_response(DeFiProtocolResponse(results=information), compression))
+    metrics.increment("compact_replies_total", compression=compression or "none")
+    return response
+
+# Define protocol info endpoint handler
+@proto.on_message(ProtocolInfoRequest, replies={ProtocolInfoResponse, ErrorMessage}, cost=1.0, dedup=request_dedup)
+async def get_protocol_info(ctx: Context, sender: str, msg: ProtocolInfoRequest):
+    return await catalog_reply(ctx, msg, "protocol info", info_reply)
 
 # Define protocols list endpoint handler
-@proto.on_message(ProtocolsListRequest, replies={ProtocolsListResponse})
+@proto.on_message(ProtocolsListRequest, replies={ProtocolsListResponse}, cost=0.1)
 async def get_protocols_list(ctx: Context, sender: str, msg: ProtocolsListRequest):
     ctx.logger.info("Received protocols list request")
     
-    # Extract all protocols from DEFI_PROTOCOLS dictionary
-    protocols = {k: v.get("name", k) for k, v in DEFI_PROTOCOLS.items()}
+    # Extract all protocols from the catalog records
+    protocols = wire_cache.get(
+        "protocols",
+        lambda: json_fragment({key: entry.name for key, entry in DEFI_CATALOG.items()}),
+    )
     
-    response = ProtocolsListResponse(
-        timestamp=int(time.time()),
-        protocols=protocols,
-        count=len(protocols)
+    response = EncodedMessage(
+        schema_digest(ProtocolsListResponse),
+        f'{{"timestamp": {int(time.time())}, "protocols": {protocols}, "count": {len(DEFI_CATALOG)}}}',
     )
     
-    await ctx.send(sender, response)
+    await send_encoded(ctx, sender, response)
+
+# Paginated protocols list, added in 0.2.0 so the 0.1.0 models and digest stay unchanged
+@proto_v2.on_message(PagedProtocolsListRequest, replies={PagedProtocolsListResponse, ErrorMessage}, cost=0.1)
+async def get_protocols_page(ctx: Context, sender: str, msg: PagedProtocolsListRequest):
+    ctx.logger.info(f"Received protocols page request (cursor={msg.cursor}, limit={msg.limit})")
+    
+    limit = msg.limit or PROTOCOLS_PAGE_SIZE
+    try:
+        version, items, next_cursor = protocols_pager.page(DEFI_CATALOG, limit, msg.cursor)
+    except InvalidCursor as err:
+        ctx.logger.warning(f"Rejected protocols list cursor from {sender}: {err}")
+        await send_encoded(ctx, sender, encode_message(ErrorMessage(error=str(err))))
+        return
+    
+    # Pages are fixed for a given snapshot, so everything but the timestamp is encoded once.
+    # Only default-size pages are cached, so client-chosen limits can't grow the cache without bound.
+    def build_page() -> str:
+        return (
+            f'"protocols": {json_fragment(dict(items))}, "count": {len(items)}, '
+            f'"catalog_version": {version}, "next_cursor": {json_fragment(next_cursor)}'
+        )
+    
+    if limit == PROTOCOLS_PAGE_SIZE:
+        page = wire_cache.get(("protocols_page", version, msg.cursor), build_page)
+    else:
+        page = build_page()
+    
+    response = EncodedMessage(
+        schema_digest(PagedProtocolsListResponse),
+        f'{{"timestamp": {int(time.time())}, {page}}}',
+    )
+    
+    await send_encoded(ctx, sender, response)
+
+# Filtered protocol discovery, answered from the catalog's secondary indexes; added in 0.2.0 like paging
+@proto_v2.on_message(ProtocolQueryRequest, replies={ProtocolQueryResponse}, cost=0.1)
+async def query_protocols_handler(ctx: Context, sender: str, msg: ProtocolQueryRequest):
+    ctx.logger.info(
+        f"Received protocol query: ecosystem={msg.ecosystem}, category={msg.category}, "
+        f"blockchain={msg.blockchain}, launched_year={msg.launched_year}"
+    )
+    
+    keys = query_protocols(
+        ecosystem=msg.ecosystem,
+        category=msg.category,
+        blockchain=msg.blockchain,
+        launched_year=msg.launched_year,
+    )
+    
+    await ctx.send(
+        sender,
+        ProtocolQueryResponse(
+            timestamp=int(time.time()),
+            protocols={key: DEFI_CATALOG[key].name for key in keys},
+            count=len(keys),
+        ),
+    )
 
 # Original DeFi protocol info request handler
 @proto.on_message(
-    DeFiProtocolRequest, replies={DeFiProtocolResponse, ErrorMessage}
+    DeFiProtocolRequest, replies={DeFiProtocolResponse, ErrorMessage}, cost=1.0, dedup=request_dedup
 )
 async def handle_request(ctx: Context, sender: str, msg: DeFiProtocolRequest):
-    ctx.logger.info(f"Received DeFi protocol info request for {msg.protocol_name}")
-    try:
-        results = await get_defi_protocol_info(msg.protocol_name)
-        ctx.logger.info(f'Retrieved information for {msg.protocol_name}')
-        ctx.logger.info("Successfully fetched DeFi protocol information")
-        await ctx.send(sender, DeFiProtocolResponse(results=results))
-    except Exception as err:
-        ctx.logger.error(err)
-        await ctx.send(sender, ErrorMessage(error=str(err)))
+    return await catalog_reply(ctx, msg, "DeFi protocol info", results_reply)
+
+@proto_v2.on_message(CompactProtocolInfoRequest, replies={CompactResponse, ErrorMessage}, cost=1.0, dedup=request_dedup)
+async def get_protocol_info_compact(ctx: Context, sender: str, msg: CompactProtocolInfoRequest):
+    return await catalog_reply(ctx, msg, "compact protocol info", compact_info_reply)
+
+@proto_v2.on_message(CompactDeFiProtocolRequest, replies={CompactResponse, ErrorMessage}, cost=1.0, dedup=request_dedup)
+async def handle_request_compact(ctx: Context, sender: str, msg: CompactDeFiProtocolRequest):
+    return await catalog_reply(ctx, msg, "compact DeFi protocol info", compact_results_reply)
 
 # Include the protocols in the agent
 agent.include(proto, publish_manifest=True)
+agent.include(proto_v2, publish_manifest=True)
 agent.include(chat_proto, publish_manifest=True)
 agent.include(struct_output_client_proto, publish_manifest=True)
 
+# Record inbound traffic for replay.py when CAPTURE_DIR is set
+capture_inbound(agent)
+# Log handlers that are slow or block the event loop
+watch_handlers(agent)
+
 if __name__ == "__main__":
     print(f"Starting agent with endpoint {AGENT_ENDPOINT}")
     print(f"HTTP API available at http://0.0.0.0:{PORT}")
@@ -0,0 +1,207 @@
+"""
+Append-only analytics event log, written as size-rotated gzip JSONL by a background task.
+
+Handlers call analytics.emit(...), which only puts the event on a bounded queue; when the queue is full
+the event is dropped and counted. Run this module to summarize a log directory offline:
+
+Usage: python uagents/analytics.py [--dir analytics] [--hours 24]
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Optional
+
+from metrics import metrics
+
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+ANALYTICS_MAX_FILE_BYTES = int(os.getenv("ANALYTICS_MAX_FILE_BYTES", str(8 * 1024 * 1024)))  # Uncompressed bytes per file before rotating
+ANALYTICS_MAX_FILES = int(os.getenv("ANALYTICS_MAX_FILES", "20"))  # Oldest files are deleted beyond this
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))  # Events waiting to be written before new ones are dropped
+
+LOGGER = logging.getLogger("analytics")
+
+
+class AnalyticsLog:
+    """
+    Bounded queue of events drained by one writer task. File I/O runs in a worker thread, so emit() never
+    waits on the disk. Each batch is flushed as a complete gzip block, so a crash loses at most the
+    events still queued.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_file_bytes: int = 8 * 1024 * 1024,
+        max_files: int = 20,
+        queue_size: int = 10000,
+        metric_prefix: str = "analytics",
+    ):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.queue_size = queue_size
+        self.metric_prefix = metric_prefix
+        self.queue: Optional[asyncio.Queue] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.file = None
+        self.file_bytes = 0
+
+    def emit(self, event: str, **fields):
+        """Queue an event for writing; drops it (and counts the drop) if the queue is full"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.writer is None or self.writer.done():
+            self.writer = asyncio.create_task(self._run())
+        try:
+            self.queue.put_nowait({"ts": round(time.time(), 3), "event": event, **fields})
+        except asyncio.QueueFull:
+            metrics.increment(f"{self.metric_prefix}_events_dropped_total", event=event)
+        metrics.set_gauge(f"{self.metric_prefix}_queue_depth", self.queue.qsize())
+
+    async def close(self):
+        """Write everything still queued and close the current file"""
+        if self.writer is not None and not self.writer.done():
+            # None tells the writer to stop once the events queued before it are written
+            await self.queue.put(None)
+            await self.writer
+        self.writer = None
+        await asyncio.to_thread(self._close_file)
+
+    def _take_batch(self, first: Optional[dict]) -> list:
+        batch = [first]
+        while first is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+            if batch[-1] is None:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._take_batch(await self.queue.get())
+            closing = batch[-1] is None
+            if closing:
+                batch.pop()
+            if batch:
+                await self._write_batch(batch)
+            if closing:
+                return
+
+    async def _write_batch(self, batch: list):
+        data = "".join(json.dumps(event, separators=(",", ":"), default=str) + "\n" for event in batch).encode()
+        try:
+            await asyncio.to_thread(self._write, data)
+            metrics.increment(f"{self.metric_prefix}_events_written_total", len(batch))
+        except Exception as err:
+            LOGGER.error(f"Failed to write {len(batch)} {self.metric_prefix} events: {err}")
+            metrics.increment(f"{self.metric_prefix}_write_errors_total")
+        metrics.set_gauge(f"{self.metric_prefix}_queue_depth", self.queue.qsize())
+
+    def _write(self, data: bytes):
+        if self.file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"events-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{time.time_ns() % 10**9:09d}.jsonl.gz"
+            self.file = gzip.open(os.path.join(self.directory, name), "wb")
+            self.file_bytes = 0
+            self._delete_old_files()
+        self.file.write(data)
+        self.file.flush()
+        self.file_bytes += len(data)
+        if self.file_bytes >= self.max_file_bytes:
+            self._close_file()
+
+    def _close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _delete_old_files(self):
+        files = sorted(glob.glob(os.path.join(self.directory, "events-*.jsonl.gz")))
+        for path in files[: max(0, len(files) - self.max_files)]:
+            os.remove(path)
+
+
+def read_events(directory: str, since: float = 0.0):
+    """Yield events from a log directory, oldest first; a file cut short by a crash is read up to the cut"""
+    for path in sorted(glob.glob(os.path.join(directory, "events-*.jsonl.gz"))):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if event.get("ts", 0) >= since:
+                        yield event
+        except (EOFError, OSError, zlib.error):
+            continue
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(events) -> dict:
+    """Protocol, outcome, fallback and LLM latency figures for a stream of events"""
+    by_event = Counter()
+    outcomes = Counter()
+    protocols = Counter()
+    latencies = defaultdict(list)
+    catalog_fallbacks = 0
+    for event in events:
+        by_event[event["event"]] += 1
+        if event["event"] == "extraction":
+            outcomes[event.get("outcome")] += 1
+            if event.get("protocol"):
+                protocols[event["protocol"].lower()] += 1
+        elif event["event"] == "llm_reply" and event.get("round_trip_seconds") is not None:
+            latencies[event["agent"]].append(event["round_trip_seconds"])
+        elif event["event"] == "fallback" and event.get("catalog_hit"):
+            catalog_fallbacks += 1
+
+    turns = by_event["extraction"] + by_event["fallback"]
+    return {
+        "events": dict(by_event),
+        "outcomes": dict(outcomes),
+        "top_protocols": protocols.most_common(10),
+        "fallbacks": by_event["fallback"],
+        "fallback_rate": round(by_event["fallback"] / turns, 4) if turns else 0.0,
+        "catalog_fallbacks": catalog_fallbacks,
+        "llm_latency_seconds": {
+            agent: {
+                "count": len(values),
+                "p50": round(_percentile(values, 50), 3),
+                "p95": round(_percentile(values, 95), 3),
+                "max": round(max(values), 3),
+            }
+            for agent, values in latencies.items()
+        },
+    }
+
+
+analytics = AnalyticsLog(
+    ANALYTICS_DIR,
+    max_file_bytes=ANALYTICS_MAX_FILE_BYTES,
+    max_files=ANALYTICS_MAX_FILES,
+    queue_size=ANALYTICS_QUEUE_SIZE,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the agent's analytics event log")
+    parser.add_argument("--dir", default=ANALYTICS_DIR, help="log directory (default: ANALYTICS_DIR)")
+    parser.add_argument("--hours", type=float, default=None, help="only events from the last N hours")
+    args = parser.parse_args()
+    since = time.time() - args.hours * 3600 if args.hours is not None else 0.0
+    print(json.dumps(summarize(read_events(args.dir, since)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
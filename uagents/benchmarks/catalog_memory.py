@@ -0,0 +1,76 @@
+"""
+Compare the memory used by the catalog as plain dicts (DEFI_PROTOCOLS style) and as CatalogEntry records.
+
+The first row is the real catalog. The others are synthetic_catalog.py catalogs, whose entries are unique
+but share a vocabulary of feature and aspect lines the way real entries do, so interning only saves
+what a loaded catalog would really repeat.
+
+Usage: python benchmarks/catalog_memory.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import build_catalog, entry_to_dict
+from defi_protocol import DEFI_CATALOG
+from synthetic_catalog import generate_catalog
+
+
+def loaded(catalog: dict) -> dict:
+    """A copy of a catalog with fresh strings, as if loaded from a file"""
+    return json.loads(json.dumps(catalog))
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return used
+
+
+def as_records(source: dict):
+    source = loaded(source)
+    return build_catalog(source)
+
+
+def measure_row(label: str) -> tuple:
+    if label == "real":
+        source = {key: entry_to_dict(entry) for key, entry in DEFI_CATALOG.items()}
+    else:
+        source = generate_catalog(int(label))
+    return len(source), measure(lambda: loaded(source)), measure(lambda: as_records(source))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--row", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.row:
+        print(json.dumps(measure_row(args.row)))
+        return
+
+    print(f"{'entries':>10} {'dicts (MiB)':>12} {'records (MiB)':>14} {'bytes/entry':>22} {'saving':>7}")
+    for label in ["real"] + [str(size) for size in args.sizes]:
+        # Each row runs in a fresh interpreter, like an agent loading its catalog at startup, so the
+        # growth of the interned string table is counted and earlier rows can't leave it pre-sized
+        row = subprocess.run([sys.executable, __file__, "--row", label], capture_output=True, text=True, check=True)
+        size, dict_bytes, record_bytes = json.loads(row.stdout)
+        per_entry = f"{dict_bytes // size} -> {record_bytes // size}"
+        saving = 1 - record_bytes / dict_bytes
+        print(f"{label:>10} {dict_bytes / 2**20:>12.2f} {record_bytes / 2**20:>14.2f} {per_entry:>22} {saving:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
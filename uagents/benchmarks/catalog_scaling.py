@@ -0,0 +1,126 @@
+"""
+Measure how catalog operations scale with catalog size, using synthetic catalogs.
+
+Times startup (building records and indexes), exact lookups, misses that fall back to suggestions,
+local query resolution, full and paginated listing, filtered queries and TF-IDF ranking.
+
+Usage: python benchmarks/catalog_scaling.py [--sizes 1000 10000 100000] [--csv out.csv] [--plot out.png]
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import defi_protocol
+from catalog import CatalogPager
+from synthetic_catalog import generate_catalog
+
+# Keep each measurement to roughly this long, however slow a single call is
+TIME_BUDGET_SECONDS = 0.5
+
+RANK_BATCH = [
+    "which protocol does liquid staking for SOL?",
+    "where can I borrow USDC",
+    "cheapest way to swap ATOM",
+    "price feeds with confidence intervals",
+    "move tokens between Ethereum and Solana",
+    "best route for a large trade",
+    "flash loans",
+    "validator delegation rewards",
+]
+
+
+def time_per_call(call) -> float:
+    """Average seconds per call, repeating until the time budget is spent"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        call()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= TIME_BUDGET_SECONDS:
+            return elapsed / calls
+
+
+def measure(size: int) -> dict:
+    source = generate_catalog(size)
+
+    start = time.perf_counter()
+    defi_protocol.reload_catalog(source)
+    startup = time.perf_counter() - start
+
+    catalog = defi_protocol.DEFI_CATALOG
+    hit = list(catalog)[size // 2]
+    alias = catalog[list(catalog)[size // 3]].aliases[-1]
+    pager = CatalogPager()
+    loop = asyncio.new_event_loop()
+
+    results = {
+        "entries": size,
+        "startup_s": startup,
+        "lookup_s": time_per_call(lambda: loop.run_until_complete(defi_protocol.get_defi_protocol_info(hit))),
+        "miss_s": time_per_call(lambda: loop.run_until_complete(defi_protocol.get_defi_protocol_info("qqzx nothing"))),
+        "resolve_s": time_per_call(lambda: defi_protocol.resolve_protocol_locally(f"how does {alias} work?")),
+        "list_all_s": time_per_call(lambda: {key: entry.name for key, entry in catalog.items()}),
+        "list_page_s": time_per_call(lambda: pager.page(catalog, 50)),
+        "filter_s": time_per_call(lambda: defi_protocol.query_protocols(ecosystem="Cosmos", launched_year=2022)),
+        "rank_s": time_per_call(lambda: defi_protocol.rank_protocols(["which protocol does liquid staking for SOL?"])),
+        "rank_batch8_s": time_per_call(lambda: defi_protocol.rank_protocols(RANK_BATCH)),
+    }
+    loop.close()
+    return results
+
+
+def plot(rows: list, path: str):
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping --plot", file=sys.stderr)
+        return
+
+    sizes = [row["entries"] for row in rows]
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for column in rows[0]:
+        if column != "entries":
+            ax.plot(sizes, [row[column] for row in rows], marker="o", label=column[:-2])
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("catalog entries")
+    ax.set_ylabel("seconds per call")
+    ax.legend()
+    fig.savefig(path, bbox_inches="tight")
+    print(f"Wrote {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--csv", help="Also write the results as CSV")
+    parser.add_argument("--plot", help="Plot the results to this image file (needs matplotlib)")
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        row = measure(size)
+        rows.append(row)
+        print(" ".join(f"{key}={value:.6f}" if isinstance(value, float) else f"{key}={value}" for key, value in row.items()))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.plot:
+        plot(rows, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare envelope size and signing cost of catalog replies as 0.1.0 JSON and as 0.2.0 CompactResponses.
+
+For every catalog entry, the ProtocolInfoResponse and DeFiProtocolResponse an agent would send are
+encoded each way, put in a signed envelope, and measured: bytes on the wire (the envelope's JSON),
+time to build the message body, and time to sign and verify the envelope.
+
+Usage: python benchmarks/compact_payloads.py [--repeat 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uagents_core.envelope import Envelope
+from uagents_core.identity import Identity
+
+from compact import COMPRESSIONS, CompactResponse, compact_response, decode_compact
+from defi_protocol import DEFI_CATALOG, DeFiProtocolResponse, render_protocol
+from model import ProtocolInfoResponse
+from wire_cache import encode_message
+
+IDENTITY = Identity.generate()
+ENCODINGS = ["0.1.0 json", "0.2.0 json"] + [f"msgpack+{compression}" for compression in COMPRESSIONS]
+
+
+def replies(key: str) -> list:
+    information = render_protocol(DEFI_CATALOG[key])
+    return [
+        ProtocolInfoResponse(timestamp=int(time.time()), protocol_name=key, information=information, agent_address=IDENTITY.address),
+        DeFiProtocolResponse(results=information),
+    ]
+
+
+def encode(reply, encoding: str):
+    if encoding == "0.1.0 json":
+        return encode_message(reply)
+    return encode_message(compact_response(reply, encoding.partition("+")[2] or None))
+
+
+def envelope_for(message) -> Envelope:
+    envelope = Envelope(
+        version=1,
+        sender=IDENTITY.address,
+        target=IDENTITY.address,
+        session=uuid.uuid4(),
+        schema_digest=message.schema_digest,
+        expires=int(time.time()) + 60,
+        nonce=1,
+    )
+    envelope.encode_payload(message.body)
+    return envelope
+
+
+def time_call(call, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="timing iterations per entry and encoding")
+    args = parser.parse_args()
+
+    sizes = {encoding: [] for encoding in ENCODINGS}
+    timings = {encoding: {"encode": [], "sign": [], "verify": []} for encoding in ENCODINGS}
+
+    print("Envelope bytes per catalog entry (ProtocolInfoResponse + DeFiProtocolResponse)")
+    print(f"  {'entry':24}" + "".join(f"{encoding:>15}" for encoding in ENCODINGS))
+    for key in DEFI_CATALOG:
+        row = {}
+        for encoding in ENCODINGS:
+            row[encoding] = 0
+            for reply in replies(key):
+                message = encode(reply, encoding)
+                if encoding != "0.1.0 json":
+                    assert decode_compact(CompactResponse.model_validate_json(message.body), type(reply)) == reply
+                envelope = envelope_for(message)
+                envelope.sign(IDENTITY)
+                row[encoding] += len(envelope.model_dump_json())
+                timings[encoding]["encode"].append(time_call(lambda: encode(reply, encoding), args.repeat))
+                timings[encoding]["sign"].append(time_call(lambda: envelope.sign(IDENTITY), args.repeat))
+                timings[encoding]["verify"].append(time_call(envelope.verify, args.repeat))
+            sizes[encoding].append(row[encoding])
+        print(f"  {key[:24]:24}" + "".join(f"{row[encoding]:>15}" for encoding in ENCODINGS))
+
+    print(f"  {'total':24}" + "".join(f"{sum(sizes[encoding]):>15}" for encoding in ENCODINGS))
+    baseline = sum(sizes["0.1.0 json"])
+    print(f"  {'vs 0.1.0':24}" + "".join(f"{sum(sizes[encoding]) / baseline:>15.1%}" for encoding in ENCODINGS))
+
+    print("\nMean time per message (us)")
+    print(f"  {'':24}" + "".join(f"{encoding:>15}" for encoding in ENCODINGS))
+    for step in ("encode", "sign", "verify"):
+        print(f"  {step:24}" + "".join(f"{statistics.mean(timings[encoding][step]) * 1e6:>15.1f}" for encoding in ENCODINGS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measure the cost of routing through the sharding front agent.
+
+Router: time per routing decision, how evenly sessions spread over the shards, and how many sessions
+move when a shard is added. End to end: round-trip time of ProtocolInfoRequest sent straight to a shard
+versus through the front, with every agent in one Bureau (so this is the front's processing overhead,
+without the extra network hop a multi-host deployment adds), one at a time and as a concurrent burst.
+The front doesn't wait for the shard in its handlers, so a burst through the front is forwarded as
+fast as the front can receive it.
+
+Usage: python benchmarks/shard_routing.py [--requests 200] [--port 8790]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import Shard, ShardRouter
+
+SESSIONS = [str(uuid.uuid4()) for _ in range(100000)]
+
+
+def time_per_call(call, calls: int = 20000) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        call(i)
+    return (time.perf_counter() - start) / calls
+
+
+def measure_router():
+    shards = [Shard(name, f"agent1{name}", ecosystems) for name, ecosystems in (
+        ("solana", ("Solana",)), ("cosmos", ("Cosmos",)), ("general", ()),
+    )]
+    router = ShardRouter(shards)
+    print("Router")
+    print(f"  for_protocol (catalog hit):   {time_per_call(lambda i: router.for_protocol('orca')) * 1e6:8.2f} us")
+    print(f"  for_protocol (free text):     {time_per_call(lambda i: router.for_protocol('how does jito work'), 2000) * 1e6:8.2f} us")
+    print(f"  for_session (new session):    {time_per_call(lambda i: router.for_session(SESSIONS[i])) * 1e6:8.2f} us")
+    print(f"  for_session (known session):  {time_per_call(lambda i: router.for_session(SESSIONS[i % 1000])) * 1e6:8.2f} us")
+
+    placement = {session: router.ring.node_for(session) for session in SESSIONS}
+    counts = [list(placement.values()).count(shard.name) for shard in shards]
+    print(f"  sessions per shard:           {counts} (stdev {statistics.pstdev(counts) / statistics.mean(counts):.1%} of mean)")
+
+    router.ring.add("extra")
+    moved = sum(router.ring.node_for(session) != shard for session, shard in placement.items())
+    print(f"  moved when adding a 4th shard: {moved / len(SESSIONS):.1%} (ideal 25.0%)")
+
+
+def measure_end_to_end(requests: int, port: int):
+    os.environ.setdefault("PORT", str(port))
+    from uagents import Agent, Bureau, Context
+
+    import agent as shard_module
+    import front_agent
+    from chat_proto import session_context
+    from model import ProtocolInfoRequest, ProtocolInfoResponse
+
+    client = Agent(name="shard-benchmark-client")
+    replies = {}
+
+    @client.on_message(ProtocolInfoResponse)
+    async def on_reply(ctx: Context, sender: str, msg: ProtocolInfoResponse):
+        future = replies.pop(str(ctx.session), None)
+        if future is not None:
+            future.set_result(time.perf_counter())
+
+    async def round_trips(ctx: Context, destination: str) -> list:
+        names = list(shard_module.DEFI_CATALOG)
+        times = []
+        for i in range(requests):
+            # The shard's duplicate-request cache would answer repeated names without doing the work
+            shard_module.request_dedup.entries.clear()
+            session_ctx = session_context(ctx, str(uuid.uuid4()))
+            future = replies[str(session_ctx.session)] = asyncio.get_running_loop().create_future()
+            start = time.perf_counter()
+            await session_ctx.send(destination, ProtocolInfoRequest(protocol_name=names[i % len(names)]))
+            times.append(await asyncio.wait_for(future, 10) - start)
+        return times
+
+    async def burst(ctx: Context, destination: str) -> float:
+        """Seconds until every reply to a burst of one request per catalog entry has arrived"""
+        shard_module.request_dedup.entries.clear()
+        futures = []
+        start = time.perf_counter()
+        for name in shard_module.DEFI_CATALOG:
+            session_ctx = session_context(ctx, str(uuid.uuid4()))
+            futures.append(replies.setdefault(str(session_ctx.session), asyncio.get_running_loop().create_future()))
+            await session_ctx.send(destination, ProtocolInfoRequest(protocol_name=name))
+        return max(await asyncio.wait_for(asyncio.gather(*futures), 30)) - start
+
+    @client.on_event("startup")
+    async def run(ctx: Context):
+        await asyncio.sleep(1)
+        results = {
+            "direct to shard": await round_trips(ctx, shard_module.agent.address),
+            "through front": await round_trips(ctx, front_agent.front.address),
+        }
+        print(f"End to end ({requests} sequential ProtocolInfoRequests, one Bureau)")
+        for label, times in results.items():
+            times = sorted(times)
+            print(
+                f"  {label:16} mean {statistics.mean(times) * 1000:7.2f} ms"
+                f"  p50 {times[len(times) // 2] * 1000:7.2f} ms  p95 {times[int(len(times) * 0.95)] * 1000:7.2f} ms"
+            )
+        overhead = statistics.mean(results["through front"]) - statistics.mean(results["direct to shard"])
+        print(f"  routing overhead: {overhead * 1000:.2f} ms per request")
+        size = len(shard_module.DEFI_CATALOG)
+        direct, fronted = await burst(ctx, shard_module.agent.address), await burst(ctx, front_agent.front.address)
+        print(f"Burst of {size} concurrent ProtocolInfoRequests")
+        print(f"  direct to shard  {direct * 1000:7.2f} ms")
+        print(f"  through front    {fronted * 1000:7.2f} ms")
+        # Exit without the agents' shutdown handlers, which would write their snapshots into the working directory
+        sys.stdout.flush()
+        os._exit(0)
+
+    front_agent.router.update([Shard("default", shard_module.agent.address)])
+    shard_module.proto.default_acl.bypass_rate_limit.update({front_agent.front.address, client.address})
+    front_agent.front_proto.default_acl.bypass_rate_limit.add(client.address)
+
+    bureau = Bureau(port=port, endpoint=[f"http://127.0.0.1:{port}/submit"])
+    for bureau_agent in (client, front_agent.front, shard_module.agent):
+        bureau.add(bureau_agent)
+    bureau.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--router-only", action="store_true", help="skip the end-to-end Bureau run")
+    args = parser.parse_args()
+    measure_router()
+    if not args.router_only:
+        measure_end_to_end(args.requests, args.port)
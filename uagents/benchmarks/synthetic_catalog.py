@@ -0,0 +1,128 @@
+"""
+Generate synthetic DeFi catalogs in the DEFI_PROTOCOLS schema, for scaling tests.
+
+Entries get unique names, plausible categories/ecosystems/launch years, feature and aspect lists drawn
+from a shared vocabulary (so, like the real catalog, many lines repeat across entries), learning
+resources and aliases. Generation is deterministic for a given size and seed.
+
+Usage: python benchmarks/synthetic_catalog.py 10000 [--seed 0] [--output catalog.json]
+"""
+import argparse
+import json
+import random
+import sys
+
+NAME_PARTS = [
+    "sol", "ray", "orca", "mar", "jup", "astro", "osmo", "nova", "flux", "terra", "lumen", "kai",
+    "zen", "aqua", "drift", "port", "mango", "quarry", "saber", "tulip", "hubble", "apri", "lido",
+    "neo", "ion", "vault", "pyra", "celo", "axi", "bolt", "cosmo", "dex", "echo", "fer", "grav",
+]
+NAME_SUFFIXES = ["", " Finance", " Protocol", " Swap", " Labs", " Network", " Markets", " Exchange", " Lend", " DAO"]
+
+# category -> (feature templates, aspect templates)
+CATEGORIES = {
+    "Lending Protocol": (
+        ["Variable interest rates based on utilization", "Isolated lending pools for long-tail assets",
+         "Flash loans for {token}", "Collateralized borrowing against {token}", "Liquidation protection alerts"],
+        ["Interest rate model with a kink at {pct}% utilization", "Oracle prices from Pyth and Switchboard",
+         "Health factor computed per obligation account", "Liquidation bonus of {pct}%"],
+    ),
+    "Decentralized Exchange (DEX)": (
+        ["Concentrated liquidity pools", "Limit orders on an on-chain order book", "Low slippage {token} swaps",
+         "Fee tiers from 0.01% to 1%", "Permissionless pool creation"],
+        ["Constant-product invariant with {pct} bps fees", "Tick-based liquidity ranges",
+         "Cross-program invocation into the token program", "Order matching in a single transaction"],
+    ),
+    "Liquid Staking": (
+        ["Liquid staking token backed by {token}", "Automatic validator delegation", "Instant unstake via liquidity pool",
+         "Staking rewards auto-compound each epoch"],
+        ["Stake pool program with {pct} validators", "Exchange rate updated every epoch",
+         "Delayed unstake through stake account deactivation"],
+    ),
+    "Oracle": (
+        ["Sub-second {token} price updates", "Confidence intervals on every price", "Pull-based price feeds"],
+        ["Aggregation across {pct} publishers", "On-chain verification of signed price messages"],
+    ),
+    "Cross-Chain Messaging": (
+        ["Token transfers between {token} and other chains", "Arbitrary message passing", "Guardian-signed attestations"],
+        ["Light client verification of {pct} validator signatures", "Relayers deliver packets between chains"],
+    ),
+    "Aggregator": (
+        ["Best-price routing across {pct} venues", "Split routes for large {token} trades", "DCA and limit orders"],
+        ["Route search over a liquidity graph", "Versioned transactions with address lookup tables"],
+    ),
+}
+ECOSYSTEMS = {
+    "Solana": ["Solana"],
+    "Cosmos": ["Osmosis", "Neutron", "Injective", "Terra", "Cosmos Hub"],
+    "Cross-Ecosystem": ["Solana, Ethereum, Cosmos", "Multi-chain", "Ethereum, Solana"],
+}
+TOKENS = ["SOL", "USDC", "ATOM", "OSMO", "ETH", "BTC", "mSOL", "JitoSOL", "INJ", "NTRN"]
+
+
+def _name(rng: random.Random, index: int) -> str:
+    stem = rng.choice(NAME_PARTS) + rng.choice(NAME_PARTS)
+    # The index keeps names (and so keys) unique at any size
+    return f"{stem.capitalize()}{index}{rng.choice(NAME_SUFFIXES)}"
+
+
+def _lines(rng: random.Random, templates: list, count: int) -> list:
+    return [
+        template.format(token=rng.choice(TOKENS), pct=rng.choice([5, 10, 20, 50, 80, 90]))
+        for template in rng.sample(templates, min(count, len(templates)))
+    ]
+
+
+def synthetic_entry(rng: random.Random, index: int) -> tuple:
+    """Return (key, entry) for one synthetic protocol"""
+    name = _name(rng, index)
+    key = name.lower().replace(" ", "_")
+    category = rng.choice(list(CATEGORIES))
+    features, aspects = CATEGORIES[category]
+    ecosystem = rng.choice(list(ECOSYSTEMS))
+    ticker = name.split()[0][:4].upper()
+
+    entry = {
+        "name": name,
+        "category": category,
+        "launched": str(rng.randint(2019, 2025)),
+        "blockchain": rng.choice(ECOSYSTEMS[ecosystem]),
+        "ecosystem": ecosystem,
+        "description": (
+            f"{name} is a {category} project in the {ecosystem} ecosystem. "
+            f"It lets users work with {rng.choice(TOKENS)} and {rng.choice(TOKENS)} while keeping custody of their assets, "
+            f"and is governed by holders of the {ticker} token."
+        ),
+        "key_features": _lines(rng, features, rng.randint(3, 5)),
+        "technical_aspects": _lines(rng, aspects, rng.randint(2, 4)),
+        "learning_resources": [
+            f"https://docs.{key.replace('_', '')}.xyz/",
+            f"https://github.com/{key.replace('_', '-')}",
+        ],
+        "aliases": [ticker.lower(), name.split()[0].lower()],
+    }
+    return key, entry
+
+
+def generate_catalog(size: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return dict(synthetic_entry(rng, index) for index in range(size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.size, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(catalog, f)
+    else:
+        json.dump(catalog, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Opt-in traffic capture, for replaying production load locally with replay.py.
+
+With CAPTURE_DIR set, every message delivered to the agent (client requests, chat turns and the LLM
+agents' replies) and every prompt sent to the LLM is appended to a gzip JSONL log in that directory,
+by the same background writer as the analytics log. Captures contain user queries verbatim.
+"""
+import os
+
+from analytics import AnalyticsLog
+
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "")  # Empty disables capture
+CAPTURE_MAX_FILE_BYTES = int(os.getenv("CAPTURE_MAX_FILE_BYTES", str(64 * 1024 * 1024)))
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "20"))
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+
+capture_log = (
+    AnalyticsLog(
+        CAPTURE_DIR,
+        max_file_bytes=CAPTURE_MAX_FILE_BYTES,
+        max_files=CAPTURE_MAX_FILES,
+        queue_size=CAPTURE_QUEUE_SIZE,
+        metric_prefix="capture",
+    )
+    if CAPTURE_DIR
+    else None
+)
+
+
+def record(event: str, **fields):
+    if capture_log is not None:
+        capture_log.emit(event, **fields)
+
+
+def capture_inbound(agent):
+    """Record every message delivered to the agent, from the network or in-process, before its handlers run"""
+    if capture_log is None:
+        return
+    handle_message = agent.handle_message
+
+    async def recording_handle_message(sender, schema_digest, message, session):
+        model = agent._models.get(schema_digest)
+        capture_log.emit(
+            "inbound",
+            sender=sender,
+            session=str(session),
+            schema_digest=schema_digest,
+            model=model.__name__ if model is not None else None,
+            payload=message,
+        )
+        await handle_message(sender, schema_digest, message, session)
+
+    agent.handle_message = recording_handle_message
+
+
+async def close_capture():
+    if capture_log is not None:
+        await capture_log.close()
@@ -0,0 +1,255 @@
+import base64
+import bisect
+import json
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogEntry:
+    """
+    Immutable, fixed-shape record for one protocol or technology.
+    Optional text fields are None and optional sections are empty tuples when absent,
+    so renderers never have to probe for keys.
+    """
+
+    key: str
+    name: str
+    category: str
+    description: str
+    key_features: tuple = ()
+    technical_aspects: tuple = ()
+    learning_resources: tuple = ()
+    launched: Optional[str] = None
+    blockchain: Optional[str] = None
+    ecosystem: Optional[str] = None
+    used_in: Optional[str] = None
+    application: Optional[str] = None
+    architecture_components: tuple = ()
+    security_features: tuple = ()
+    implementation_details: tuple = ()
+    client_functions: tuple = ()
+    # (chain, (wallet, ...)) pairs in source order
+    wallet_compatibility: tuple = ()
+    # (flow name, (step, ...)) pairs in source order
+    usage_flows: tuple = ()
+    # Other names users call the entry by, e.g. a token ticker
+    aliases: tuple = ()
+
+
+_TEXT_FIELDS = ("launched", "blockchain", "ecosystem", "used_in", "application")
+_LIST_FIELDS = (
+    "key_features",
+    "technical_aspects",
+    "learning_resources",
+    "architecture_components",
+    "security_features",
+    "implementation_details",
+    "client_functions",
+    "aliases",
+)
+_GROUPED_FIELDS = ("wallet_compatibility", "usage_flows")
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def _intern_lines(lines) -> tuple:
+    # Feature lines repeat across entries (e.g. the ZPL bridge text), so identical lines share one string
+    return tuple(sys.intern(line) for line in lines)
+
+
+def entry_from_dict(key: str, data: dict) -> CatalogEntry:
+    """Build a CatalogEntry from one DEFI_PROTOCOLS / BLOCKCHAIN_TECHNOLOGIES style dict"""
+    fields = {
+        "key": sys.intern(key),
+        "name": _intern(data.get("name", key)),
+        "category": _intern(data.get("category", "")),
+        "description": data.get("description", ""),
+    }
+    for field in _TEXT_FIELDS:
+        fields[field] = _intern(data.get(field))
+    for field in _LIST_FIELDS:
+        fields[field] = _intern_lines(data.get(field, ()))
+    for field in _GROUPED_FIELDS:
+        fields[field] = tuple(
+            (sys.intern(group), _intern_lines(lines)) for group, lines in data.get(field, {}).items()
+        )
+    return CatalogEntry(**fields)
+
+
+def entry_to_dict(entry: CatalogEntry) -> dict:
+    """Inverse of entry_from_dict: the DEFI_PROTOCOLS style dict, without fields the entry doesn't have"""
+    data = {"name": entry.name, "category": entry.category, "description": entry.description}
+    for field in _TEXT_FIELDS:
+        value = getattr(entry, field)
+        if value is not None:
+            data[field] = value
+    for field in _LIST_FIELDS:
+        value = getattr(entry, field)
+        if value:
+            data[field] = list(value)
+    for field in _GROUPED_FIELDS:
+        value = getattr(entry, field)
+        if value:
+            data[field] = {group: list(lines) for group, lines in value}
+    return data
+
+
+def build_catalog(source: dict) -> dict:
+    """Convert a catalog dict of dicts into {key: CatalogEntry}, keeping source order"""
+    return {key: entry_from_dict(key, data) for key, data in source.items()}
+
+
+# Bumped on every catalog reload; caches derived from the catalog compare against it
+_catalog_version = 1
+_reload_listeners = []
+
+
+def catalog_version() -> int:
+    return _catalog_version
+
+
+def on_catalog_reload(callback):
+    """Register a callback to run after the catalog is reloaded, e.g. to drop derived caches"""
+    _reload_listeners.append(callback)
+    return callback
+
+
+def notify_catalog_reloaded():
+    global _catalog_version
+    _catalog_version += 1
+    for callback in _reload_listeners:
+        callback()
+
+
+def _index_terms(value: Optional[str], multi_valued: bool) -> list:
+    if value is None:
+        return []
+    parts = value.split(",") if multi_valued else [value]
+    return [part.strip().lower() for part in parts if part.strip()]
+
+
+class CatalogIndex:
+    """
+    Secondary indexes over a catalog: field -> lowercase value -> set of catalog keys.
+    Multi-valued fields ("Solana, Ethereum, Cosmos") are indexed under each value.
+    Built once per catalog load so filtered queries never scan the whole catalog.
+    """
+
+    # field -> whether the field holds a comma-separated list of values
+    FIELDS = {"ecosystem": True, "category": False, "blockchain": True, "launched": False}
+
+    def __init__(self, catalog: dict):
+        self.postings = {field: {} for field in self.FIELDS}
+        # Whole field values as written, for grouping by exact value (e.g. "Cross-Ecosystem")
+        self.exact = {field: {} for field in self.FIELDS}
+        # Precomputed result order: by display name, then key
+        self.rank = {key: position for position, key in enumerate(
+            sorted(catalog, key=lambda key: (catalog[key].name.lower(), key))
+        )}
+        self.source_order = list(catalog)
+
+        for key, entry in catalog.items():
+            for field, multi_valued in self.FIELDS.items():
+                value = getattr(entry, field)
+                if value is not None:
+                    self.exact[field].setdefault(value, []).append(key)
+                for term in _index_terms(value, multi_valued):
+                    self.postings[field].setdefault(term, set()).add(key)
+
+    def query(self, **filters) -> list:
+        """
+        Keys of entries matching every given filter (case-insensitive), sorted by name.
+        Filters that are None are ignored; no filters returns the whole catalog.
+        """
+        matches = None
+        # Intersect the smallest posting sets first so the running result shrinks fastest
+        sets = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            sets.append(self.postings[field].get(str(value).strip().lower(), set()))
+        for postings in sorted(sets, key=len):
+            matches = set(postings) if matches is None else matches & postings
+            if not matches:
+                return []
+        if matches is None:
+            matches = self.rank.keys()
+        return sorted(matches, key=self.rank.__getitem__)
+
+    def with_value(self, field: str, value: str) -> list:
+        """Keys whose field is exactly value, in catalog order"""
+        return self.exact[field].get(value, [])
+
+    def values(self, field: str) -> list:
+        """Distinct lowercase values indexed for a field"""
+        return sorted(self.postings[field])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CatalogPager:
+    """
+    Cursor pagination over a catalog in stable key order.
+    Each cursor carries the catalog version it was issued against, and the key order of the last
+    few versions is kept, so a listing that straddles a reload keeps paging through one consistent snapshot.
+    """
+
+    def __init__(self, max_page_size: int = 200, history: int = 4):
+        self.max_page_size = max_page_size
+        self.history = history
+        # version -> (sorted keys, names in the same order)
+        self.snapshots = OrderedDict()
+
+    def _snapshot(self, catalog: dict, version: int) -> tuple:
+        snapshot = self.snapshots.get(version)
+        if snapshot is None:
+            keys = sorted(catalog)
+            snapshot = self.snapshots[version] = (keys, [catalog[key].name for key in keys])
+            while len(self.snapshots) > self.history:
+                self.snapshots.popitem(last=False)
+        return snapshot
+
+    @staticmethod
+    def encode_cursor(version: int, after: str) -> str:
+        raw = json.dumps({"v": version, "after": after}, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            data = json.loads(raw)
+            return int(data["v"]), str(data["after"])
+        except (ValueError, KeyError, TypeError) as err:
+            raise InvalidCursor(f"Malformed cursor: {cursor!r}") from err
+
+    def page(self, catalog: dict, limit: int, cursor: Optional[str] = None) -> tuple:
+        """
+        Return (version, [(key, name), ...], next_cursor) for one page.
+        next_cursor is None on the last page. Raises InvalidCursor for malformed or expired cursors.
+        """
+        limit = max(1, min(limit, self.max_page_size))
+        if cursor is None:
+            version, start = catalog_version(), 0
+            keys, names = self._snapshot(catalog, version)
+        else:
+            version, after = self.decode_cursor(cursor)
+            if version == catalog_version():
+                keys, names = self._snapshot(catalog, version)
+            elif version in self.snapshots:
+                keys, names = self.snapshots[version]
+            else:
+                raise InvalidCursor("Cursor has expired; the catalog has changed since it was issued, start the listing again")
+            start = bisect.bisect_right(keys, after)
+
+        end = min(start + limit, len(keys))
+        items = list(zip(keys[start:end], names[start:end]))
+        next_cursor = self.encode_cursor(version, keys[end - 1]) if end < len(keys) else None
+        return version, items, next_cursor
@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
-from uuid import uuid4
-from typing import Any
+from uuid import UUID, uuid4
+from typing import Any, Optional
+import asyncio
+import os
+import re
 import time
 
 from uagents import Context, Model, Protocol
+from uagents.context import InternalContext
 
 #Import the necessary components of the chat protocol
 from uagents_core.contrib.protocols.chat import (
@@ -15,7 +19,22 @@ from uagents_core.contrib.protocols.chat import (
     chat_protocol_spec,
 )
 
-from defi_protocol import get_defi_protocol_info, DeFiProtocolRequest
+from defi_protocol import (
+    get_defi_protocol_info,
+    rank_protocols,
+    resolve_protocol_locally,
+    spot_entities,
+    DeFiProtocolRequest,
+    DEFI_CATALOG,
+)
+from llm_routing import ResponseTimeTracker, ExtractionRegistry, CircuitBreaker, MicroBatcher, log_task_failure
+from metrics import metrics
+from admission import AdmissionController
+from dedup import MessageDedupCache, IN_PROGRESS
+from outbound import OutboundPipeline
+from resolver_cache import endpoint_resolver
+from analytics import analytics
+from capture import record as capture_record
 
 # OpenAI LLM Agent address for structured output
 OPENAI_AGENT_ADDRESS = 'agent1q0h70caed8ax769shpemapzkyk65uscw4xwk6dc4t3emvp5jdcvqs9xs32y'
@@ -23,8 +42,32 @@ OPENAI_AGENT_ADDRESS = 'agent1q0h70caed8ax769shpemapzkyk65uscw4xwk6dc4t3emvp5jdc
 if not OPENAI_AGENT_ADDRESS:
     raise ValueError("OPENAI_AGENT_ADDRESS not set")
 
+# Structured output agents in priority order; the first is the primary, the rest receive hedged requests
+STRUCTURED_OUTPUT_AGENT_ADDRESSES = [
+    address.strip()
+    for address in os.getenv("STRUCTURED_OUTPUT_AGENT_ADDRESSES", OPENAI_AGENT_ADDRESS).split(",")
+    if address.strip()
+]
+
 # Configuration constants
-RESPONSE_TIMEOUT_SECONDS = 15  # Time to wait for OpenAI response before providing fallback
+RESPONSE_TIMEOUT_SECONDS = 15  # Time to wait for OpenAI response before providing fallback, until latency samples exist
+LLM_TIMEOUT_PERCENTILE = float(os.getenv("LLM_TIMEOUT_PERCENTILE", "95"))  # Observed latency percentile the fallback deadline is based on
+LLM_TIMEOUT_FACTOR = float(os.getenv("LLM_TIMEOUT_FACTOR", "1.5"))  # Multiplier applied to that percentile
+LLM_TIMEOUT_MIN_SECONDS = float(os.getenv("LLM_TIMEOUT_MIN_SECONDS", "3"))
+LLM_TIMEOUT_MAX_SECONDS = float(os.getenv("LLM_TIMEOUT_MAX_SECONDS", "20"))
+LLM_BATCH_WINDOW_SECONDS = float(os.getenv("LLM_BATCH_WINDOW_SECONDS", "0.05"))  # Queries arriving within this window share one prompt
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))  # Maximum queries per prompt
+HEDGE_DELAY_PERCENTILE = float(os.getenv("HEDGE_DELAY_PERCENTILE", "90"))  # Primary latency percentile after which we hedge
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "4"))  # Hedge delay until enough latency samples exist
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive LLM failures before answering locally
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))  # Time before a trial request is sent to the LLM again
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "32"))  # Chat turns waiting on the LLM at once
+CHAT_MAX_QUEUED = int(os.getenv("CHAT_MAX_QUEUED", "64"))  # Turns waiting for a free slot before new ones are shed
+CHAT_SEND_CONCURRENCY = int(os.getenv("CHAT_SEND_CONCURRENCY", "16"))  # Outbound sends in progress at once, across all destinations
+RANKER_TOP_K = int(os.getenv("RANKER_TOP_K", "3"))  # Catalog matches considered for questions that don't name a protocol
+RANKER_ANSWER_MIN_SCORE = float(os.getenv("RANKER_ANSWER_MIN_SCORE", "0.2"))  # Best-match score needed to answer with that entry
+RANKER_ANSWER_MARGIN = float(os.getenv("RANKER_ANSWER_MARGIN", "1.5"))  # ...and how far ahead of the runner-up it must be
+RANKER_SUGGEST_MIN_SCORE = float(os.getenv("RANKER_SUGGEST_MIN_SCORE", "0.08"))  # Lowest score still worth suggesting
 
 # Rate limiting implementation
 class RateLimiter:
@@ -49,6 +92,18 @@ class RateLimiter:
 # Initialize rate limiter
 rate_limiter = RateLimiter()
 
+# Latency history and in-flight requests for the structured output agents
+response_times = ResponseTimeTracker()
+extraction_registry = ExtractionRegistry()
+llm_breaker = CircuitBreaker(
+    failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=LLM_BREAKER_RESET_SECONDS,
+)
+admission = AdmissionController(max_in_flight=CHAT_MAX_IN_FLIGHT, max_queued=CHAT_MAX_QUEUED)
+
+# Recently handled chat messages, so sender retries are acknowledged again but not re-processed
+chat_dedup = MessageDedupCache("chat")
+
 def create_text_chat(text: str, end_session: bool = True) -> ChatMessage:
     content = [TextContent(type="text", text=text)]
     if end_session:
@@ -60,6 +115,19 @@ def create_text_chat(text: str, end_session: bool = True) -> ChatMessage:
     )
 
 
+def coalesce_chat_messages(first: Model, second: Model) -> Optional[ChatMessage]:
+    """Merge two chat messages queued for the same session into one, or None if they can't be merged"""
+    if not isinstance(first, ChatMessage) or not isinstance(second, ChatMessage):
+        return None
+    # Start markers stay with the first message; only the last one decides whether the session ends
+    content = [item for item in first.content if not isinstance(item, EndSessionContent)]
+    content += [item for item in second.content if not isinstance(item, StartSessionContent)]
+    return ChatMessage(timestamp=second.timestamp, msg_id=first.msg_id, content=content)
+
+
+# Replies and prompts are queued rather than awaited, so a slow endpoint never holds up other sessions
+outbound = OutboundPipeline("chat", CHAT_SEND_CONCURRENCY, coalesce=coalesce_chat_messages)
+
 chat_proto = Protocol(spec=chat_protocol_spec)
 struct_output_client_proto = Protocol(
     name="StructuredOutputClientProtocol", version="0.1.0"
@@ -75,19 +143,371 @@ class StructuredOutputResponse(Model):
     output: dict[str, Any]
 
 
+class BatchedProtocolExtraction(Model):
+    query_id: int
+    protocol_name: str
+
+
+class DeFiProtocolBatchExtraction(Model):
+    results: list[BatchedProtocolExtraction]
+
+
+# Prompt text and output schemas are built once at import instead of on every chat turn
+EXTRACTION_GUIDANCE = """If the query mentions multiple technologies, select the primary one that seems to be the main focus.
+If the query is vague or doesn't mention a specific technology, identify the most relevant technology based on context.
+
+Available technologies include:
+- Core technologies: SOON SVM, IBC, Walrus Storage, ZPL UTXO Bridge
+- Solana protocols: Solend, Orca, Raydium, Serum, Marinade, Jito, Jupiter, Mango, Drift
+- Cosmos protocols: Osmosis, Astroport, Mars, Neutron
+- Cross-ecosystem: Wormhole, Pyth, LayerZero
+"""
+
+EXTRACTION_PROMPT_TEMPLATE = """Analyze this user query about blockchain technology: '{query}'
+                    
+Extract the specific DeFi protocol or blockchain technology the user is asking about. I need to return information about a single technology or protocol.
+
+""" + EXTRACTION_GUIDANCE + """
+The response should be formatted to match the DeFiProtocolRequest schema with a protocol_name field containing just the name of the protocol or technology.
+"""
+
+BATCH_EXTRACTION_PROMPT_TEMPLATE = """Analyze each of these numbered user queries about blockchain technology:
+{queries}
+
+For each query separately, extract the specific DeFi protocol or blockchain technology the user is asking about. Each query should map to a single technology or protocol.
+
+""" + EXTRACTION_GUIDANCE + """
+The response should be formatted to match the DeFiProtocolBatchExtraction schema: a results list with one entry per query, each holding the query's number as query_id and a protocol_name field containing just the name of the protocol or technology (or <UNKNOWN> if none applies).
+"""
+
+EXTRACTION_OUTPUT_SCHEMA = DeFiProtocolRequest.schema()
+BATCH_EXTRACTION_OUTPUT_SCHEMA = DeFiProtocolBatchExtraction.schema()
+
+
+def build_extraction_prompt(queries: list[str]) -> StructuredOutputPrompt:
+    if len(queries) == 1:
+        return StructuredOutputPrompt(
+            prompt=EXTRACTION_PROMPT_TEMPLATE.format(query=queries[0]),
+            output_schema=EXTRACTION_OUTPUT_SCHEMA,
+        )
+    numbered = "\n".join(f"{query_id}. '{query}'" for query_id, query in enumerate(queries, 1))
+    return StructuredOutputPrompt(
+        prompt=BATCH_EXTRACTION_PROMPT_TEMPLATE.format(queries=numbered),
+        output_schema=BATCH_EXTRACTION_OUTPUT_SCHEMA,
+    )
+
+
+def extraction_queries(prompt: StructuredOutputPrompt) -> list[str]:
+    """The queries in a prompt made by build_extraction_prompt, in query_id order (used by replay.py's LLM stand-in)"""
+    if prompt.output_schema == BATCH_EXTRACTION_OUTPUT_SCHEMA:
+        prefix, suffix = BATCH_EXTRACTION_PROMPT_TEMPLATE.split("{queries}")
+        numbered = prompt.prompt[len(prefix):len(prompt.prompt) - len(suffix)]
+        return [re.sub(r"^\d+\. '", "", line)[:-1] for line in re.split(r"\n(?=\d+\. ')", numbered)]
+    prefix, suffix = EXTRACTION_PROMPT_TEMPLATE.split("{query}")
+    return [prompt.prompt[len(prefix):len(prompt.prompt) - len(suffix)]]
+
+
+def split_extraction_output(output: dict, session_ids: list[str]) -> dict:
+    """Map a (possibly batched) structured output back to the chat sessions it answers"""
+    if len(session_ids) == 1 or "error" in str(output).lower():
+        return {session_id: output for session_id in session_ids}
+
+    try:
+        batch = DeFiProtocolBatchExtraction.parse_obj(output)
+        names = {result.query_id: result.protocol_name for result in batch.results}
+    except Exception:
+        names = {}
+
+    return {
+        session_id: {"protocol_name": names.get(query_id, "<UNKNOWN>")}
+        for query_id, session_id in enumerate(session_ids, 1)
+    }
+
+
+def agent_deadline_seconds(address: str) -> float:
+    """Fallback deadline for one agent: a latency percentile times a factor, within min/max bounds"""
+    estimate = response_times.percentile(address, LLM_TIMEOUT_PERCENTILE)
+    if estimate is None:
+        return RESPONSE_TIMEOUT_SECONDS
+    return min(LLM_TIMEOUT_MAX_SECONDS, max(LLM_TIMEOUT_MIN_SECONDS, estimate * LLM_TIMEOUT_FACTOR))
+
+
+def fallback_deadline_seconds() -> float:
+    """How long a new extraction may take before the fallback answer is sent"""
+    deadline = agent_deadline_seconds(STRUCTURED_OUTPUT_AGENT_ADDRESSES[0])
+    if len(STRUCTURED_OUTPUT_AGENT_ADDRESSES) > 1:
+        # Leave the hedged request enough time to answer as well
+        hedged = hedge_delay_seconds() + agent_deadline_seconds(STRUCTURED_OUTPUT_AGENT_ADDRESSES[1])
+        deadline = max(deadline, min(hedged, LLM_TIMEOUT_MAX_SECONDS))
+    return deadline
+
+
+def record_response_time(address: str, seconds: float):
+    response_times.record(address, seconds)
+    estimate = response_times.percentile(address, LLM_TIMEOUT_PERCENTILE)
+    if estimate is not None:
+        metrics.set_gauge("llm_response_time_estimate_seconds", estimate, address=address, percentile=LLM_TIMEOUT_PERCENTILE)
+    metrics.set_gauge("llm_fallback_deadline_seconds", agent_deadline_seconds(address), address=address)
+
+
+def hedge_delay_seconds() -> float:
+    """Delay before hedging to a secondary agent, based on the primary's observed latency"""
+    delay = response_times.percentile(STRUCTURED_OUTPUT_AGENT_ADDRESSES[0], HEDGE_DELAY_PERCENTILE)
+    return delay if delay is not None else HEDGE_DEFAULT_DELAY_SECONDS
+
+
+async def send_extraction_request(ctx: Context, batch_id: str, prompt: StructuredOutputPrompt, members: dict):
+    """Send a batch's prompt to the primary structured output agent and arm a hedge to the secondary"""
+    # Sent in the batch's own session, so the reply can't be confused with one for an earlier batch
+    batch_ctx = session_context(ctx, batch_id)
+    extraction = extraction_registry.start(batch_id, prompt, members)
+
+    primary = STRUCTURED_OUTPUT_AGENT_ADDRESSES[0]
+    extraction_registry.mark_sent(batch_id, primary)
+    outbound.enqueue(batch_ctx, primary, prompt)
+
+    if len(STRUCTURED_OUTPUT_AGENT_ADDRESSES) > 1:
+        extraction.hedge_task = asyncio.create_task(
+            send_hedged_request(batch_ctx, batch_id, hedge_delay_seconds())
+        )
+        extraction.hedge_task.add_done_callback(log_task_failure(ctx.logger, f"Hedged request for batch {batch_id}"))
+
+
+async def send_hedged_request(ctx: Context, batch_id: str, delay: float):
+    """Send the same prompt to the secondary agent if the primary hasn't replied in time"""
+    await asyncio.sleep(delay)
+
+    extraction = extraction_registry.get(batch_id)
+    if extraction is None:
+        return  # Already answered, or every member moved on to a newer batch
+
+    secondary = STRUCTURED_OUTPUT_AGENT_ADDRESSES[1]
+    ctx.logger.info(f"No reply after {delay:.2f}s for batch {batch_id}, hedging to {secondary}")
+    extraction_registry.mark_sent(batch_id, secondary)
+    outbound.enqueue(ctx, secondary, extraction.prompt)
+
+
+async def flush_extraction_batch(batch: list):
+    """Send the queued (context, query) pairs as one prompt under a fresh batch id"""
+    batch_id = str(uuid4())
+    members = {str(ctx.session): ctx for ctx, _ in batch}
+    queries = [query for _, query in batch]
+    if len(batch) > 1:
+        batch[0][0].logger.info(f"Sending {len(batch)} queries to the LLM in one prompt")
+    capture_record("llm_prompt", session=batch_id, sessions=list(members), queries=queries)
+    await send_extraction_request(batch[0][0], batch_id, build_extraction_prompt(queries), members)
+
+
+extraction_batcher = MicroBatcher(
+    flush_extraction_batch,
+    window_seconds=LLM_BATCH_WINDOW_SECONDS,
+    max_batch_size=LLM_BATCH_MAX_SIZE,
+)
+
+
+def remove_active_session(ctx: Context, session_id: str):
+    active_sessions = ctx.storage.get("active_sessions") or ""
+    session_ids = [s.strip() for s in active_sessions.split(",") if s.strip()]
+    if session_id in session_ids:
+        session_ids.remove(session_id)
+        ctx.storage.set("active_sessions", ",".join(session_ids))
+
+
+def session_context(ctx: Context, session_id: str) -> Context:
+    """A context like ctx that sends in the given chat session, for replies sent outside the session's handler"""
+    return InternalContext(
+        agent=ctx.agent,
+        storage=ctx.storage,
+        ledger=ctx.ledger,
+        resolver=ctx._resolver,
+        dispenser=ctx._dispenser,
+        session=UUID(session_id),
+        interval_messages=ctx._interval_messages,
+        message_history=ctx._message_history,
+        logger=ctx.logger,
+    )
+
+
+def update_admission_metrics():
+    metrics.set_gauge("chat_llm_in_flight", len(admission.in_flight))
+    metrics.set_gauge("chat_admission_queue_depth", admission.queued)
+
+
+async def start_extraction(ctx: Context, sender: str, query: str):
+    """Record an admitted chat turn, arm its fallback deadline and queue it for the LLM"""
+    ctx.storage.set(str(ctx.session), sender)
+    ctx.storage.set(f"{str(ctx.session)}_query", query)
+    
+    # Record the time we sent the request to OpenAI
+    request_time = datetime.utcnow()
+    ctx.storage.set(f"{str(ctx.session)}_request_time", request_time.isoformat())
+    ctx.storage.set(f"{str(ctx.session)}_deadline_seconds", fallback_deadline_seconds())
+    
+    # Schedule a fallback response in case OpenAI doesn't respond in time
+    ctx.storage.set(f"{str(ctx.session)}_fallback_scheduled", "true")
+    
+    # Add to active sessions list
+    active_sessions = ctx.storage.get("active_sessions") or ""
+    session_ids = [s.strip() for s in active_sessions.split(",") if s.strip()]
+    if str(ctx.session) not in session_ids:
+        session_ids.append(str(ctx.session))
+        ctx.storage.set("active_sessions", ",".join(session_ids))
+    
+    # Queue for the LLM; queries arriving together share one structured output prompt
+    await extraction_batcher.add((ctx, query))
+
+
+async def finish_extraction(session_id: str):
+    """Free the session's LLM slot and start the queued turns admitted in its place"""
+    for next_turn in admission.release(session_id):
+        await start_extraction(*next_turn)
+    update_admission_metrics()
+
+
+def pending_turns(storage) -> list:
+    """Chat turns still owed an answer: those waiting on the LLM and those queued for admission"""
+    turns = []
+    active_sessions = storage.get("active_sessions") or ""
+    for session_id in [s.strip() for s in active_sessions.split(",") if s.strip()]:
+        if storage.get(f"{session_id}_fallback_scheduled") == "true" and storage.get(session_id):
+            turns.append({
+                "session": session_id,
+                "sender": storage.get(session_id),
+                "query": storage.get(f"{session_id}_query") or "unknown query",
+                "queued": False,
+            })
+    for queue in admission.queues.values():
+        for session_id, (_, sender, query) in queue:
+            turns.append({"session": session_id, "sender": sender, "query": query, "queued": True})
+    return turns
+
+
+async def requeue_turns(ctx: Context, turns: list) -> int:
+    """
+    Put turns from pending_turns() through admission again as if they had just arrived, so they get an
+    LLM answer (and a fresh fallback deadline) rather than only the fallback. Turns that were waiting on
+    the LLM and have been answered meanwhile are skipped.
+    """
+    requeued = 0
+    for turn in turns:
+        session_id = turn["session"]
+        if not turn.get("queued") and ctx.storage.get(f"{session_id}_fallback_scheduled") == "false":
+            continue
+        await admit_turn(session_context(ctx, session_id), turn["sender"], turn["query"])
+        requeued += 1
+    return requeued
+
+
+def rank_query(query: str) -> list:
+    return rank_protocols([query], RANKER_TOP_K, RANKER_SUGGEST_MIN_SCORE)[0]
+
+
+async def ranked_reply(ranked: list) -> Optional[str]:
+    """
+    Build an answer from ranked catalog matches: the entry itself when one match clearly wins,
+    otherwise the names of the closest matches. None if nothing matched.
+    """
+    if not ranked:
+        return None
+    best = ranked[0]
+    runner_up = ranked[1].score if len(ranked) > 1 else 0.0
+    if best.score >= RANKER_ANSWER_MIN_SCORE and best.score >= RANKER_ANSWER_MARGIN * runner_up:
+        return await get_defi_protocol_info(best.key)
+
+    names = ", ".join(DEFI_CATALOG[match.key].name for match in ranked)
+    return f"These protocols look most relevant to your question: {names}. Ask about one by name for details."
+
+
+async def shed_turn(ctx: Context, sender: str, query: str):
+    """Reply immediately when overloaded: from the local catalog if possible, otherwise ask to retry"""
+    protocol_key = resolve_protocol_locally(query)
+    if protocol_key:
+        outbound.enqueue(ctx, sender, create_text_chat(await get_defi_protocol_info(protocol_key)))
+        return
+
+    reply = await ranked_reply(rank_query(query))
+    if reply is not None:
+        outbound.enqueue(ctx, sender, create_text_chat(reply))
+        return
+
+    outbound.enqueue(
+        ctx,
+        sender,
+        create_text_chat(
+            "I'm handling a lot of questions right now. Please try again in a moment, or ask about a specific protocol or technology by name for an instant answer."
+        ),
+    )
+
+
+async def admit_turn(ctx: Context, sender: str, query: str):
+    """Start a chat turn's LLM extraction, or queue or shed it when the LLM is at capacity"""
+    # Skip the LLM round trip entirely while it is known to be failing
+    if not llm_breaker.allow_request():
+        await answer_locally(ctx, sender, query)
+        return
+
+    # Bound concurrent LLM work; extra turns wait in a fair per-sender queue or are shed
+    session_id = str(ctx.session)
+    if admission.try_admit(session_id):
+        await start_extraction(ctx, sender, query)
+    elif admission.enqueue(sender, session_id, (ctx, sender, query)):
+        ctx.logger.info(f"LLM capacity reached or session busy, queued turn from {sender}")
+        metrics.increment("chat_turns_queued_total")
+    else:
+        ctx.logger.warning(f"Admission queue full, shedding turn from {sender}")
+        metrics.increment("chat_turns_shed_total")
+        await shed_turn(ctx, sender, query)
+    update_admission_metrics()
+
+
+async def answer_locally(ctx: Context, sender: str, query: str):
+    """Answer straight from the local catalog while the LLM circuit breaker is open"""
+    protocol_key = resolve_protocol_locally(query)
+    if protocol_key:
+        ctx.logger.info(f"LLM unavailable, answering '{query}' locally with {protocol_key}")
+        outbound.enqueue(ctx, sender, create_text_chat(await get_defi_protocol_info(protocol_key)))
+        return
+
+    reply = await ranked_reply(rank_query(query))
+    if reply is not None:
+        ctx.logger.info(f"LLM unavailable, answering '{query}' from ranked catalog matches")
+        outbound.enqueue(ctx, sender, create_text_chat(reply))
+        return
+
+    outbound.enqueue(
+        ctx,
+        sender,
+        create_text_chat(
+            "I'm currently having trouble with my AI service, so I can only answer questions that name a specific protocol or technology. Try asking about our core technologies (SOON SVM, IBC, Walrus, ZPL UTXO Bridge), Solana protocols (Solend, Orca, Raydium, etc.), Cosmos protocols (Osmosis, Astroport, etc.), or cross-ecosystem bridges (Wormhole, Pyth)."
+        ),
+    )
+
+
 @chat_proto.on_message(ChatMessage)
 async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
+    # Keyed by the receiving agent too: Bureau shards share this cache
+    dedup_key = (ctx.agent.address, sender, str(msg.msg_id))
+    cached_ack = chat_dedup.get(dedup_key)
+    if cached_ack is not None:
+        ctx.logger.info(f"Duplicate message {msg.msg_id} from {sender}, re-sending acknowledgement only")
+        if cached_ack is not IN_PROGRESS:
+            await ctx.send(sender, cached_ack)
+        return
+
     ctx.logger.info(f"Got a message from {sender}: {msg.content[0].text}")
+    # Look up the sender's endpoint now, so replies sent later in this turn find it cached
+    endpoint_resolver.prefetch(sender)
     ctx.storage.set(str(ctx.session), sender)
-    await ctx.send(
-        sender,
-        ChatAcknowledgement(timestamp=datetime.utcnow(), acknowledged_msg_id=msg.msg_id),
-    )
+    ack = ChatAcknowledgement(timestamp=datetime.utcnow(), acknowledged_msg_id=msg.msg_id)
+    chat_dedup.remember(dedup_key, ack)
+    # Acknowledged inline so the client knows the message arrived; only the follow-ups go through the pipeline
+    await ctx.send(sender, ack)
 
     for item in msg.content:
         if isinstance(item, StartSessionContent):
             ctx.logger.info(f"Got a start session message from {sender}")
-            await ctx.send(
+            outbound.enqueue(
+                ctx,
                 sender,
                 create_text_chat(
                     "Welcome to the Emrys Bridge Technology Assistant! I can provide comprehensive information about our cross-chain technologies including: SOON SVM (our enhanced Solana VM for high-throughput bridging), IBC protocol implementation, Walrus decentralized storage, ZPL UTXO Bridge (connecting Bitcoin, Dogecoin, and Litecoin to Solana), and various DeFi protocols in the Solana and Cosmos ecosystems. What would you like to learn about?",
@@ -99,53 +519,16 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
             
             # Check rate limits before proceeding
             if not await rate_limiter.check_rate_limit(ctx):
-                await ctx.send(
+                outbound.enqueue(
+                    ctx,
                     sender,
                     create_text_chat(
                         "Sorry, we've reached our query limit (6 requests per hour). Please try again later."
                     )
                 )
                 continue
-                
-            ctx.storage.set(str(ctx.session), sender)
-            ctx.storage.set(f"{str(ctx.session)}_query", item.text)
-            
-            # Record the time we sent the request to OpenAI
-            request_time = datetime.utcnow()
-            ctx.storage.set(f"{str(ctx.session)}_request_time", request_time.isoformat())
-            
-            # Schedule a fallback response in case OpenAI doesn't respond in time
-            ctx.storage.set(f"{str(ctx.session)}_fallback_scheduled", "true")
-            
-            # Add to active sessions list
-            active_sessions = ctx.storage.get("active_sessions") or ""
-            session_ids = [s.strip() for s in active_sessions.split(",") if s.strip()]
-            if str(ctx.session) not in session_ids:
-                session_ids.append(str(ctx.session))
-                ctx.storage.set("active_sessions", ",".join(session_ids))
-            
-            # Send to OpenAI LLM for processing with structured output
-            await ctx.send(
-                OPENAI_AGENT_ADDRESS,
-                StructuredOutputPrompt(
-                    prompt=f"""Analyze this user query about blockchain technology: '{item.text}'
-                    
-Extract the specific DeFi protocol or blockchain technology the user is asking about. I need to return information about a single technology or protocol.
-
-If the query mentions multiple technologies, select the primary one that seems to be the main focus.
-If the query is vague or doesn't mention a specific technology, identify the most relevant technology based on context.
 
-Available technologies include:
-- Core technologies: SOON SVM, IBC, Walrus Storage, ZPL UTXO Bridge
-- Solana protocols: Solend, Orca, Raydium, Serum, Marinade, Jito, Jupiter, Mango, Drift
-- Cosmos protocols: Osmosis, Astroport, Mars, Neutron
-- Cross-ecosystem: Wormhole, Pyth, LayerZero
-
-The response should be formatted to match the DeFiProtocolRequest schema with a protocol_name field containing just the name of the protocol or technology.
-""",
-                    output_schema=DeFiProtocolRequest.schema()
-                ),
-            )
+            await admit_turn(ctx, sender, item.text)
         else:
             ctx.logger.info(f"Got unexpected content from {sender}")
 
@@ -161,37 +544,79 @@ async def handle_ack(ctx: Context, sender: str, msg: ChatAcknowledgement):
 async def handle_structured_output_response(
     ctx: Context, sender: str, msg: StructuredOutputResponse
 ):
-    session_sender = ctx.storage.get(str(ctx.session))
+    batch_id = str(ctx.session)
+
+    # Record latency for the replying agent, including late replies to hedged requests
+    round_trip = extraction_registry.round_trip_time(batch_id, sender)
+    if round_trip is not None:
+        record_response_time(sender, round_trip)
+
+    # Only the first reply for a batch is used; late duplicates from hedged requests find it completed
+    current = extraction_registry.current_members(batch_id)
+    extraction = extraction_registry.complete(batch_id)
+    members = extraction.members if extraction else {}
+    waiting = {
+        session_id: member_ctx
+        for session_id, member_ctx in current.items()
+        if ctx.storage.get(f"{session_id}_fallback_scheduled") == "true"
+    }
+    analytics.emit(
+        "llm_reply",
+        session=batch_id,
+        agent=sender,
+        round_trip_seconds=round_trip,
+        batch_size=len(members),
+        late=not waiting,
+    )
+    if not waiting:
+        ctx.logger.info(f"Dropping late structured output from {sender} for batch {batch_id}")
+        return
+
+    if "error" in str(msg.output).lower():
+        llm_breaker.record_failure()
+    else:
+        llm_breaker.record_success()
+
+    outputs = split_extraction_output(msg.output, list(members))
+    for session_id, member_ctx in waiting.items():
+        await process_extraction(member_ctx, session_id, outputs[session_id])
+
+
+async def process_extraction(ctx: Context, session_id: str, output: dict):
+    """Answer one chat session from the structured output extracted for its query"""
+    session_sender = ctx.storage.get(session_id)
     if session_sender is None:
         ctx.logger.error(
             "Discarding message because no session sender found in storage"
         )
+        remove_active_session(ctx, session_id)
+        await finish_extraction(session_id)
         return
 
     # Cancel the fallback response since we got a response from OpenAI
-    ctx.storage.set(f"{str(ctx.session)}_fallback_scheduled", "false")
+    ctx.storage.set(f"{session_id}_fallback_scheduled", "false")
     
     # Remove from active sessions
-    active_sessions = ctx.storage.get("active_sessions") or ""
-    session_ids = [s.strip() for s in active_sessions.split(",") if s.strip()]
-    if str(ctx.session) in session_ids:
-        session_ids.remove(str(ctx.session))
-        ctx.storage.set("active_sessions", ",".join(session_ids))
+    remove_active_session(ctx, session_id)
+    await finish_extraction(session_id)
 
-    original_query = ctx.storage.get(f"{str(ctx.session)}_query") or "unknown query"
+    original_query = ctx.storage.get(f"{session_id}_query") or "unknown query"
     ctx.logger.info(f"Processing structured output for query: {original_query}")
 
-    # Store response for analytics and debugging
-    ctx.storage.set(f"{str(ctx.session)}_openai_response", str(msg.output))
+    # Analytics go to the event log rather than agent storage, which every hot-path read depends on
+    def record(outcome: str, protocol: Optional[str] = None):
+        analytics.emit("extraction", session=session_id, query=original_query, outcome=outcome, protocol=protocol, output=str(output))
 
-    if "<UNKNOWN>" in str(msg.output) or "error" in str(msg.output).lower():
+    if "<UNKNOWN>" in str(output) or "error" in str(output).lower():
         error_message = "I couldn't identify a specific protocol or technology in your question"
+        record("llm_error" if "error" in str(output).lower() else "unknown")
         
-        if "error" in str(msg.output).lower():
-            ctx.logger.error(f"OpenAI error: {str(msg.output)}")
+        if "error" in str(output).lower():
+            ctx.logger.error(f"OpenAI error: {str(output)}")
             error_message = "Sorry, the AI service is currently experiencing issues. Please try again later."
         
-        await ctx.send(
+        outbound.enqueue(
+            ctx,
             session_sender,
             create_text_chat(
                 f"{error_message}. You can ask about our core bridge technologies (SOON SVM, IBC, Walrus, ZPL UTXO Bridge), Solana protocols (Solend, Orca, Raydium, etc.), Cosmos protocols (Osmosis, Astroport, etc.), or cross-ecosystem bridges (Wormhole, Pyth)."
@@ -199,48 +624,53 @@ async def handle_structured_output_response(
         )
         return
 
+    # Set only once the output parsed into a non-empty protocol name, so errors before that are parse errors
+    prompt = None
     try:
-        prompt = DeFiProtocolRequest.parse_obj(msg.output)
-        extracted_name = prompt.protocol_name.strip()
+        parsed = DeFiProtocolRequest.parse_obj(output)
+        extracted_name = parsed.protocol_name.strip()
         ctx.logger.info(f"Extracted protocol name: {extracted_name}")
         
-        # Store the extracted protocol name for analytics
-        ctx.storage.set(f"{str(ctx.session)}_extracted_protocol", extracted_name)
-        
         if not extracted_name:
             raise ValueError("Empty protocol name extracted")
+        prompt = parsed
             
         protocol_info = await get_defi_protocol_info(extracted_name)
     except Exception as err:
         ctx.logger.error(f"Error processing protocol info: {err}")
         
         # Check if it's a parsing error or a protocol info error
-        error_type = "parsing error" if "parse_obj" in str(err) else "protocol info error"
+        error_type = "parsing error" if prompt is None else "protocol info error"
         ctx.logger.error(f"Type of error: {error_type}")
+        record(
+            "parse_error" if prompt is None else "protocol_error",
+            prompt.protocol_name if prompt is not None else None,
+        )
         
-        await ctx.send(
+        outbound.enqueue(
+            ctx,
             session_sender,
             create_text_chat(
-                f"Sorry, I encountered an error while processing information about '{prompt.protocol_name if 'prompt' in locals() else 'the requested technology'}'. Please try a different query or be more specific."
+                f"Sorry, I encountered an error while processing information about '{prompt.protocol_name if prompt is not None else 'the requested technology'}'. Please try a different query or be more specific."
             ),
         )
         return
 
     if "not found" in protocol_info:
         # Try to provide a helpful response based on the original query
+        record("not_found", extracted_name)
         context_response = f"I couldn't find specific information about '{prompt.protocol_name}'. {protocol_info}"
-        await ctx.send(session_sender, create_text_chat(context_response))
+        outbound.enqueue(ctx, session_sender, create_text_chat(context_response))
         return
 
-    # Store successful result for analytics
-    ctx.storage.set(f"{str(ctx.session)}_success", "true")
+    record("answered", extracted_name)
     
     chat_message = create_text_chat(protocol_info)
-    await ctx.send(session_sender, chat_message)
+    outbound.enqueue(ctx, session_sender, chat_message)
 
 
 # Periodic task to check for timeout and send fallback responses
-@chat_proto.on_interval(period=5.0)  # Check every 5 seconds
+@chat_proto.on_interval(period=1.0)  # Check every second, deadlines adapt to observed LLM latency
 async def check_for_timeouts(ctx: Context):
     """Check for requests that haven't received a response within the timeout period"""
     now = datetime.utcnow()
@@ -250,6 +680,7 @@ async def check_for_timeouts(ctx: Context):
         # that have set a specific identifier when they were scheduled
         active_sessions = ctx.storage.get("active_sessions") or ""
         session_ids = [s.strip() for s in active_sessions.split(",") if s.strip()]
+        timed_out = []
         
         for session_id in session_ids:
             fallback_scheduled = ctx.storage.get(f"{session_id}_fallback_scheduled")
@@ -269,8 +700,9 @@ async def check_for_timeouts(ctx: Context):
                 ctx.logger.error(f"Invalid timestamp format: {request_time_str}")
                 continue
             
-            # If we've waited longer than the timeout, send a fallback response
-            if time_elapsed > timedelta(seconds=RESPONSE_TIMEOUT_SECONDS):
+            # If we've waited longer than the session's deadline, send a fallback response
+            deadline_seconds = ctx.storage.get(f"{session_id}_deadline_seconds") or RESPONSE_TIMEOUT_SECONDS
+            if time_elapsed > timedelta(seconds=deadline_seconds):
                 ctx.logger.warning(f"Request timeout for session {session_id}. Sending fallback response.")
                 
                 # Get the session sender and original query
@@ -278,48 +710,53 @@ async def check_for_timeouts(ctx: Context):
                 original_query = ctx.storage.get(f"{session_id}_query") or "unknown query"
                 
                 if session_sender:
-                    # Mark as processed
+                    # One failure per LLM request, however many of the sessions it answers time out
+                    extraction = extraction_registry.get(extraction_registry.batches.get(session_id))
+                    if extraction is not None and not extraction.timed_out:
+                        extraction.timed_out = True
+                        llm_breaker.record_failure()
+                    # Mark as processed so any late LLM reply is dropped
+                    extraction_registry.detach(session_id)
                     ctx.storage.set(f"{session_id}_fallback_scheduled", "false")
-                    ctx.storage.set(f"{session_id}_fallback_sent", "true")
-                    
-                    # Try to extract potential keywords from the query
-                    keywords = extract_potential_keywords(original_query)
-                    
-                    if keywords:
-                        fallback = f"I'm currently having trouble with my AI service. Based on your query about '{keywords}', you might want to check our documentation or try asking about specific protocols like Solend, Orca, or our core technologies like SOON SVM or Walrus Storage."
-                    else:
-                        fallback = "I'm currently having trouble with my AI service. Please try again later or ask about a specific protocol or technology by name."
-                        
-                    await ctx.send(
-                        session_sender,
-                        create_text_chat(fallback)
-                    )
-                    
-                    # Remove from active sessions
-                    updated_sessions = [s for s in session_ids if s != session_id]
-                    ctx.storage.set("active_sessions", ",".join(updated_sessions))
+                    timed_out.append((session_id, session_sender, original_query, time_elapsed.total_seconds()))
+        
+        # Questions that timed out in the same tick are ranked against the catalog together
+        rankings = rank_protocols([query for _, _, query, _ in timed_out], RANKER_TOP_K, RANKER_SUGGEST_MIN_SCORE)
+        for (session_id, session_sender, original_query, elapsed_seconds), ranked in zip(timed_out, rankings):
+            catalog_reply = await ranked_reply(ranked)
+            analytics.emit(
+                "fallback",
+                session=session_id,
+                query=original_query,
+                elapsed_seconds=round(elapsed_seconds, 3),
+                catalog_hit=catalog_reply is not None,
+                suggested=[match.key for match in ranked],
+            )
+            
+            # Try to extract potential keywords from the query
+            keywords = extract_potential_keywords(original_query)
+            
+            if catalog_reply is not None:
+                fallback = f"I'm currently having trouble with my AI service, so here is what I found in my local catalog.\n{catalog_reply}"
+            elif keywords:
+                fallback = f"I'm currently having trouble with my AI service. Based on your query about '{keywords}', you might want to check our documentation or try asking about specific protocols like Solend, Orca, or our core technologies like SOON SVM or Walrus Storage."
+            else:
+                fallback = "I'm currently having trouble with my AI service. Please try again later or ask about a specific protocol or technology by name."
+                
+            # Sent in the chat's own session, so a front agent can relay it to the user
+            outbound.enqueue(
+                session_context(ctx, session_id),
+                session_sender,
+                create_text_chat(fallback)
+            )
+            
+            # Remove from active sessions
+            remove_active_session(ctx, session_id)
+            await finish_extraction(session_id)
     except Exception as e:
         ctx.logger.error(f"Error in timeout checker: {e}")
 
 
 def extract_potential_keywords(query: str) -> str:
-    """Extract potential keywords from a query to provide a more helpful fallback response"""
-    # List of known important keywords to look for
-    important_terms = [
-        "SOON", "SVM", "IBC", "Walrus", "Storage", "ZPL", "UTXO", "Bridge",
-        "Solana", "Cosmos", "Bitcoin", "Ethereum", "Dogecoin", "Litecoin",
-        "Solend", "Orca", "Raydium", "Serum", "Marinade", "Jito", "Jupiter", 
-        "Osmosis", "Astroport", "Wormhole", "Pyth"
-    ]
-    
-    # Simple keyword extraction
-    lowercase_query = query.lower()
-    found_terms = []
-    
-    for term in important_terms:
-        if term.lower() in lowercase_query:
-            found_terms.append(term)
-    
-    if found_terms:
-        return ", ".join(found_terms)
-    return ""
\ No newline at end of file
+    """Names of the catalog protocols, technologies and ecosystems a query mentions, for a more helpful fallback response"""
+    return ", ".join(entity.name for entity in spot_entities(query))
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Compact reply encoding for version 0.2.0 of the agent's protocol.
+
+A reply model is msgpack-encoded and compressed with the best compression the client accepts, once the
+msgpack body is at least COMPACT_MIN_BYTES. Envelope payloads are JSON, so the compressed bytes travel
+base64-encoded inside a CompactResponse. Smaller replies, and replies to clients that accept no
+compression, carry the reply's JSON as is.
+"""
+import base64
+import json
+import os
+import zlib
+from typing import List, Optional
+
+import msgpack
+from uagents import Model
+
+from wire_cache import schema_digest
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPACT_MIN_BYTES = int(os.getenv("COMPACT_MIN_BYTES", "512"))  # Smaller replies are sent as JSON
+COMPACT_ZLIB_LEVEL = int(os.getenv("COMPACT_ZLIB_LEVEL", "6"))
+COMPACT_ZSTD_LEVEL = int(os.getenv("COMPACT_ZSTD_LEVEL", "3"))
+
+# Compressions this agent can produce and decode, most preferred first. On replies of a few kilobytes
+# zlib comes out slightly smaller than zstd (benchmarks/compact_payloads.py), so it's preferred.
+COMPRESSIONS = ("zlib", "zstd") if zstandard is not None else ("zlib",)
+
+
+# Version 0.2.0 requests; the replies are the version 0.1.0 reply models wrapped in a CompactResponse
+class CompactProtocolInfoRequest(Model):
+    protocol_name: str
+    accept_encoding: List[str] = ["zlib"]  # Compressions the client can decode, e.g. ["zstd", "zlib"]; [] for JSON only
+
+
+class CompactDeFiProtocolRequest(Model):
+    protocol_name: str
+    accept_encoding: List[str] = ["zlib"]
+
+
+class CompactResponse(Model):
+    schema_digest: str  # Digest of the reply model the payload decodes to
+    encoding: str  # "msgpack+zlib" or "msgpack+zstd" (payload is base64), or "json"
+    payload: str
+
+
+def negotiate(accept_encoding: list) -> Optional[str]:
+    """The preferred compression among those the client accepts, or None if there is none"""
+    accepted = {encoding.lower() for encoding in accept_encoding}
+    for compression in COMPRESSIONS:
+        if compression in accepted:
+            return compression
+    return None
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=COMPACT_ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, COMPACT_ZLIB_LEVEL)
+
+
+def compact_response(message: Model, compression: Optional[str]) -> CompactResponse:
+    if compression is not None:
+        data = msgpack.packb(message.model_dump())
+        if len(data) >= COMPACT_MIN_BYTES:
+            return CompactResponse(
+                schema_digest=schema_digest(type(message)),
+                encoding=f"msgpack+{compression}",
+                payload=base64.b64encode(compress(data, compression)).decode(),
+            )
+    # Uncompressed msgpack would be base64-encoded here and again by the envelope, ending up larger than the JSON
+    return CompactResponse(schema_digest=schema_digest(type(message)), encoding="json", payload=message.model_dump_json())
+
+
+def unpack(encoding: str, payload: str) -> dict:
+    if encoding == "json":
+        return json.loads(payload)
+    serialization, _, compression = encoding.partition("+")
+    if serialization != "msgpack" or compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported payload encoding '{encoding}'")
+    data = base64.b64decode(payload)
+    if compression == "zstd":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    return msgpack.unpackb(data)
+
+
+def decode_compact(message: CompactResponse, model_class: type) -> Model:
+    """The reply wrapped in a CompactResponse, checked against the model the caller expects"""
+    if message.schema_digest != schema_digest(model_class):
+        raise ValueError(f"CompactResponse holds {message.schema_digest}, not {model_class.__name__}")
+    return model_class.model_validate(unpack(message.encoding, message.payload))
@@ -0,0 +1,58 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+# Marker stored while the first copy of a message is still being handled
+IN_PROGRESS = object()
+
+
+class MessageDedupCache:
+    """
+    Bounded LRU of recently handled (sender, message id) pairs with an expiry window.
+    Each entry holds the reply that was sent, so a retried message can get the same reply
+    again without repeating the work.
+    """
+
+    def __init__(self, name: str, max_entries: int = 10000, ttl_seconds: float = 600):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def get(self, key: tuple):
+        """Return the cached reply (or IN_PROGRESS) for a duplicate message, or None for a new one"""
+        self.lookups += 1
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+            del self.entries[key]
+            entry = None
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        self._update_metrics()
+        return entry[1] if entry is not None else None
+
+    def remember(self, key: tuple, reply=IN_PROGRESS):
+        self.entries[key] = (time.monotonic(), reply)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def forget(self, key: tuple):
+        self.entries.pop(key, None)
+
+    def _update_metrics(self):
+        metrics.set_gauge("dedup_lookups", self.lookups, cache=self.name)
+        metrics.set_gauge("dedup_hits", self.hits, cache=self.name)
+        metrics.set_gauge("dedup_hit_rate", round(self.hits / self.lookups, 4), cache=self.name)
+        metrics.set_gauge("dedup_entries", len(self.entries), cache=self.name)
+
+
+def request_message_id(msg) -> str:
+    """Identify a request model without a msg_id field by its type and payload"""
+    digest = hashlib.sha256(msg.model_dump_json().encode()).hexdigest()[:16]
+    return f"{type(msg).__name__}:{digest}"
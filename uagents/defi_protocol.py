@@ -1,12 +1,29 @@
 import requests
+from typing import Dict, Optional
 from uagents import Model
 
+from catalog import CatalogIndex, build_catalog, notify_catalog_reloaded
+from entity_matcher import EntityMatcher, catalog_terms, ecosystem_terms
+from model import TECHNOLOGY_CATALOG
+from ranker import TfidfRanker
+
 class DeFiProtocolRequest(Model):
     protocol_name: str
 
 class DeFiProtocolResponse(Model):
     results: str
 
+class ProtocolQueryRequest(Model):
+    ecosystem: Optional[str] = None
+    category: Optional[str] = None
+    blockchain: Optional[str] = None
+    launched_year: Optional[int] = None
+
+class ProtocolQueryResponse(Model):
+    timestamp: int
+    protocols: Dict[str, str]  # key -> name, sorted by name
+    count: int
+
 # Dictionary of DeFi protocols with educational information focused on Solana, SVM, and Cosmos IBC
 DEFI_PROTOCOLS = {
     "solend": {
@@ -563,6 +580,106 @@ DEFI_PROTOCOLS = {
     }
 }
 
+# Typed, immutable records built from DEFI_PROTOCOLS; lookups and rendering use these. The source dicts
+# are dropped once built so the catalog is only held once; catalog.entry_to_dict() gives an entry back.
+DEFI_CATALOG = build_catalog(DEFI_PROTOCOLS)
+del DEFI_PROTOCOLS
+
+# Secondary indexes (ecosystem, category, blockchain, launch year) over DEFI_CATALOG
+DEFI_INDEX = CatalogIndex(DEFI_CATALOG)
+
+# TF-IDF ranking over the catalog text, for questions that don't name a protocol
+DEFI_RANKER = TfidfRanker(DEFI_CATALOG)
+
+
+def build_entity_matcher() -> EntityMatcher:
+    # Later dicts win when two entities share a term, so protocols take precedence
+    return EntityMatcher({
+        **ecosystem_terms(DEFI_CATALOG),
+        **catalog_terms(TECHNOLOGY_CATALOG, "technology"),
+        **catalog_terms(DEFI_CATALOG, "protocol"),
+    })
+
+
+# Spots protocols, technologies and ecosystems named in free text
+DEFI_MATCHER = build_entity_matcher()
+
+
+def reload_catalog(source: dict):
+    """Replace DEFI_CATALOG with one built from source (DEFI_PROTOCOLS style) and invalidate everything derived from it"""
+    rebuilt = build_catalog(source)
+    DEFI_CATALOG.clear()
+    DEFI_CATALOG.update(rebuilt)
+    global DEFI_INDEX, DEFI_RANKER, DEFI_MATCHER
+    DEFI_INDEX = CatalogIndex(DEFI_CATALOG)
+    DEFI_RANKER = TfidfRanker(DEFI_CATALOG)
+    DEFI_MATCHER = build_entity_matcher()
+    notify_catalog_reloaded()
+
+
+def resolve_protocol_locally(query: str) -> Optional[str]:
+    """
+    Find the protocol a free-form query is about without asking the LLM.
+    Returns the DEFI_CATALOG key of the longest whole-word match, or None.
+    """
+    protocols = [match for match in DEFI_MATCHER.find(query) if match.entity.kind == "protocol"]
+    if not protocols:
+        return None
+    return max(protocols, key=lambda match: match.end - match.start).entity.key
+
+
+def spot_entities(text: str) -> list:
+    """Protocols, technologies and ecosystems named in text, in order of first mention"""
+    return DEFI_MATCHER.entities(text)
+
+
+def query_protocols(
+    ecosystem: Optional[str] = None,
+    category: Optional[str] = None,
+    blockchain: Optional[str] = None,
+    launched_year: Optional[int] = None,
+) -> list:
+    """DEFI_CATALOG keys matching all given filters, sorted by protocol name"""
+    return DEFI_INDEX.query(
+        ecosystem=ecosystem, category=category, blockchain=blockchain, launched=launched_year
+    )
+
+
+def rank_protocols(queries: list, k: int = 3, min_score: float = 0.0) -> list:
+    """Top-k (key, score) catalog matches for each free-form query, scored together in one pass"""
+    return DEFI_RANKER.rank_batch(queries, k, min_score)
+
+
+def render_protocol(protocol) -> str:
+    """Format a catalog entry as the plain-text answer sent to users"""
+    # Format the protocol information as a structured text
+    result = f"\n{protocol.name} - {protocol.category}\n"
+    
+    # Add blockchain/ecosystem/launched info if available
+    if protocol.blockchain is not None:
+        result += f"Blockchain: {protocol.blockchain}\n"
+    if protocol.ecosystem is not None:
+        result += f"Ecosystem: {protocol.ecosystem}\n"
+    if protocol.launched is not None:
+        result += f"Launched: {protocol.launched}\n"
+    
+    result += f"\nDescription:\n{protocol.description}\n\n"
+    
+    result += "Key Features:\n"
+    for feature in protocol.key_features:
+        result += f"- {feature}\n"
+    
+    result += "\nTechnical Aspects:\n"
+    for aspect in protocol.technical_aspects:
+        result += f"- {aspect}\n"
+    
+    result += "\nLearning Resources:\n"
+    for resource in protocol.learning_resources:
+        result += f"- {resource}\n"
+    
+    return result
+
+
 async def get_defi_protocol_info(protocol_name: str) -> str:
     """
     Fetch DeFi protocol information from our database and return as plain text
@@ -572,61 +689,31 @@ async def get_defi_protocol_info(protocol_name: str) -> str:
         protocol_key = protocol_name.lower()
         
         # Check if the protocol exists in our database
-        if protocol_key in DEFI_PROTOCOLS:
-            protocol = DEFI_PROTOCOLS[protocol_key]
-            
-            # Format the protocol information as a structured text
-            result = f"\n{protocol['name']} - {protocol['category']}\n"
-            
-            # Add blockchain/ecosystem/launched info if available
-            if 'blockchain' in protocol:
-                result += f"Blockchain: {protocol['blockchain']}\n"
-            if 'ecosystem' in protocol:
-                result += f"Ecosystem: {protocol['ecosystem']}\n"
-            if 'launched' in protocol:
-                result += f"Launched: {protocol['launched']}\n"
-            
-            result += f"\nDescription:\n{protocol['description']}\n\n"
-            
-            result += "Key Features:\n"
-            for feature in protocol['key_features']:
-                result += f"- {feature}\n"
-            
-            result += "\nTechnical Aspects:\n"
-            for aspect in protocol['technical_aspects']:
-                result += f"- {aspect}\n"
-            
-            result += "\nLearning Resources:\n"
-            for resource in protocol['learning_resources']:
-                result += f"- {resource}\n"
-            
-            return result
+        if protocol_key in DEFI_CATALOG:
+            return render_protocol(DEFI_CATALOG[protocol_key])
         else:
             # Similar protocols suggestion
             similar_protocols = []
             search_term = protocol_key.lower()
             
-            # List of all protocols we support
-            all_protocols = list(DEFI_PROTOCOLS.keys())
-            
             # Check for partial matches
-            for key in all_protocols:
+            for key, proto in DEFI_CATALOG.items():
                 if search_term in key or key in search_term:
-                    similar_protocols.append(DEFI_PROTOCOLS.get(key, {}).get('name', key.upper()))
+                    similar_protocols.append(proto.name)
             
             # If no matches found by key, try searching in descriptions
             if not similar_protocols:
-                for key, proto in DEFI_PROTOCOLS.items():
-                    if search_term in proto['description'].lower():
-                        similar_protocols.append(proto['name'])
+                for key, proto in DEFI_CATALOG.items():
+                    if search_term in proto.description.lower():
+                        similar_protocols.append(proto.name)
             
             if similar_protocols:
                 suggestions = ", ".join(similar_protocols)
                 return f"'{protocol_name}' not found. Did you mean one of these: {suggestions}?"
             else:
-                solana_protocols = [DEFI_PROTOCOLS[k]["name"] for k in DEFI_PROTOCOLS if DEFI_PROTOCOLS[k].get("ecosystem") == "Solana"]
-                cosmos_protocols = [DEFI_PROTOCOLS[k]["name"] for k in DEFI_PROTOCOLS if DEFI_PROTOCOLS[k].get("ecosystem") == "Cosmos"]
-                cross_protocols = [DEFI_PROTOCOLS[k]["name"] for k in DEFI_PROTOCOLS if DEFI_PROTOCOLS[k].get("ecosystem") == "Cross-Ecosystem"]
+                solana_protocols = [DEFI_CATALOG[key].name for key in DEFI_INDEX.with_value("ecosystem", "Solana")]
+                cosmos_protocols = [DEFI_CATALOG[key].name for key in DEFI_INDEX.with_value("ecosystem", "Cosmos")]
+                cross_protocols = [DEFI_CATALOG[key].name for key in DEFI_INDEX.with_value("ecosystem", "Cross-Ecosystem")]
                 
                 result = f"Information about '{protocol_name}' not found in our database. Please try one of these protocols:\n\n"
                 
@@ -639,5 +726,13 @@ async def get_defi_protocol_info(protocol_name: str) -> str:
     except Exception as e:
         return f"Error fetching DeFi protocol information: {str(e)}"
 
-# Make sure DEFI_PROTOCOLS is exported
-__all__ = ["DeFiProtocolRequest", "DeFiProtocolResponse", "get_defi_protocol_info", "DEFI_PROTOCOLS"] 
\ No newline at end of file
+__all__ = [
+    "DeFiProtocolRequest",
+    "DeFiProtocolResponse",
+    "ProtocolQueryRequest",
+    "ProtocolQueryResponse",
+    "get_defi_protocol_info",
+    "query_protocols",
+    "rank_protocols",
+    "DEFI_CATALOG",
+] 
\ No newline at end of file
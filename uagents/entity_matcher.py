@@ -0,0 +1,140 @@
+import re
+from collections import deque
+from typing import NamedTuple
+
+
+class Entity(NamedTuple):
+    kind: str  # "protocol", "technology" or "ecosystem"
+    key: str  # Catalog key; for ecosystems, the lowercase ecosystem name
+    name: str  # Display name
+
+
+class EntityMatch(NamedTuple):
+    entity: Entity
+    start: int  # Offsets of the match in the scanned text
+    end: int
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def entry_terms(key: str, entry) -> set:
+    """Lowercase names a user might use for a catalog entry, e.g. 'soon svm', 'svm' or 'solana virtual machine'"""
+    name = entry.name.lower()
+    terms = {key.replace("_", " "), name, *(alias.lower() for alias in entry.aliases)}
+    match = re.match(r"^(.*?)\s*\((.*)\)$", name)
+    if match:
+        terms.update(match.groups())
+    return {term.strip() for term in terms if term.strip()}
+
+
+def catalog_terms(catalog: dict, kind: str) -> dict:
+    """term -> Entity for every key, name, parenthesized short name and alias in a catalog"""
+    terms = {}
+    for key, entry in catalog.items():
+        entity = Entity(kind, key, entry.name)
+        for term in entry_terms(key, entry):
+            terms.setdefault(term, entity)
+    return terms
+
+
+def ecosystem_terms(catalog: dict) -> dict:
+    """term -> Entity for the chains and ecosystems named in entries' ecosystem and blockchain fields"""
+    terms = {}
+    for entry in catalog.values():
+        for field in (entry.ecosystem, entry.blockchain):
+            for name in (field or "").split(","):
+                name = name.strip()
+                if name:
+                    terms.setdefault(name.lower(), Entity("ecosystem", name.lower(), name))
+    return terms
+
+
+class EntityMatcher:
+    """
+    Aho-Corasick automaton over lowercase terms. find() scans a text in one pass, however many terms
+    there are, and returns whole-word matches; where matches overlap, the longest one wins.
+    """
+
+    def __init__(self, terms: dict):
+        # State 0 is the root. Per state: failure link, and (length, entity, left bounded, right bounded)
+        # for every term ending there, including those reached through failure links
+        transitions = [{}]
+        self.fail = [0]
+        self.outputs = [()]
+        for term, entity in terms.items():
+            self._insert(transitions, term.lower(), entity)
+        self._link(transitions)
+        # One flat dict keyed by state and character; a dict per state took about 2.6 KB per catalog entry
+        self.goto = {
+            (state << 21) | ord(char): following
+            for state, edges in enumerate(transitions)
+            for char, following in edges.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.fail)
+
+    def _insert(self, transitions: list, term: str, entity: Entity):
+        state = 0
+        for char in term:
+            following = transitions[state].get(char)
+            if following is None:
+                following = len(transitions)
+                transitions[state][char] = following
+                transitions.append({})
+                self.fail.append(0)
+                self.outputs.append(())
+            state = following
+        # A boundary is only needed where the term starts or ends with a word character, like \b in a regex
+        self.outputs[state] = ((len(term), entity, _is_word_char(term[0]), _is_word_char(term[-1])),)
+
+    def _link(self, transitions: list):
+        queue = deque(transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in transitions[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = transitions[fallback].get(char, 0)
+                self.outputs[following] += self.outputs[self.fail[following]]
+                queue.append(following)
+
+    def find(self, text: str) -> list:
+        """Non-overlapping whole-word EntityMatches in text order"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            origins = range(len(text))
+        else:
+            # lower() expanded a character (e.g. "İ"); map each lowercase position back to its index in text
+            origins = [index for index, char in enumerate(text) for _ in char.lower()]
+
+        candidates = []
+        state = 0
+        for position, char in enumerate(lowered):
+            code = ord(char)
+            following = goto.get((state << 21) | code)
+            while following is None and state:
+                state = fail[state]
+                following = goto.get((state << 21) | code)
+            state = following or 0
+            for length, entity, left_bounded, right_bounded in outputs[state]:
+                start, end = origins[position - length + 1], origins[position] + 1
+                if left_bounded and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if right_bounded and end < len(text) and _is_word_char(text[end]):
+                    continue
+                candidates.append(EntityMatch(entity, start, end))
+
+        chosen = []
+        for match in sorted(candidates, key=lambda match: (match.start - match.end, match.start)):
+            if all(match.end <= taken.start or match.start >= taken.end for taken in chosen):
+                chosen.append(match)
+        return sorted(chosen, key=lambda match: match.start)
+
+    def entities(self, text: str) -> list:
+        """Distinct entities mentioned in text, in order of first mention"""
+        return list(dict.fromkeys(match.entity for match in self.find(text)))
@@ -0,0 +1,151 @@
+"""
+Export the agent catalog (DEFI_CATALOG and TECHNOLOGY_CATALOG) as static JSON bundles for the frontend.
+
+Every entry gets its own file, named by a hash of its content, plus an index of all entries pointing at
+those files. Each file is written with precompressed .gz (and .br, when the brotli package is installed)
+variants next to it. Content-hashed files never change, so they can be served as immutable assets; only
+manifest.json, which names the current index, needs a short cache lifetime.
+
+Usage: python uagents/export_catalog.py [--out public/catalog] [--prune]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import entry_to_dict
+from defi_protocol import DEFI_CATALOG
+from model import TECHNOLOGY_CATALOG
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "public", "catalog")
+HASH_LENGTH = 12  # Hex digits of the content hash in file names
+
+
+def render(data) -> bytes:
+    # Sorted keys and fixed separators so the same catalog always produces the same bytes (and hashes)
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+
+
+def slug(key: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", key.lower()).strip("-")
+
+
+class BundleWriter:
+    """Writes files under one output directory with their compressed variants, remembering what it wrote"""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.written = set()
+        self.raw_bytes = 0
+        self.gzip_bytes = 0
+        self.brotli_bytes = 0
+
+    def write(self, relative_path: str, body: bytes):
+        self._write_file(relative_path, body)
+        self.raw_bytes += len(body)
+        # mtime=0 keeps the .gz bytes identical between runs
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        self._write_file(relative_path + ".gz", compressed)
+        self.gzip_bytes += len(compressed)
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            self._write_file(relative_path + ".br", compressed)
+            self.brotli_bytes += len(compressed)
+
+    def write_hashed(self, directory: str, name: str, body: bytes) -> str:
+        """Write body as directory/name.<hash>.json and return that path"""
+        relative_path = f"{name}.{content_hash(body)}.json"
+        if directory:
+            relative_path = f"{directory}/{relative_path}"
+        self.write(relative_path, body)
+        return relative_path
+
+    def _write_file(self, relative_path: str, body: bytes):
+        path = os.path.join(self.out_dir, relative_path)
+        self.written.add(os.path.normpath(path))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Hashed files with unchanged content are already correct on disk
+        if os.path.exists(path) and os.path.getsize(path) == len(body):
+            with open(path, "rb") as f:
+                if f.read() == body:
+                    return
+        with open(path, "wb") as f:
+            f.write(body)
+
+    def prune(self) -> int:
+        """Delete files under the output directory that this export didn't write"""
+        removed = 0
+        for root, _, files in os.walk(self.out_dir):
+            for name in files:
+                path = os.path.normpath(os.path.join(root, name))
+                if path not in self.written:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def export_section(writer: BundleWriter, directory: str, catalog: dict) -> dict:
+    """Write one file per entry and return the index rows for the section"""
+    rows = {}
+    for key, entry in catalog.items():
+        data = {"key": key, **entry_to_dict(entry)}
+        rows[key] = {
+            "name": entry.name,
+            "category": entry.category,
+            "ecosystem": entry.ecosystem,
+            "path": writer.write_hashed(directory, slug(key), render(data)),
+        }
+    return rows
+
+
+def export_catalog(out_dir: str = DEFAULT_OUT, prune: bool = False) -> dict:
+    """Export both catalogs under out_dir and return the manifest"""
+    writer = BundleWriter(out_dir)
+    index = {
+        "protocols": export_section(writer, "protocols", DEFI_CATALOG),
+        "technologies": export_section(writer, "technologies", TECHNOLOGY_CATALOG),
+    }
+    index_body = render(index)
+    manifest = {
+        "index": writer.write_hashed("", "index", index_body),
+        "version": content_hash(index_body),
+        "protocols": len(DEFI_CATALOG),
+        "technologies": len(TECHNOLOGY_CATALOG),
+        "encodings": ["gzip", "br"] if brotli is not None else ["gzip"],
+    }
+    writer.write("manifest.json", render(manifest))
+
+    removed = writer.prune() if prune else 0
+    print(f"Exported {manifest['protocols']} protocols and {manifest['technologies']} technologies to {out_dir}")
+    print(f"   index: {manifest['index']}")
+    print(f"   {len(writer.written)} files, {writer.raw_bytes} bytes raw, {writer.gzip_bytes} gzip", end="")
+    print(f", {writer.brotli_bytes} brotli" if brotli is not None else " (pip install brotli for .br variants)")
+    if prune:
+        print(f"   removed {removed} stale files")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default=DEFAULT_OUT, help="output directory (default: public/catalog)")
+    parser.add_argument("--prune", action="store_true", help="delete files from earlier exports")
+    args = parser.parse_args()
+    export_catalog(args.out, args.prune)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Thin front agent for a sharded deployment.
+
+Clients talk to the front exactly as they would to a single agent. It forwards DeFiProtocolRequest,
+ProtocolInfoRequest, ProtocolsListRequest, PagedProtocolsListRequest, ProtocolQueryRequest, their
+compact variants and chat messages to shard agents (each one a copy of agent.py), in the client's
+session, and relays the shards' replies back to the client of that session as they arrive. No handler
+waits for a shard, so a slow or dead shard doesn't hold up the front's other traffic. Chat messages
+are acknowledged by the front itself. Protocol requests go to the shard that owns the protocol's
+ecosystem; chat sessions and everything else are spread over the shards by consistent hashing of the
+session id. Per-sender quotas are enforced here, so shards should list the front in
+TRUSTED_FRONT_ADDRESSES.
+
+Usage:
+    python front_agent.py                      # shards from SHARDS / SHARDS_FILE, on other hosts
+    python front_agent.py --bureau solana@Solana cosmos@Cosmos general
+                                               # front and local shards in one Bureau on this machine
+"""
+import argparse
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from uagents import Agent, Bureau, Context, Model, Protocol
+from uagents.experimental.quota import AccessControlList, RateLimit
+from uagents_core.contrib.protocols.chat import ChatAcknowledgement, ChatMessage, chat_protocol_spec
+from uagents_core.models import ErrorMessage
+from uagents_core.protocol import ProtocolSpecification
+from uagents_core.types import DeliveryStatus
+
+from defi_protocol import DeFiProtocolRequest, DeFiProtocolResponse, ProtocolQueryRequest, ProtocolQueryResponse
+from compact import CompactDeFiProtocolRequest, CompactProtocolInfoRequest, CompactResponse
+from http_pool import PooledDispenser, check_dispenser_running, install_dispenser
+from llm_routing import ResponseTimeTracker
+from loop_monitor import loop_monitor, watch_handlers
+from metrics import metrics
+from model import (
+    PagedProtocolsListRequest,
+    PagedProtocolsListResponse,
+    ProtocolInfoRequest,
+    ProtocolInfoResponse,
+    ProtocolsListRequest,
+    ProtocolsListResponse,
+)
+from quota_ledger import QuotaLedger, WeightedQuotaProtocol
+from resolver_cache import endpoint_resolver
+from rest_api import install_bureau_rest_server
+from sharding import Shard, ShardRouter, parse_shards
+from wire_cache import schema_digest
+
+FRONT_AGENT_NAME = os.getenv("FRONT_AGENT_NAME", "emrys-front")
+PORT = int(os.getenv("PORT", "8080"))
+FRONT_URL = os.getenv("FRONT_URL", f"http://localhost:{PORT}")
+if not FRONT_URL.startswith(("http://", "https://")):
+    FRONT_URL = f"https://{FRONT_URL}"
+
+SHARDS = os.getenv("SHARDS", "")  # name=address@Ecosystem|Ecosystem, comma separated
+SHARDS_FILE = os.getenv("SHARDS_FILE", "")  # Same format; re-read when it changes, so shards can be added without a restart
+SHARDS_RELOAD_SECONDS = float(os.getenv("SHARDS_RELOAD_SECONDS", "10"))
+FRONT_ROUTE_TTL_SECONDS = float(os.getenv("FRONT_ROUTE_TTL_SECONDS", "600"))  # Sessions idle this long may move to another shard
+FRONT_MAX_ROUTES = int(os.getenv("FRONT_MAX_ROUTES", "100000"))  # Sessions remembered for relaying replies
+FRONT_QUOTA_SNAPSHOT_PATH = os.getenv("FRONT_QUOTA_SNAPSHOT_PATH", "front_quota_snapshot.json")
+QUOTA_SNAPSHOT_SECONDS = float(os.getenv("QUOTA_SNAPSHOT_SECONDS", "30"))
+
+
+class Route(NamedTuple):
+    sender: str  # Who to relay the shard's replies to
+    protocol_digest: Optional[str]
+    shard: str
+    forwarded_at: float
+
+
+def load_shards() -> list:
+    if SHARDS_FILE and os.path.exists(SHARDS_FILE):
+        with open(SHARDS_FILE, encoding="utf-8") as file:
+            return parse_shards(file.read().replace("\n", ","))
+    return parse_shards(SHARDS)
+
+
+front = Agent(name=FRONT_AGENT_NAME, port=PORT, endpoint=[f"{FRONT_URL}/submit"], resolve=endpoint_resolver)
+install_dispenser(front, PooledDispenser())
+
+router = ShardRouter(load_shards(), session_ttl_seconds=FRONT_ROUTE_TTL_SECONDS, max_sessions=FRONT_MAX_ROUTES)
+routes = OrderedDict()  # session id -> Route
+shards_file_mtime = None
+relay_latencies = ResponseTimeTracker(window_size=500, min_samples=1)
+
+front_ledger = QuotaLedger(FRONT_QUOTA_SNAPSHOT_PATH)
+# Same names, versions, models and replies as the shards' protocols, so clients see the same protocol digests.
+# The replies come from the specifications only: the shard sends them, after the front's handler has returned.
+front_proto = WeightedQuotaProtocol(
+    front_ledger,
+    spec=ProtocolSpecification(
+        name="Emrys-Solana-Cosmos-DeFi-Protocol-Education",
+        version="0.1.0",
+        interactions={
+            ProtocolInfoRequest: {ProtocolInfoResponse, ErrorMessage},
+            ProtocolsListRequest: {ProtocolsListResponse},
+            DeFiProtocolRequest: {DeFiProtocolResponse, ErrorMessage},
+        },
+    ),
+    default_rate_limit=RateLimit(window_size_minutes=60, max_requests=60),
+    default_acl=AccessControlList(default=True, bypass_rate_limit=set()),
+)
+front_proto_v2 = WeightedQuotaProtocol(
+    front_ledger,
+    spec=ProtocolSpecification(
+        name="Emrys-Solana-Cosmos-DeFi-Protocol-Education",
+        version="0.2.0",
+        interactions={
+            PagedProtocolsListRequest: {PagedProtocolsListResponse, ErrorMessage},
+            ProtocolQueryRequest: {ProtocolQueryResponse},
+            CompactProtocolInfoRequest: {CompactResponse, ErrorMessage},
+            CompactDeFiProtocolRequest: {CompactResponse, ErrorMessage},
+        },
+    ),
+    default_rate_limit=RateLimit(window_size_minutes=60, max_requests=60),
+    default_acl=front_proto.default_acl,
+)
+front_chat_proto = Protocol(spec=chat_protocol_spec)
+# Shards' replies to protocol requests; kept out of front_proto so its digest matches the shards'
+relay_proto = Protocol(name="Emrys-Shard-Relay", version="0.1.0")
+
+
+class MetricsResponse(Model):
+    timestamp: int
+    metrics: dict
+
+
+def unavailable() -> ErrorMessage:
+    return ErrorMessage(error="Service temporarily unavailable, please retry")
+
+
+async def ask_shard(ctx: Context, sender: str, msg: Model, shard: Optional[Shard]):
+    """Forward a client's protocol request to a shard; the client gets an error if it can't be delivered"""
+    if not await forward(ctx, sender, msg, shard):
+        await ctx.send(sender, unavailable())
+
+
+async def forward(ctx: Context, sender: str, msg: Model, shard: Optional[Shard]) -> bool:
+    """Send a client's message to a shard in the client's session, remembering where replies go"""
+    if shard is None:
+        ctx.logger.error(f"No shard to forward {type(msg).__name__} to; set SHARDS or SHARDS_FILE")
+        return False
+    session_id = str(ctx.session)
+    routes[session_id] = Route(sender, ctx._protocol[0], shard.name, time.monotonic())
+    routes.move_to_end(session_id)
+    while len(routes) > FRONT_MAX_ROUTES:
+        routes.popitem(last=False)
+    metrics.set_gauge("front_routes", len(routes))
+
+    status = await ctx.send_raw(
+        shard.address,
+        schema_digest(type(msg)),
+        msg.model_dump_json(),
+        protocol_digest=ctx._protocol[0],
+    )
+    if status.status == DeliveryStatus.FAILED:
+        metrics.increment("front_forward_failures_total", shard=shard.name)
+        ctx.logger.error(f"Failed to forward {type(msg).__name__} to shard {shard.name}: {status.detail}")
+        return False
+    metrics.increment("front_forwarded_total", shard=shard.name, message=type(msg).__name__)
+    return True
+
+
+def record_shard_latency(shard: str, seconds: float):
+    relay_latencies.record(shard, seconds)
+    for pct in (50, 95):
+        metrics.set_gauge(f"front_shard_reply_seconds_p{pct}", round(relay_latencies.percentile(shard, pct), 4), shard=shard)
+
+
+async def relay(ctx: Context, sender: str, msg: Model):
+    """Pass a shard's message on to the client whose session it belongs to"""
+    route = routes.get(str(ctx.session))
+    if route is None:
+        metrics.increment("front_unroutable_total", message=type(msg).__name__)
+        ctx.logger.warning(f"No client for {type(msg).__name__} from {sender} in session {ctx.session}")
+        return
+    record_shard_latency(route.shard, time.monotonic() - route.forwarded_at)
+
+    await ctx.send_raw(
+        route.sender,
+        schema_digest(type(msg)),
+        msg.model_dump_json(),
+        protocol_digest=route.protocol_digest,
+        queries=ctx._queries,
+    )
+    metrics.increment("front_relayed_total", message=type(msg).__name__)
+
+
+def reload_shards(logger):
+    """Pick up an edited SHARDS_FILE; sessions already on a shard that is still listed stay there"""
+    global shards_file_mtime
+    if not SHARDS_FILE or not os.path.exists(SHARDS_FILE):
+        return
+    mtime = os.path.getmtime(SHARDS_FILE)
+    if mtime == shards_file_mtime:
+        return
+    try:
+        shards = load_shards()
+    except ValueError as err:
+        logger.error(f"Keeping the current shards, {SHARDS_FILE} is invalid: {err}")
+        return
+    shards_file_mtime = mtime
+    router.update(shards)
+    metrics.set_gauge("front_shards", len(shards))
+    logger.info(f"Routing to {len(shards)} shards: {', '.join(shard.name for shard in shards)}")
+
+
+@front.on_event("startup")
+async def startup(ctx: Context):
+    check_dispenser_running(ctx, front)
+    loop_monitor.start()
+    reload_shards(ctx.logger)
+    if not router.shards:
+        ctx.logger.error("No shards configured; set SHARDS or SHARDS_FILE")
+    endpoint_resolver.warm([shard.address for shard in router.shards.values()])
+
+
+@front.on_event("shutdown")
+async def shutdown(ctx: Context):
+    front_ledger.snapshot()
+    await loop_monitor.stop()
+
+
+@front.on_interval(period=SHARDS_RELOAD_SECONDS)
+async def watch_shards(ctx: Context):
+    reload_shards(ctx.logger)
+
+
+@front.on_interval(period=QUOTA_SNAPSHOT_SECONDS)
+async def snapshot_quota_usage(ctx: Context):
+    front_ledger.snapshot()
+
+
+@front.on_rest_get("/metrics", MetricsResponse)
+async def get_metrics(ctx: Context) -> MetricsResponse:
+    return MetricsResponse(timestamp=int(time.time()), metrics=metrics.snapshot())
+
+
+@front_proto.on_message(ProtocolInfoRequest, cost=1.0)
+async def get_protocol_info(ctx: Context, sender: str, msg: ProtocolInfoRequest):
+    await ask_shard(ctx, sender, msg, router.for_protocol(msg.protocol_name))
+
+
+@front_proto.on_message(ProtocolsListRequest, cost=0.1)
+async def get_protocols_list(ctx: Context, sender: str, msg: ProtocolsListRequest):
+    # Every shard has the whole catalog; the session keeps a client's pages on one shard
+    await ask_shard(ctx, sender, msg, router.for_session(str(ctx.session)))
+
+
+@front_proto.on_message(DeFiProtocolRequest, cost=1.0)
+async def handle_request(ctx: Context, sender: str, msg: DeFiProtocolRequest):
+    await ask_shard(ctx, sender, msg, router.for_protocol(msg.protocol_name))
+
+
+@front_proto_v2.on_message(CompactProtocolInfoRequest, cost=1.0)
+async def get_protocol_info_compact(ctx: Context, sender: str, msg: CompactProtocolInfoRequest):
+    await ask_shard(ctx, sender, msg, router.for_protocol(msg.protocol_name))
+
+
+@front_proto_v2.on_message(PagedProtocolsListRequest, cost=0.1)
+async def get_protocols_page(ctx: Context, sender: str, msg: PagedProtocolsListRequest):
+    # Every shard has the whole catalog; the session keeps a client's pages on one shard
+    await ask_shard(ctx, sender, msg, router.for_session(str(ctx.session)))
+
+
+@front_proto_v2.on_message(ProtocolQueryRequest, cost=0.1)
+async def query_protocols_handler(ctx: Context, sender: str, msg: ProtocolQueryRequest):
+    await ask_shard(ctx, sender, msg, router.for_ecosystem(msg.ecosystem) or router.for_session(str(ctx.session)))
+
+
+@front_proto_v2.on_message(CompactDeFiProtocolRequest, cost=1.0)
+async def handle_request_compact(ctx: Context, sender: str, msg: CompactDeFiProtocolRequest):
+    await ask_shard(ctx, sender, msg, router.for_protocol(msg.protocol_name))
+
+
+# The front acknowledges every chat message itself, from clients and shards alike, and consumes the
+# acknowledgements it gets, so each hop is acknowledged by the agent it was sent to
+@front_chat_proto.on_message(ChatMessage)
+async def handle_chat_message(ctx: Context, sender: str, msg: ChatMessage):
+    await ctx.send(sender, ChatAcknowledgement(timestamp=datetime.utcnow(), acknowledged_msg_id=msg.msg_id))
+    if router.is_shard(sender):
+        await relay(ctx, sender, msg)
+    else:
+        await forward(ctx, sender, msg, router.for_session(str(ctx.session)))
+
+
+@front_chat_proto.on_message(ChatAcknowledgement)
+async def handle_chat_ack(ctx: Context, sender: str, msg: ChatAcknowledgement):
+    metrics.increment("front_chat_acks_total", source="shard" if router.is_shard(sender) else "client")
+
+
+async def relay_reply(ctx: Context, sender: str, msg: Model):
+    if not router.is_shard(sender):
+        ctx.logger.warning(f"Ignoring {type(msg).__name__} from {sender}, which isn't a shard")
+        return
+    await relay(ctx, sender, msg)
+
+
+for reply_model in (
+    ProtocolInfoResponse,
+    ProtocolsListResponse,
+    PagedProtocolsListResponse,
+    ProtocolQueryResponse,
+    DeFiProtocolResponse,
+    CompactResponse,
+):
+    relay_proto.on_message(reply_model)(relay_reply)
+# The agent's own protocol already handles ErrorMessage (by logging it); this replaces that handler
+front.on_message(ErrorMessage)(relay_reply)
+
+front.include(front_proto, publish_manifest=True)
+front.include(front_proto_v2, publish_manifest=True)
+front.include(front_chat_proto, publish_manifest=True)
+front.include(relay_proto)
+watch_handlers(front)
+
+
+def run_bureau(specs: list):
+    """
+    Run the front and local shards in one Bureau, so forwarding is an in-process dispatch. The first
+    shard is agent.py's agent (with its startup, shutdown and REST handlers, whose GET routes the Bureau
+    serves on PORT); the others share its protocols and in-process caches but have their own address and storage.
+    """
+    import agent as shard_module
+
+    shard_agents = [shard_module.agent]
+    for spec in specs[1:]:
+        name = spec.partition("@")[0]
+        shard_agent = Agent(name=f"{shard_module.AGENT_NAME}-{name}")
+        shard_agent.include(shard_module.proto)
+        shard_agent.include(shard_module.proto_v2)
+        shard_agent.include(shard_module.chat_proto)
+        shard_agent.include(shard_module.struct_output_client_proto)
+        watch_handlers(shard_agent)
+        shard_agents.append(shard_agent)
+
+    router.update([
+        Shard(spec.partition("@")[0], shard_agent.address, tuple(e for e in spec.partition("@")[2].split("|") if e))
+        for spec, shard_agent in zip(specs, shard_agents)
+    ])
+    # The front already charged the client's quota
+    shard_module.proto.default_acl.bypass_rate_limit.add(front.address)
+
+    bureau = Bureau(port=PORT, endpoint=[f"{FRONT_URL}/submit"])
+    install_bureau_rest_server(bureau, shard_module.rest_server)
+    bureau.add(front)
+    for shard_agent in shard_agents:
+        bureau.add(shard_agent)
+    print(f"Front {front.address} routing to {len(shard_agents)} local shards on port {PORT}")
+    bureau.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Routing front agent for sharded deployments")
+    parser.add_argument("--bureau", nargs="+", metavar="NAME[@Ecosystem|Ecosystem]", help="run local shards in one Bureau")
+    args = parser.parse_args()
+    if args.bureau:
+        run_bureau(args.bureau)
+    else:
+        print(f"Front {front.address} on port {PORT}")
+        front.run()
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import time
+from importlib.metadata import version
+from typing import Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from pydantic import ValidationError
+from uagents.communication import Dispenser, dispatch_sync_response_envelope
+from uagents_core.envelope import Envelope
+from uagents_core.types import DeliveryStatus, MsgStatus
+
+from llm_routing import ResponseTimeTracker
+from metrics import metrics
+
+LOGGER = logging.getLogger("http_pool")
+
+
+def _trace_config(latencies: ResponseTimeTracker) -> aiohttp.TraceConfig:
+    """Count new vs reused connections and time connection setup (TCP + TLS) and DNS lookups"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.host = params.url.host
+        context.started = time.monotonic()
+
+    async def on_connection_create_start(session, context, params):
+        context.connect_started = time.monotonic()
+
+    async def on_connection_create_end(session, context, params):
+        latencies.record("connect", time.monotonic() - context.connect_started)
+        metrics.increment("http_connections_created_total", host=context.host)
+
+    async def on_connection_reuseconn(session, context, params):
+        metrics.increment("http_connections_reused_total", host=context.host)
+
+    async def on_dns_resolvehost_start(session, context, params):
+        context.dns_started = time.monotonic()
+
+    async def on_dns_resolvehost_end(session, context, params):
+        latencies.record("dns", time.monotonic() - context.dns_started)
+
+    async def on_dns_cache_hit(session, context, params):
+        metrics.increment("http_dns_cache_hits_total")
+
+    async def on_dns_cache_miss(session, context, params):
+        metrics.increment("http_dns_cache_misses_total")
+
+    async def on_request_end(session, context, params):
+        latencies.record("request", time.monotonic() - context.started)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_start.append(on_connection_create_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+class PooledDispenser(Dispenser):
+    """
+    Envelope dispenser that delivers over one shared keep-alive aiohttp session instead of a new
+    session (and TCP/TLS handshake) per envelope, and sends up to max_concurrency envelopes at once
+    instead of one after another. Delivery semantics otherwise match uagents' send_exchange_envelope.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 16,
+        dns_ttl_seconds: int = 300,
+        keepalive_seconds: float = 30,
+        request_timeout_seconds: float = 30,
+        max_concurrency: int = 32,
+    ):
+        super().__init__()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl_seconds = dns_ttl_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.request_timeout_seconds = request_timeout_seconds
+        self.max_concurrency = max_concurrency
+        self.latencies = ResponseTimeTracker(window_size=500, min_samples=1)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.tasks = set()
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl_seconds,
+                keepalive_timeout=self.keepalive_seconds,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout_seconds),
+                trace_configs=[_trace_config(self.latencies)],
+            )
+        return self.session
+
+    async def send_envelope(self, envelope: Envelope, endpoints: list, sync: bool = False):
+        """Deliver an envelope to the first endpoint that accepts it; returns a MsgStatus or sync reply"""
+        headers = {"content-type": "application/json"}
+        if sync:
+            headers["x-uagents-connection"] = "sync"
+        body = envelope.model_dump_json()
+        errors = []
+        for endpoint in endpoints:
+            try:
+                async with self._session().post(endpoint, headers=headers, data=body) as resp:
+                    if resp.status == 200:
+                        if sync:
+                            env = Envelope.model_validate(await resp.json())
+                            if env.signature:
+                                verified = False
+                                try:
+                                    verified = env.verify()
+                                except Exception as ex:
+                                    errors.append(f"Received response envelope that failed verification: {ex}")
+                                if not verified:
+                                    continue
+                            return await dispatch_sync_response_envelope(env, endpoint)
+                        return MsgStatus(
+                            status=DeliveryStatus.DELIVERED,
+                            detail="Message successfully delivered via HTTP",
+                            destination=envelope.target,
+                            endpoint=endpoint,
+                            session=envelope.session,
+                        )
+                    text = await resp.text()
+                    try:
+                        detail = json.loads(text).get("detail", text)
+                    except (json.JSONDecodeError, AttributeError):
+                        detail = text
+                errors.append(f"{resp.status}: {detail}")
+            except aiohttp.ClientConnectorError as ex:
+                errors.append(f"Failed to connect: {ex}")
+            except ValidationError as ex:
+                errors.append(f"Invalid sync response: {ex}")
+            except Exception as ex:
+                errors.append(f"Failed to send message: {ex}")
+            metrics.increment("http_delivery_errors_total", host=urlsplit(endpoint).hostname or "")
+        LOGGER.error(f"Failed to deliver message to {envelope.target} @ {endpoints}: {errors}")
+        return MsgStatus(
+            status=DeliveryStatus.FAILED,
+            detail="Message delivery failed",
+            destination=envelope.target,
+            endpoint="",
+            session=envelope.session,
+        )
+
+    async def _process_envelope(self, env, endpoints, response_future, sync):
+        try:
+            result = await self.send_envelope(env, endpoints, sync)
+            if not response_future.done():
+                response_future.set_result(result)
+        except Exception as err:
+            if response_future.done():
+                return
+            LOGGER.error(f"Failed to send envelope: {err}")
+            response_future.set_exception(err)
+        finally:
+            self._update_metrics()
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def process(item):
+            async with semaphore:
+                await self._process_envelope(*item)
+
+        try:
+            while True:
+                item = await self._envelopes.get()
+                task = asyncio.create_task(process(item))
+                self.tasks.add(task)
+                task.add_done_callback(self._task_done)
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            LOGGER.info("Shutting down pooled dispenser...")
+            while not self._envelopes.empty():
+                await self._process_envelope(*self._envelopes.get_nowait())
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            if self.session is not None:
+                await self.session.close()
+            LOGGER.info("Shutting down pooled dispenser...complete")
+
+    def _task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        metrics.set_gauge("http_envelopes_in_flight", len(self.tasks))
+
+    def _update_metrics(self):
+        metrics.set_gauge("http_envelopes_in_flight", len(self.tasks))
+        for stage in ("connect", "dns", "request"):
+            for pct in (50, 95):
+                value = self.latencies.percentile(stage, pct)
+                if value is not None:
+                    metrics.set_gauge(f"http_{stage}_seconds_p{pct}", round(value, 4))
+
+
+# uagents has no public hook for the dispenser, so install_dispenser() replaces the private Agent._dispenser.
+# requirements.txt pins the uagents release this was checked against; these checks catch a release that moved it.
+def install_dispenser(agent, dispenser: PooledDispenser):
+    """Replace an agent's uagents dispenser with a pooled one"""
+    if not isinstance(getattr(agent, "_dispenser", None), Dispenser):
+        raise RuntimeError(f"uagents {version('uagents')} has no Agent._dispenser to replace; update http_pool.py")
+    agent._dispenser = dispenser
+
+
+def check_dispenser_running(ctx, agent):
+    """Raise if uagents isn't sending this agent's envelopes through the dispenser install_dispenser() set"""
+    task = getattr(agent, "_dispenser_task", None)
+    running = task is not None and not task.done() and task.get_coro().__qualname__ == "PooledDispenser.run"
+    if not running or getattr(ctx, "_dispenser", None) is not agent._dispenser:
+        raise RuntimeError(f"uagents {version('uagents')} isn't using the pooled dispenser; update http_pool.py")
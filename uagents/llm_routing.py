@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+LOGGER = logging.getLogger("llm_routing")
+
+
+class ResponseTimeTracker:
+    """Keep a sliding window of recent LLM round-trip times per agent address"""
+
+    def __init__(self, window_size: int = 200, min_samples: int = 20):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.samples = {}
+
+    def record(self, address: str, seconds: float):
+        if address not in self.samples:
+            self.samples[address] = deque(maxlen=self.window_size)
+        self.samples[address].append(seconds)
+
+    def percentile(self, address: str, pct: float) -> Optional[float]:
+        """Return the pct-th percentile for an address, or None while there are too few samples"""
+        window = self.samples.get(address)
+        if not window or len(window) < self.min_samples:
+            return None
+        ordered = sorted(window)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> dict:
+        return {address: list(window) for address, window in self.samples.items()}
+
+    def restore(self, data: dict):
+        for address, samples in data.items():
+            for seconds in samples:
+                self.record(address, seconds)
+
+
+def log_task_failure(logger, description: str):
+    """Done-callback that logs the exception a background task ended with, which asyncio would otherwise drop"""
+
+    def callback(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"{description} failed: {task.exception()!r}")
+
+    return callback
+
+
+class PendingExtraction:
+    def __init__(self, batch_id: str, prompt, members: Optional[dict] = None):
+        self.batch_id = batch_id
+        self.prompt = prompt
+        # Chat sessions answered by this request (session id -> context); more than one for batched prompts
+        self.members = members or {}
+        # address -> time.monotonic() when the prompt was sent there
+        self.sent_at = {}
+        self.hedge_task: Optional[asyncio.Task] = None
+        self.timed_out = False  # A member session already gave up waiting and counted as a breaker failure
+
+
+class ExtractionRegistry:
+    """
+    Track in-flight structured-output requests by batch id, so the first reply per batch wins. Each chat
+    session is answered by the latest batch it joined; a newer turn only takes its own session out of
+    the older batch, and the rest of that batch is still answered by it.
+    """
+
+    def __init__(self, completed_history: int = 1000):
+        self.pending = {}
+        self.completed = OrderedDict()
+        self.completed_history = completed_history
+        self.batches = {}  # chat session id -> id of the batch that answers it
+
+    def start(self, batch_id: str, prompt, members: Optional[dict] = None) -> PendingExtraction:
+        extraction = PendingExtraction(batch_id, prompt, members)
+        self.pending[batch_id] = extraction
+        for session_id in extraction.members:
+            self.detach(session_id)
+            self.batches[session_id] = batch_id
+        return extraction
+
+    def mark_sent(self, batch_id: str, address: str):
+        extraction = self.pending.get(batch_id)
+        if extraction is not None:
+            extraction.sent_at[address] = time.monotonic()
+
+    def get(self, batch_id: str) -> Optional[PendingExtraction]:
+        return self.pending.get(batch_id)
+
+    def current_members(self, batch_id: str) -> dict:
+        """The members of a batch that haven't moved on to a newer batch or been answered otherwise"""
+        extraction = self.pending.get(batch_id)
+        if extraction is None:
+            return {}
+        return {
+            session_id: ctx for session_id, ctx in extraction.members.items()
+            if self.batches.get(session_id) == batch_id
+        }
+
+    def detach(self, session_id: str):
+        """Stop answering a chat session from its batch, closing the batch once no member is left"""
+        batch_id = self.batches.pop(session_id, None)
+        if batch_id is not None and not self.current_members(batch_id):
+            self.complete(batch_id)
+
+    def complete(self, batch_id: str) -> Optional[PendingExtraction]:
+        """Close a batch's extraction; returns None if it was already answered or never started"""
+        extraction = self.pending.pop(batch_id, None)
+        if extraction is None:
+            return None
+        if extraction.hedge_task:
+            extraction.hedge_task.cancel()
+        for session_id in extraction.members:
+            if self.batches.get(session_id) == batch_id:
+                del self.batches[session_id]
+        self.completed[batch_id] = extraction
+        while len(self.completed) > self.completed_history:
+            self.completed.popitem(last=False)
+        return extraction
+
+    def round_trip_time(self, batch_id: str, address: str) -> Optional[float]:
+        """Elapsed time since the prompt for a batch was sent to an address"""
+        extraction = self.pending.get(batch_id) or self.completed.get(batch_id)
+        if extraction is None or address not in extraction.sent_at:
+            return None
+        return time.monotonic() - extraction.sent_at[address]
+
+
+class MicroBatcher:
+    """Collect items that arrive within a short window and hand them to flush() together"""
+
+    def __init__(self, flush, window_seconds: float = 0.05, max_batch_size: int = 8):
+        self.flush = flush
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.items = []
+        self.timer: Optional[asyncio.Task] = None
+
+    async def add(self, item):
+        self.items.append(item)
+        if len(self.items) >= self.max_batch_size:
+            await self.flush_now()
+        elif self.timer is None:
+            self.timer = asyncio.create_task(self._flush_after_window())
+            self.timer.add_done_callback(log_task_failure(LOGGER, "Batch flush"))
+
+    async def flush_now(self):
+        if self.timer is not None and self.timer is not asyncio.current_task():
+            self.timer.cancel()
+        self.timer = None
+        batch, self.items = self.items, []
+        if batch:
+            await self.flush(batch)
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window_seconds)
+        await self.flush_now()
+
+
+class CircuitBreaker:
+    """
+    Stop sending prompts to the LLM after repeated failures.
+    closed: requests flow normally. open: requests are refused until reset_timeout passes.
+    half_open: a limited number of trial requests decide whether to close again or re-open. Trials
+    whose outcome is never recorded (the turn was queued, shed or lost) expire after reset_timeout,
+    so the breaker can't get stuck half-open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_trials: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_trials = half_open_trials
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials_started = 0
+        self.trial_started_at = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.trials_started = 0
+
+        if self.state == self.HALF_OPEN:
+            if self.trials_started >= self.half_open_trials:
+                if time.monotonic() - self.trial_started_at < self.reset_timeout:
+                    return False
+                self.trials_started = 0  # No result came back for the earlier trials; start new ones
+            self.trials_started += 1
+            self.trial_started_at = time.monotonic()
+
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def to_dict(self) -> dict:
+        # opened_at is monotonic, so it is saved as time spent open; a half-open breaker restarts its trials
+        return {
+            "state": self.OPEN if self.state == self.HALF_OPEN else self.state,
+            "failures": self.failures,
+            "open_seconds": time.monotonic() - self.opened_at if self.state != self.CLOSED else 0.0,
+        }
+
+    def restore(self, data: dict, downtime_seconds: float = 0.0):
+        self.state = data["state"]
+        self.failures = data["failures"]
+        self.opened_at = time.monotonic() - data["open_seconds"] - downtime_seconds
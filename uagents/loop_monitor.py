@@ -0,0 +1,188 @@
+"""
+Event loop lag monitor and slow handler detector.
+
+Every handler runs on the one asyncio loop, so synchronous work in any of them (a storage file rewrite,
+rendering a long reply, validating a large model) holds up every other session. The monitor measures
+how late the loop runs a timer and, while the loop is blocked, samples the stack of the code blocking
+it. watch_handlers() times each message and interval handler, both end to end and by the time it holds
+the loop, and logs the ones over the thresholds.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import types
+from collections import deque
+from functools import wraps
+from typing import NamedTuple
+
+from metrics import metrics
+
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.1"))  # How often the loop's scheduling delay is measured
+LOOP_LAG_WINDOW_SECONDS = float(os.getenv("LOOP_LAG_WINDOW_SECONDS", "60"))  # Window of the event_loop_lag_max_seconds gauge
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_SECONDS", "0.25"))  # Loop blocked this long counts as a stall, and its stack is sampled
+LOOP_STACK_DEPTH = int(os.getenv("LOOP_STACK_DEPTH", "12"))  # Innermost frames kept per stack sample
+SLOW_HANDLER_SECONDS = float(os.getenv("SLOW_HANDLER_SECONDS", "2"))  # Handlers taking longer end to end, awaits included, are logged
+
+LOGGER = logging.getLogger("loop_monitor")
+
+
+class StackSample(NamedTuple):
+    at: float  # time.monotonic() when the sample was taken
+    blocked_for: float  # How long the loop had been blocked by then
+    stack: str
+
+
+class LoopMonitor:
+    """
+    A task on the loop wakes every interval and records how late it woke. A watchdog thread checks
+    that task's heartbeat: once the loop has been blocked for stall_seconds it samples the loop
+    thread's stack, and samples again each time the block doubles in length.
+    """
+
+    def __init__(self, interval: float, stall_seconds: float, stack_depth: int, window_seconds: float, max_samples: int = 100):
+        self.interval = interval
+        self.stall_seconds = stall_seconds
+        self.stack_depth = stack_depth
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id = None
+        self.task = None
+        self.stopping = threading.Event()
+
+    def start(self):
+        """Start monitoring the running loop; the agents of a Bureau share one monitor"""
+        if self.task is not None and not self.task.done():
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopping.clear()
+        self.task = asyncio.get_running_loop().create_task(self._measure())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def stop(self):
+        self.stopping.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def samples_between(self, start: float, end: float) -> list:
+        return [sample for sample in self.samples if start <= sample.at <= end]
+
+    async def _measure(self):
+        window_start, window_max = time.monotonic(), 0.0
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.heartbeat = now = time.monotonic()
+            lag = max(0.0, now - expected)
+            metrics.set_gauge("event_loop_lag_seconds", round(lag, 4))
+            metrics.increment("event_loop_lag_seconds_total", lag)
+            if now - window_start >= self.window_seconds:
+                window_start, window_max = now, 0.0
+            window_max = max(window_max, lag)
+            metrics.set_gauge("event_loop_lag_max_seconds", round(window_max, 4))
+            if lag >= self.stall_seconds:
+                metrics.increment("event_loop_stalls_total")
+                LOGGER.warning(f"Event loop was blocked for {lag:.3f}s")
+
+    def _watch(self):
+        stall_heartbeat, next_sample = None, 0.0
+        while not self.stopping.wait(self.stall_seconds / 4):
+            heartbeat = self.heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.stall_seconds:
+                continue
+            if heartbeat != stall_heartbeat:
+                stall_heartbeat, next_sample = heartbeat, self.stall_seconds
+            if blocked_for < next_sample:
+                continue
+            next_sample = blocked_for * 2
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame)[-self.stack_depth:])
+            self.samples.append(StackSample(time.monotonic(), blocked_for, stack))
+            metrics.increment("event_loop_stack_samples_total")
+            LOGGER.warning(f"Event loop blocked for {blocked_for:.3f}s so far, in:\n{stack}")
+
+
+loop_monitor = LoopMonitor(LOOP_LAG_INTERVAL_SECONDS, LOOP_STALL_SECONDS, LOOP_STACK_DEPTH, LOOP_LAG_WINDOW_SECONDS)
+
+
+class HandlerTiming:
+    def __init__(self):
+        self.on_loop = 0.0  # Time spent running, not awaiting
+        self.longest_step = 0.0  # Longest stretch between two awaits
+        self.blocking_steps = []  # (start, end) of the steps of at least LOOP_STALL_SECONDS
+
+
+@types.coroutine
+def _timed_steps(coro, timing: HandlerTiming):
+    """Run coro inside the caller's task, timing each step it runs before suspending again"""
+    value, error = None, None
+    while True:
+        start = time.monotonic()
+        try:
+            yielded = coro.throw(error) if error is not None else coro.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            end = time.monotonic()
+            timing.on_loop += end - start
+            timing.longest_step = max(timing.longest_step, end - start)
+            if end - start >= LOOP_STALL_SECONDS:
+                timing.blocking_steps.append((start, end))
+        try:
+            value, error = (yield yielded), None
+        except BaseException as err:
+            value, error = None, err
+
+
+def timed_handler(func):
+    """Wrap a message or interval handler so slow or loop-blocking runs are counted and logged"""
+    if getattr(func, "timed_handler", False):
+        return func
+    name = f"{func.__module__}.{func.__name__}"
+
+    @wraps(func)
+    async def timed(*args, **kwargs):
+        timing = HandlerTiming()
+        start = time.monotonic()
+        try:
+            return await _timed_steps(func(*args, **kwargs), timing)
+        finally:
+            elapsed = time.monotonic() - start
+            metrics.increment("handler_loop_seconds_total", timing.on_loop, handler=name)
+            if timing.blocking_steps:
+                metrics.increment("handler_blocking_total", handler=name)
+                samples = [
+                    sample for step_start, step_end in timing.blocking_steps
+                    for sample in loop_monitor.samples_between(step_start, step_end)
+                ]
+                # The watchdog has logged every sample already; the latest is the one deepest into the block
+                where = f", sampled after {samples[-1].blocked_for:.3f}s in:\n{samples[-1].stack}" if samples else ""
+                LOGGER.warning(
+                    f"Handler {name} blocked the event loop for {timing.longest_step:.3f}s "
+                    f"({timing.on_loop:.3f}s on the loop over {elapsed:.3f}s){where}"
+                )
+            elif elapsed >= SLOW_HANDLER_SECONDS:
+                metrics.increment("handler_slow_total", handler=name)
+                LOGGER.warning(f"Handler {name} took {elapsed:.3f}s ({timing.on_loop:.3f}s on the loop)")
+
+    timed.timed_handler = True
+    return timed
+
+
+def watch_handlers(agent):
+    """Time every message and interval handler of an agent; call once all its protocols are included"""
+    # The agent's own protocol is only included when it starts, so its handlers are wrapped in place
+    for owner in (agent, agent._protocol):
+        for handlers in (owner._signed_message_handlers, owner._unsigned_message_handlers):
+            for digest, func in handlers.items():
+                handlers[digest] = timed_handler(func)
+        owner._interval_handlers[:] = [(timed_handler(func), period) for func, period in owner._interval_handlers]
@@ -0,0 +1,35 @@
+import time
+
+
+def _metric_key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    label_text = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+    return f"{name}{{{label_text}}}"
+
+
+class Metrics:
+    """In-process counters and gauges, served by the agent's /metrics REST endpoint"""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.started_at = time.time()
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = _metric_key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.gauges[_metric_key(name, labels)] = value
+
+    def snapshot(self) -> dict:
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+        }
+
+
+# Shared registry for all protocols in this process
+metrics = Metrics()
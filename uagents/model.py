@@ -1,12 +1,46 @@
+from typing import Optional
+
 import requests
 from uagents import Model, Field
 
+from catalog import build_catalog
+
 class DeFiProtocolRequest(Model):
     protocol_name: str
 
 class DeFiProtocolResponse(Model):
     results: str
 
+# Protocol info request/response models for agent messaging; the front agent relays the same models
+class ProtocolInfoRequest(Model):
+    protocol_name: str
+
+class ProtocolInfoResponse(Model):
+    timestamp: int
+    protocol_name: str
+    information: str
+    agent_address: str
+
+class ProtocolsListRequest(Model):
+    pass
+
+class ProtocolsListResponse(Model):
+    timestamp: int
+    protocols: dict
+    count: int
+
+# Version 0.2.0 of the protocol lists the catalog a page at a time
+class PagedProtocolsListRequest(Model):
+    cursor: Optional[str] = None  # next_cursor from the previous page; omit for the first page
+    limit: Optional[int] = None
+
+class PagedProtocolsListResponse(Model):
+    timestamp: int
+    protocols: dict  # key -> name for this page, in key order
+    count: int
+    catalog_version: int
+    next_cursor: Optional[str] = None  # None on the last page
+
 # Dictionary of blockchain technologies with educational information
 BLOCKCHAIN_TECHNOLOGIES = {
     "solana": {
@@ -372,6 +406,11 @@ BLOCKCHAIN_TECHNOLOGIES = {
     }
 }
 
+# Typed, immutable records built from BLOCKCHAIN_TECHNOLOGIES; lookups and rendering use these.
+# The source dicts are dropped once built, as in defi_protocol.py.
+TECHNOLOGY_CATALOG = build_catalog(BLOCKCHAIN_TECHNOLOGIES)
+del BLOCKCHAIN_TECHNOLOGIES
+
 async def get_protocol_info(protocol_name: str) -> str:
     """
     Fetch blockchain technology information from our database and return as plain text
@@ -381,76 +420,76 @@ async def get_protocol_info(protocol_name: str) -> str:
         protocol_key = protocol_name.lower()
         
         # Check if the technology exists in our database
-        if protocol_key in BLOCKCHAIN_TECHNOLOGIES:
-            technology = BLOCKCHAIN_TECHNOLOGIES[protocol_key]
+        if protocol_key in TECHNOLOGY_CATALOG:
+            technology = TECHNOLOGY_CATALOG[protocol_key]
             
             # Format the technology information as a structured text
-            result = f"\n{technology['name']} - {technology['category']}\n"
+            result = f"\n{technology.name} - {technology.category}\n"
             
             # Add blockchain/used_in/application info if available
-            if 'blockchain' in technology:
-                result += f"Blockchain: {technology['blockchain']}\n"
-            if 'used_in' in technology:
-                result += f"Used in: {technology['used_in']}\n"
-            if 'launched' in technology:
-                result += f"Launched: {technology['launched']}\n"
-            if 'application' in technology:
-                result += f"Application: {technology['application']}\n"
+            if technology.blockchain is not None:
+                result += f"Blockchain: {technology.blockchain}\n"
+            if technology.used_in is not None:
+                result += f"Used in: {technology.used_in}\n"
+            if technology.launched is not None:
+                result += f"Launched: {technology.launched}\n"
+            if technology.application is not None:
+                result += f"Application: {technology.application}\n"
             
-            result += f"\nDescription:\n{technology['description']}\n\n"
+            result += f"\nDescription:\n{technology.description}\n\n"
             
             result += "Key Features:\n"
-            for feature in technology['key_features']:
+            for feature in technology.key_features:
                 result += f"- {feature}\n"
             
             # Add wallet compatibility if available
-            if 'wallet_compatibility' in technology:
+            if technology.wallet_compatibility:
                 result += "\nWallet Compatibility:\n"
-                for chain, wallets in technology['wallet_compatibility'].items():
+                for chain, wallets in technology.wallet_compatibility:
                     result += f"{chain}:\n"
                     for wallet in wallets:
                         result += f"- {wallet}\n"
                     result += "\n"
             
             # Add architecture components if available
-            if 'architecture_components' in technology:
+            if technology.architecture_components:
                 result += "\nArchitecture Components:\n"
-                for component in technology['architecture_components']:
+                for component in technology.architecture_components:
                     result += f"- {component}\n"
             
             # Add security features if available  
-            if 'security_features' in technology:
+            if technology.security_features:
                 result += "\nSecurity Features:\n"
-                for feature in technology['security_features']:
+                for feature in technology.security_features:
                     result += f"- {feature}\n"
                     
             # Add implementation details if available
-            if 'implementation_details' in technology:
+            if technology.implementation_details:
                 result += "\nImplementation Details:\n"
-                for detail in technology['implementation_details']:
+                for detail in technology.implementation_details:
                     result += f"- {detail}\n"
             
             # Add technical aspects
             result += "\nTechnical Aspects:\n"
-            for aspect in technology['technical_aspects']:
+            for aspect in technology.technical_aspects:
                 result += f"- {aspect}\n"
             
             # Add client functions if available
-            if 'client_functions' in technology:
+            if technology.client_functions:
                 result += "\nClient Functions:\n"
-                for function in technology['client_functions']:
+                for function in technology.client_functions:
                     result += f"- {function}\n"
             
             # Add usage flows if available
-            if 'usage_flows' in technology:
+            if technology.usage_flows:
                 result += "\nUsage Flows:\n"
-                for flow_name, steps in technology['usage_flows'].items():
+                for flow_name, steps in technology.usage_flows:
                     result += f"\n{flow_name.capitalize()} Flow:\n"
                     for i, step in enumerate(steps, 1):
                         result += f"{i}. {step}\n"
             
             result += "\nLearning Resources:\n"
-            for resource in technology['learning_resources']:
+            for resource in technology.learning_resources:
                 result += f"- {resource}\n"
             
             return result
@@ -459,19 +498,16 @@ async def get_protocol_info(protocol_name: str) -> str:
             similar_technologies = []
             search_term = protocol_key.lower()
             
-            # List of all technologies we support
-            all_technologies = ["solana", "svm", "soon svm", "walrus", "utxo", "ibc", "zpl", "zpl utxo bridge", "walletconnect", "mainnet"]
-            
             # Check for partial matches
-            for key in all_technologies:
+            for key, tech in TECHNOLOGY_CATALOG.items():
                 if search_term in key or key in search_term:
-                    similar_technologies.append(BLOCKCHAIN_TECHNOLOGIES.get(key, {}).get('name', key.upper()))
+                    similar_technologies.append(tech.name)
             
             # If no matches found by key, try searching in descriptions
             if not similar_technologies:
-                for key, tech in BLOCKCHAIN_TECHNOLOGIES.items():
-                    if search_term in tech['description'].lower():
-                        similar_technologies.append(tech['name'])
+                for key, tech in TECHNOLOGY_CATALOG.items():
+                    if search_term in tech.description.lower():
+                        similar_technologies.append(tech.name)
             
             if similar_technologies:
                 suggestions = ", ".join(similar_technologies)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, NamedTuple, Optional
+
+from uagents import Context, Model
+from uagents_core.types import DeliveryStatus
+
+from llm_routing import ResponseTimeTracker
+from metrics import metrics
+
+
+class OutboundMessage(NamedTuple):
+    ctx: Context
+    message: Model
+    enqueued_at: float
+
+
+class OutboundPipeline:
+    """
+    Non-blocking outbound sends. Messages wait in per-destination queues that are drained concurrently,
+    at most max_concurrency sends at a time, so a slow endpoint only delays messages to itself.
+    Order is kept per destination. Adjacent queued messages to the same destination and session are
+    merged by coalesce(first, second) when it returns a combined message.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 16, coalesce: Optional[Callable] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.coalesce = coalesce
+        self.queues = {}
+        self.workers = {}
+        self.depth = 0
+        self.latencies = ResponseTimeTracker(window_size=500, min_samples=1)
+        self._semaphore = None
+
+    def enqueue(self, ctx: Context, destination: str, message: Model):
+        """Queue a message for sending and return immediately"""
+        if destination not in self.queues:
+            self.queues[destination] = deque()
+        self.queues[destination].append(OutboundMessage(ctx, message, time.monotonic()))
+        self.depth += 1
+        if destination not in self.workers:
+            self.workers[destination] = asyncio.create_task(self._drain(destination))
+        self._update_metrics()
+
+    async def join(self):
+        """Wait until every queued message has been sent"""
+        while self.workers:
+            await asyncio.gather(*list(self.workers.values()), return_exceptions=True)
+
+    def _take(self, queue: deque) -> OutboundMessage:
+        item = queue.popleft()
+        self.depth -= 1
+        while queue and self.coalesce is not None and queue[0].ctx.session == item.ctx.session:
+            merged = self.coalesce(item.message, queue[0].message)
+            if merged is None:
+                break
+            queue.popleft()
+            self.depth -= 1
+            item = item._replace(message=merged)
+            metrics.increment("outbound_coalesced_total", pipeline=self.name)
+        return item
+
+    async def _drain(self, destination: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        queue = self.queues[destination]
+        try:
+            while queue:
+                async with self._semaphore:
+                    item = self._take(queue)
+                    self.latencies.record("wait", time.monotonic() - item.enqueued_at)
+                    started = time.monotonic()
+                    try:
+                        status = await item.ctx.send(destination, item.message)
+                    except Exception as err:
+                        item.ctx.logger.error(f"Failed to send {type(item.message).__name__} to {destination}: {err}")
+                        status = None
+                    self.latencies.record("send", time.monotonic() - started)
+
+                if status is not None and status.status != DeliveryStatus.FAILED:
+                    metrics.increment("outbound_sent_total", pipeline=self.name)
+                else:
+                    metrics.increment("outbound_failed_total", pipeline=self.name)
+                self._update_metrics()
+        finally:
+            del self.workers[destination]
+            del self.queues[destination]
+            self._update_metrics()
+
+    def _update_metrics(self):
+        metrics.set_gauge("outbound_queue_depth", self.depth, pipeline=self.name)
+        metrics.set_gauge("outbound_active_destinations", len(self.workers), pipeline=self.name)
+        for stage in ("wait", "send"):
+            for pct in (50, 95):
+                value = self.latencies.percentile(stage, pct)
+                if value is not None:
+                    metrics.set_gauge(f"outbound_{stage}_seconds_p{pct}", round(value, 4), pipeline=self.name)
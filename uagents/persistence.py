@@ -0,0 +1,29 @@
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+
+def write_json_atomic(path: str, data: Any):
+    """Write JSON so that a crash leaves either the old file or the new one, never a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_json(path: str) -> Optional[Any]:
+    """Read a JSON snapshot, returning None if it is missing or unreadable"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
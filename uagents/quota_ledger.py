@@ -0,0 +1,122 @@
+import functools
+import time
+from typing import Optional
+
+from uagents.experimental.quota import QuotaProtocol
+
+from dedup import IN_PROGRESS, MessageDedupCache, request_message_id
+from metrics import metrics
+from persistence import read_json, write_json_atomic
+from wire_cache import EncodedMessage, send_encoded
+
+
+class QuotaLedger:
+    """Per-sender quota usage kept in memory and snapshotted to a local file periodically"""
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        self.usage = read_json(snapshot_path) or {}
+        self.dirty = False
+
+    def charge(self, sender: str, cost: float, window_seconds: float, budget: float) -> bool:
+        """Charge cost units to a sender's current window; returns False if that would exceed the budget"""
+        now = time.time()
+        entry = self.usage.get(sender)
+        if entry is None or now - entry["window_start"] > window_seconds:
+            entry = {"window_start": now, "window_seconds": window_seconds, "used": 0.0}
+        if entry["used"] + cost > budget:
+            return False
+        entry["used"] += cost
+        self.usage[sender] = entry
+        self.dirty = True
+        return True
+
+    def snapshot(self):
+        """Drop expired windows and persist the rest if anything changed since the last snapshot"""
+        if not self.dirty:
+            return
+        now = time.time()
+        self.usage = {
+            sender: entry
+            for sender, entry in self.usage.items()
+            if now - entry["window_start"] <= entry["window_seconds"]
+        }
+        write_json_atomic(self.snapshot_path, self.usage)
+        self.dirty = False
+
+
+class WeightedQuotaProtocol(QuotaProtocol):
+    """
+    QuotaProtocol whose handlers share one budget per sender, with a cost per message type.
+    Usage is tracked in a QuotaLedger instead of being read from and written to agent storage on every message.
+    Handlers given a dedup cache return their reply as an EncodedMessage instead of sending it; a repeat of
+    a request that was already answered gets the cached reply before the quota is checked, so it isn't charged.
+    """
+
+    def __init__(self, ledger: QuotaLedger, **kwargs):
+        super().__init__(storage_reference=None, **kwargs)
+        self.ledger = ledger
+        self.costs = {}
+        self.dedup = {}
+
+    def on_message(
+        self,
+        model,
+        replies=None,
+        allow_unverified=False,
+        rate_limit=None,
+        access_control_list=None,
+        cost: float = 1.0,
+        dedup: Optional[MessageDedupCache] = None,
+    ):
+        decorator = super().on_message(model, replies, allow_unverified, rate_limit, access_control_list)
+
+        def register(func):
+            self.costs[func.__name__] = cost
+            if dedup is not None:
+                self.dedup[func.__name__] = dedup
+            return decorator(func)
+
+        return register
+
+    def wrap(self, func, rate_limit=None, acl=None):
+        handler = super().wrap(func, rate_limit, acl)
+        cache = self.dedup.get(func.__name__)
+        if cache is None:
+            return handler
+
+        @functools.wraps(func)
+        async def deduplicated(ctx, sender: str, msg):
+            # Keyed by payload rather than session: a client's retry usually arrives in a new session.
+            # The receiving agent is part of the key because Bureau shards share one cache.
+            key = (ctx.agent.address, sender, request_message_id(msg))
+            cached_reply = cache.get(key)
+            if cached_reply is not None:
+                ctx.logger.info(f"Duplicate {type(msg).__name__} from {sender}")
+                if cached_reply is not IN_PROGRESS:
+                    await send_encoded(ctx, sender, cached_reply)
+                return
+            cache.remember(key)
+
+            reply = None
+            try:
+                reply = await handler(ctx, sender, msg)
+            finally:
+                if not isinstance(reply, EncodedMessage):
+                    cache.forget(key)  # Refused by the ACL or quota, or failed; a retry is handled afresh
+            if isinstance(reply, EncodedMessage):  # A refusal was already sent as an ErrorMessage
+                cache.remember(key, reply)
+                await send_encoded(ctx, sender, reply)
+
+        return deduplicated
+
+    def add_request(self, agent_address: str, function_name: str, window_size_minutes: int, max_requests: int) -> bool:
+        allowed = self.ledger.charge(
+            agent_address,
+            self.costs.get(function_name, 1.0),
+            window_size_minutes * 60,
+            max_requests,
+        )
+        if not allowed:
+            metrics.increment("quota_rejected_total", handler=function_name)
+        return allowed
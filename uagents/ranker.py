@@ -0,0 +1,136 @@
+import math
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me of on or that the this to "
+    "what which who why with you your about tell use used using".split()
+)
+
+# Weight of each catalog field's terms in an entry's term counts
+_FIELD_WEIGHTS = (
+    ("name", 3),
+    ("aliases", 3),
+    ("category", 2),
+    ("ecosystem", 1),
+    ("blockchain", 1),
+    ("description", 1),
+    ("key_features", 1),
+    ("technical_aspects", 1),
+)
+
+
+class RankedProtocol(NamedTuple):
+    key: str
+    score: float
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word unigrams plus adjacent-word bigrams, without stopwords"""
+    words = [word for word in _TOKEN_PATTERN.findall(text.lower()) if word not in _STOPWORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class TfidfRanker:
+    """
+    TF-IDF index over catalog entries for questions that don't name a protocol.
+    The document-term matrix is stored column-wise (per term: entry rows and weights), so scoring only
+    touches the columns of terms that appear in the queries. A batch of queries is scored with one
+    matrix product between those columns and the query-term matrix.
+    """
+
+    def __init__(self, catalog: dict):
+        self.keys = list(catalog)
+        self.vocabulary = {}
+        # Feature lines and categories repeat across entries, so each distinct text is tokenized once
+        text_terms = {}
+        rows, columns, counts = [], [], []
+        for row, entry in enumerate(catalog.values()):
+            term_counts = {}
+            texts = [(entry.key.replace("_", " "), 1)]
+            for field, weight in _FIELD_WEIGHTS:
+                value = getattr(entry, field)
+                texts.extend((text, weight) for text in ((value,) if isinstance(value, str) else value or ()))
+            for text, weight in texts:
+                term_ids = text_terms.get(text)
+                if term_ids is None:
+                    term_ids = text_terms[text] = [
+                        self.vocabulary.setdefault(term, len(self.vocabulary)) for term in tokenize(text)
+                    ]
+                for term_id in term_ids:
+                    term_counts[term_id] = term_counts.get(term_id, 0) + weight
+            rows.extend([row] * len(term_counts))
+            columns.extend(term_counts)
+            counts.extend(term_counts.values())
+
+        rows = np.asarray(rows, dtype=np.int32)
+        columns = np.asarray(columns, dtype=np.int32)
+        counts = np.asarray(counts, dtype=np.float32)
+
+        # Smoothed idf and sublinear tf, then unit-length rows so scores are cosine similarities
+        document_frequency = np.bincount(columns, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + len(self.keys)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = (1 + np.log(counts)) * self.idf[columns]
+        row_norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=len(self.keys)))
+        weights = weights / row_norms[rows]
+
+        # Compressed sparse columns: entries of term t are row_index[column_start[t]:column_start[t + 1]]
+        order = np.argsort(columns, kind="stable")
+        self.row_index = rows[order]
+        self.values = weights[order].astype(np.float32)
+        self.column_start = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=self.column_start[1:])
+
+    def _query_matrix(self, queries: list) -> tuple:
+        """Return (term ids used by any query, normalized query-by-term weight matrix)"""
+        query_terms = []
+        for query in queries:
+            term_counts = {}
+            for term in tokenize(query):
+                term_id = self.vocabulary.get(term)
+                if term_id is not None:
+                    term_counts[term_id] = term_counts.get(term_id, 0) + 1
+            query_terms.append(term_counts)
+
+        term_ids = sorted({term_id for term_counts in query_terms for term_id in term_counts})
+        position = {term_id: i for i, term_id in enumerate(term_ids)}
+        matrix = np.zeros((len(queries), len(term_ids)), dtype=np.float32)
+        for i, term_counts in enumerate(query_terms):
+            for term_id, count in term_counts.items():
+                matrix[i, position[term_id]] = (1 + math.log(count)) * self.idf[term_id]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return term_ids, matrix
+
+    def _document_columns(self, term_ids: list) -> np.ndarray:
+        """Dense entry-by-term block holding just the given terms' columns"""
+        block = np.zeros((len(self.keys), len(term_ids)), dtype=np.float32)
+        for j, term_id in enumerate(term_ids):
+            start, end = self.column_start[term_id], self.column_start[term_id + 1]
+            block[self.row_index[start:end], j] = self.values[start:end]
+        return block
+
+    def rank_batch(self, queries: list, k: int = 3, min_score: float = 0.0) -> list:
+        """Top-k (key, cosine score) matches for each query, best first"""
+        if not queries:
+            return []
+        term_ids, query_matrix = self._query_matrix(queries)
+        if not term_ids or not self.keys:
+            return [[] for _ in queries]
+
+        scores = self._document_columns(term_ids) @ query_matrix.T  # entries x queries
+        k = min(k, len(self.keys))
+        results = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top], kind="stable")]
+            results.append(
+                [RankedProtocol(self.keys[row], float(column[row])) for row in top if column[row] > min_score]
+            )
+        return results
+
+    def rank(self, query: str, k: int = 3, min_score: float = 0.0) -> list:
+        return self.rank_batch([query], k, min_score)[0]
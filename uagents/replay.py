@@ -0,0 +1,341 @@
+"""
+Replay traffic recorded by capture.py against this build of the agent, with a local LLM stand-in.
+
+Client messages are delivered to the agent in-process, with their original sender, session and relative
+timing scaled by --speed. The agent's replies are collected in-process too, so nothing goes over the
+network. Prompts to the structured output agents are answered by a stand-in: for each query it returns
+what the real LLM extracted (or the catalog's best match, for queries the capture never saw) after the
+captured latency divided by the speed. Run it on two builds with the same capture, then compare.
+
+Usage:
+    python uagents/replay.py CAPTURE_DIR [--speed 1|10|max] [--out results.json] [--label NAME]
+    python uagents/replay.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from uuid import UUID
+
+from uagents.dispatch import Sink, dispatcher
+
+from analytics import read_events
+
+DEFAULT_LLM_LATENCY_SECONDS = 1.0  # Stand-in latency when the capture has no LLM replies to go by
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def latency_summary(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def load_capture(directory: str) -> tuple:
+    """
+    Split a capture into the client messages to replay (oldest first), what the LLM answered
+    (query -> (structured output for that query, seconds from prompt to reply)) and how long each
+    prompt took (the prompt's queries -> seconds, in capture order; batch ids differ on every run)
+    """
+    from chat_proto import split_extraction_output
+
+    requests, answers, prompt_latencies, prompts = [], {}, defaultdict(deque), {}
+    for event in sorted(read_events(directory), key=lambda event: event["ts"]):
+        if event["event"] == "llm_prompt":
+            prompts[event["session"]] = event
+        elif event["event"] == "inbound" and event["model"] == "StructuredOutputResponse":
+            prompt = prompts.pop(event["session"], None)
+            if prompt is None:
+                continue  # A late reply to a hedged prompt, or a prompt sent before the capture started
+            latency = event["ts"] - prompt["ts"]
+            prompt_latencies[tuple(prompt["queries"])].append(latency)
+            outputs = split_extraction_output(json.loads(event["payload"])["output"], prompt["sessions"])
+            for session_id, query in zip(prompt["sessions"], prompt["queries"]):
+                answers[query] = (outputs[session_id], latency)
+        elif event["event"] == "inbound":
+            requests.append(event)
+    return requests, answers, prompt_latencies
+
+
+class ReplayStats:
+    """Pairs each replayed message with the first reply its sender gets in the same session"""
+
+    def __init__(self):
+        self.outstanding = defaultdict(deque)  # (client, session) -> (sent at, model)
+        self.latencies = defaultdict(list)  # model -> seconds
+        self.sent = 0
+        self.acks = 0
+        self.unmatched = 0
+        self.last_reply = None
+
+    def request_sent(self, client: str, session: str, model: str):
+        self.sent += 1
+        self.outstanding[(client, session)].append((time.monotonic(), model))
+
+    def reply_received(self, client: str, session: str, model: str):
+        if model == "ChatAcknowledgement":
+            self.acks += 1  # Sent straight away; the answer that follows is what's timed
+            return
+        waiting = self.outstanding.get((client, session))
+        if not waiting:
+            self.unmatched += 1
+            return
+        sent_at, request_model = waiting.popleft()
+        self.last_reply = time.monotonic()
+        self.latencies[request_model].append(self.last_reply - sent_at)
+
+    def pending(self) -> int:
+        return sum(len(waiting) for waiting in self.outstanding.values())
+
+
+class ClientSink(Sink):
+    """Receives the agent's replies to one captured client address"""
+
+    def __init__(self, address: str, stats: ReplayStats, models: dict):
+        self.address = address
+        self.stats = stats
+        self.models = models
+
+    async def handle_message(self, sender, schema_digest, message, session: UUID):
+        model = self.models.get(schema_digest)
+        self.stats.reply_received(self.address, str(session), model.__name__ if model is not None else schema_digest)
+
+    async def handle_rest(self, method, endpoint, message):
+        return None
+
+
+class LlmStandIn(Sink):
+    """Answers structured output prompts like the captured LLM did, after its captured latency / speed"""
+
+    def __init__(self, address: str, agent, answers: dict, prompt_latencies: dict, speed):
+        self.address = address
+        self.agent = agent
+        self.answers = answers
+        self.prompt_latencies = prompt_latencies
+        self.speed = speed
+        latencies = [latency for _, latency in answers.values()]
+        self.default_latency = statistics.median(latencies) if latencies else DEFAULT_LLM_LATENCY_SECONDS
+        self.prompts = 0
+        self.unseen_queries = 0
+
+    async def handle_message(self, sender, schema_digest, message, session: UUID):
+        asyncio.create_task(self.answer(message, session))
+
+    async def handle_rest(self, method, endpoint, message):
+        return None
+
+    def guess(self, query: str) -> dict:
+        from defi_protocol import DEFI_CATALOG, resolve_protocol_locally
+
+        self.unseen_queries += 1
+        key = resolve_protocol_locally(query)
+        return {"protocol_name": DEFI_CATALOG[key].name if key else "<UNKNOWN>"}
+
+    async def answer(self, message: str, session: UUID):
+        from chat_proto import StructuredOutputPrompt, StructuredOutputResponse, extraction_queries
+        from wire_cache import schema_digest
+
+        self.prompts += 1
+        queries = extraction_queries(StructuredOutputPrompt.parse_raw(message))
+        answered = [self.answers.get(query) or (self.guess(query), self.default_latency) for query in queries]
+        if self.speed is not None:
+            # The same prompt was captured unless this build batches queries differently
+            captured = self.prompt_latencies.get(tuple(queries))
+            latency = captured.popleft() if captured else max(latency for _, latency in answered)
+            await asyncio.sleep(latency / self.speed)
+
+        if len(queries) == 1:
+            output = answered[0][0]
+        else:
+            output = {
+                "results": [
+                    {"query_id": query_id, "protocol_name": extracted.get("protocol_name", "<UNKNOWN>")}
+                    for query_id, (extracted, _) in enumerate(answered, 1)
+                ]
+            }
+        await self.agent.handle_message(
+            self.address,
+            schema_digest(StructuredOutputResponse),
+            StructuredOutputResponse(output=output).model_dump_json(),
+            session,
+        )
+
+
+def build_label() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_replay(args):
+    capture_dir = os.path.abspath(args.capture)
+    out_path = os.path.abspath(args.out)
+    speed = None if args.speed == "max" else float(args.speed)
+    label = args.label or build_label()
+
+    # Keep the replayed agent's keys, storage and snapshots away from any real deployment's files
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    os.environ.update({
+        "PORT": str(args.port),
+        "CAPTURE_DIR": "",
+        "ANALYTICS_DIR": os.path.join(workdir, "analytics"),
+        "WARM_STATE_PATH": os.path.join(workdir, "warm_state.json"),
+        "QUOTA_SNAPSHOT_PATH": os.path.join(workdir, "quota_snapshot.json"),
+    })
+    os.chdir(workdir)
+
+    from uagents import Agent, Bureau, Context
+
+    import agent as agent_module
+    import chat_proto
+    from rest_api import install_bureau_rest_server
+
+    requests, answers, prompt_latencies = load_capture(capture_dir)
+    if not requests:
+        sys.exit(f"No client messages in {capture_dir}")
+    clients = {event["sender"] for event in requests}
+    print(f"Replaying {len(requests)} messages from {len(clients)} clients ({len(answers)} captured LLM answers) at speed {args.speed}")
+
+    agent = agent_module.agent
+    if not args.verbose:
+        agent._logger.setLevel(logging.WARNING)
+    if not args.keep_limits:
+        # Compressing hours of traffic into minutes would trip limits production never reached
+        agent_module.proto.default_acl.bypass_rate_limit.update(clients)
+        chat_proto.rate_limiter.requests_per_hour = float("inf")
+
+    stats = ReplayStats()
+    stand_ins = [LlmStandIn(address, agent, answers, prompt_latencies, speed) for address in chat_proto.STRUCTURED_OUTPUT_AGENT_ADDRESSES]
+    driver = Agent(name="replay-driver")
+
+    @driver.on_event("startup")
+    async def replay(ctx: Context):
+        for client in clients:
+            dispatcher.register(client, ClientSink(client, stats, agent._models))
+        for stand_in in stand_ins:
+            dispatcher.register(stand_in.address, stand_in)
+        await asyncio.sleep(1)  # Let the agent's own startup handlers finish
+
+        first_ts = requests[0]["ts"]
+        start = time.monotonic()
+        for event in requests:
+            if speed is not None:
+                delay = start + (event["ts"] - first_ts) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if event["model"] != "ChatAcknowledgement":
+                stats.request_sent(event["sender"], event["session"], event["model"] or event["schema_digest"])
+            await agent.handle_message(event["sender"], event["schema_digest"], event["payload"], UUID(event["session"]))
+        sent_in = time.monotonic() - start
+
+        drain_until = time.monotonic() + args.drain
+        while stats.pending() and time.monotonic() < drain_until:
+            await asyncio.sleep(0.05)
+        duration = (stats.last_reply or time.monotonic()) - start
+
+        all_latencies = [latency for values in stats.latencies.values() for latency in values]
+        answered = len(all_latencies)
+        results = {
+            "label": label,
+            "speed": args.speed,
+            "capture": capture_dir,
+            "messages": len(requests),
+            "answered": answered,
+            "unanswered": stats.pending(),
+            "acks": stats.acks,
+            "unmatched_replies": stats.unmatched,
+            "llm_prompts": sum(stand_in.prompts for stand_in in stand_ins),
+            "llm_unseen_queries": sum(stand_in.unseen_queries for stand_in in stand_ins),
+            "send_seconds": round(sent_in, 3),
+            "duration_seconds": round(duration, 3),
+            "throughput_per_second": round(answered / duration, 2) if duration > 0 else None,
+            "latency_seconds": {
+                "all": latency_summary(all_latencies) if all_latencies else None,
+                **{model: latency_summary(values) for model, values in sorted(stats.latencies.items())},
+            },
+        }
+        with open(out_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(json.dumps(results, indent=2))
+        print(f"Results written to {out_path}")
+        sys.stdout.flush()
+        shutil.rmtree(workdir, ignore_errors=True)
+        # Skip the agent's shutdown handlers; there is nothing from the replay worth snapshotting
+        os._exit(0)
+
+    bureau = Bureau(port=args.port, endpoint=[f"http://127.0.0.1:{args.port}/submit"])
+    install_bureau_rest_server(bureau, agent_module.rest_server)
+    bureau.add(agent)
+    bureau.add(driver)
+    bureau.run()
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path, encoding="utf-8") as file:
+        before = json.load(file)
+    with open(after_path, encoding="utf-8") as file:
+        after = json.load(file)
+    if before["speed"] != after["speed"] or before["messages"] != after["messages"]:
+        print("Warning: the runs used different speeds or captures", file=sys.stderr)
+
+    def row(name: str, old, new, lower_is_better: bool = True):
+        if old is None or new is None:
+            print(f"  {name:36}{str(old):>14}{str(new):>14}")
+            return
+        change = (new - old) / old if old else 0.0
+        better = change < 0 if lower_is_better else change > 0
+        verdict = "" if abs(change) < 0.05 else (" better" if better else " worse")
+        print(f"  {name:36}{old:>14}{new:>14}{change:>+10.1%}{verdict}")
+
+    print(f"  {'':36}{before['label'][:13]:>14}{after['label'][:13]:>14}{'change':>10}")
+    row("throughput (answers/s)", before["throughput_per_second"], after["throughput_per_second"], lower_is_better=False)
+    row("answered", before["answered"], after["answered"], lower_is_better=False)
+    row("unanswered", before["unanswered"], after["unanswered"])
+    row("duration (s)", before["duration_seconds"], after["duration_seconds"])
+    for model in sorted(set(before["latency_seconds"]) | set(after["latency_seconds"]), key=lambda model: (model != "all", model)):
+        old, new = before["latency_seconds"].get(model) or {}, after["latency_seconds"].get(model) or {}
+        for stat in ("p50", "p95", "p99"):
+            row(f"{model} {stat} (s)", old.get(stat), new.get(stat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", nargs="?", help="capture directory (CAPTURE_DIR of the recording agent)")
+    parser.add_argument("--speed", default="1", help="1 for real time, 10 for ten times faster, or max (default 1)")
+    parser.add_argument("--out", default="replay_results.json", help="where to write the results (default replay_results.json)")
+    parser.add_argument("--label", help="name for this build in the results (default: git describe)")
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for outstanding replies after the last message")
+    parser.add_argument("--port", type=int, default=8796, help="port for the replay Bureau's server")
+    parser.add_argument("--keep-limits", action="store_true", help="keep per-sender quotas and the chat rate limit")
+    parser.add_argument("--verbose", action="store_true", help="keep the agent's info logging")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two results files")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    elif args.capture:
+        if args.speed != "max":
+            float(args.speed)
+        run_replay(args)
+    else:
+        parser.error("give a capture directory or --compare BEFORE AFTER")
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from uagents.resolver import GlobalResolver, Resolver
+
+from llm_routing import ResponseTimeTracker
+from metrics import metrics
+
+RESOLVER_TTL_SECONDS = float(os.getenv("RESOLVER_TTL_SECONDS", "300"))  # How long a resolved endpoint list is trusted
+RESOLVER_NEGATIVE_TTL_SECONDS = float(os.getenv("RESOLVER_NEGATIVE_TTL_SECONDS", "30"))  # How long a failed resolution is remembered
+RESOLVER_REFRESH_AHEAD_SECONDS = float(os.getenv("RESOLVER_REFRESH_AHEAD_SECONDS", "60"))  # Refresh this long before an entry expires
+RESOLVER_MAX_STALE_SECONDS = float(os.getenv("RESOLVER_MAX_STALE_SECONDS", "3600"))  # Serve expired endpoints this long while refreshing
+RESOLVER_MAX_ENTRIES = int(os.getenv("RESOLVER_MAX_ENTRIES", "10000"))  # Least recently resolved destinations are dropped beyond this
+
+
+class ResolvedEndpoints(NamedTuple):
+    address: object
+    endpoints: list
+    resolved_at: float
+    ttl: float
+
+
+class CachingResolver(Resolver):
+    """
+    Cache address -> endpoint resolution in front of another resolver.
+    Entries are refreshed in the background shortly before they expire, and expired entries keep being
+    served while the refresh runs, so a cached destination never waits on the Almanac. Failed
+    resolutions are cached for a shorter time. Pinned destinations (warm()) are kept fresh proactively.
+    """
+
+    def __init__(
+        self,
+        inner: Resolver,
+        ttl_seconds: float = 300,
+        negative_ttl_seconds: float = 30,
+        refresh_ahead_seconds: float = 60,
+        max_stale_seconds: float = 3600,
+        max_entries: int = 10000,
+    ):
+        self.inner = inner
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.pinned = set()
+        self.inflight = {}
+        self.latencies = ResponseTimeTracker(window_size=500, min_samples=1)
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def _almanac_api_resolver(self):
+        # Context.get_agents_by_protocol reads the Almanac URL from the wrapped GlobalResolver
+        return getattr(self.inner, "_almanac_api_resolver", None)
+
+    async def resolve(self, destination: str) -> tuple:
+        self.lookups += 1
+        entry = self.entries.get(destination)
+        if entry is not None:
+            age = time.monotonic() - entry.resolved_at
+            positive = bool(entry.endpoints)
+            if age < entry.ttl or (positive and age < entry.ttl + self.max_stale_seconds):
+                self.hits += 1
+                if age >= self._refresh_after(entry):
+                    self.prefetch(destination)
+                metrics.increment("resolver_hits_total", result="positive" if positive else "negative")
+                self._update_metrics()
+                return entry.address, entry.endpoints
+
+        metrics.increment("resolver_misses_total")
+        self._update_metrics()
+        # Shielded so a caller giving up doesn't cancel a lookup other callers are waiting on
+        return await asyncio.shield(self._resolution(destination))
+
+    def prefetch(self, destination: str):
+        """Start resolving a destination in the background, unless it is fresh or already being resolved"""
+        entry = self.entries.get(destination)
+        if entry is not None and time.monotonic() - entry.resolved_at < self._refresh_after(entry):
+            return
+        self._resolution(destination)
+
+    def warm(self, destinations: list):
+        """Pin known destinations and resolve them in the background"""
+        for destination in destinations:
+            self.pinned.add(destination)
+            self.prefetch(destination)
+
+    def refresh_expiring(self):
+        """Refresh pinned destinations that are close to expiry; meant to run on an interval"""
+        for destination in self.pinned:
+            self.prefetch(destination)
+
+    def _refresh_after(self, entry: ResolvedEndpoints) -> float:
+        # Working endpoints are refreshed ahead of expiry; failed lookups are retried only once they expire
+        return entry.ttl - self.refresh_ahead_seconds if entry.endpoints else entry.ttl
+
+    def _resolution(self, destination: str) -> asyncio.Task:
+        # One lookup per destination at a time; callers and background refreshes share it
+        task = self.inflight.get(destination)
+        if task is None:
+            task = self.inflight[destination] = asyncio.create_task(self._resolve_and_store(destination))
+        return task
+
+    async def _resolve_and_store(self, destination: str) -> tuple:
+        started = time.monotonic()
+        try:
+            address, endpoints = await self.inner.resolve(destination)
+        except Exception:
+            address, endpoints = None, []
+        finally:
+            self.inflight.pop(destination, None)
+        finished = time.monotonic()
+        self.latencies.record("resolve", finished - started)
+
+        previous = self.entries.get(destination)
+        if endpoints:
+            self.entries[destination] = ResolvedEndpoints(address, endpoints, finished, self.ttl_seconds)
+        elif previous is not None and previous.endpoints and finished - previous.resolved_at < previous.ttl + self.max_stale_seconds:
+            # A failed refresh keeps the last known endpoints until they are too stale to trust
+            metrics.increment("resolver_refresh_failures_total")
+            address, endpoints = previous.address, previous.endpoints
+        else:
+            self.entries[destination] = ResolvedEndpoints(address, [], finished, self.negative_ttl_seconds)
+        self.entries.move_to_end(destination)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._update_metrics()
+        return address, endpoints
+
+    def to_dict(self) -> dict:
+        """Working endpoints with their age, plus pinned destinations; negative entries aren't worth keeping"""
+        now = time.monotonic()
+        return {
+            "entries": [
+                [destination, entry.address, entry.endpoints, now - entry.resolved_at, entry.ttl]
+                for destination, entry in self.entries.items()
+                if entry.endpoints
+            ],
+            "pinned": sorted(self.pinned),
+        }
+
+    def restore(self, data: dict, downtime_seconds: float = 0.0):
+        now = time.monotonic()
+        for destination, address, endpoints, age, ttl in data["entries"]:
+            age += downtime_seconds
+            if age < ttl + self.max_stale_seconds and destination not in self.entries:
+                self.entries[destination] = ResolvedEndpoints(address, endpoints, now - age, ttl)
+        self.pinned.update(data["pinned"])
+        self._update_metrics()
+
+    def _update_metrics(self):
+        metrics.set_gauge("resolver_entries", len(self.entries))
+        metrics.set_gauge("resolver_hit_rate", round(self.hits / self.lookups, 4) if self.lookups else 0.0)
+        for pct in (50, 95):
+            value = self.latencies.percentile("resolve", pct)
+            if value is not None:
+                metrics.set_gauge(f"resolver_latency_seconds_p{pct}", round(value, 4))
+
+
+# Shared by the agent (passed as its resolver) and the chat protocol (to prefetch senders)
+endpoint_resolver = CachingResolver(
+    GlobalResolver(),
+    ttl_seconds=RESOLVER_TTL_SECONDS,
+    negative_ttl_seconds=RESOLVER_NEGATIVE_TTL_SECONDS,
+    refresh_ahead_seconds=RESOLVER_REFRESH_AHEAD_SECONDS,
+    max_stale_seconds=RESOLVER_MAX_STALE_SECONDS,
+    max_entries=RESOLVER_MAX_ENTRIES,
+)
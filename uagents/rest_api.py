@@ -0,0 +1,126 @@
+import hashlib
+import json
+import re
+from importlib.metadata import version
+from urllib.parse import parse_qs
+
+from uagents.asgi import ASGIServer
+
+from metrics import metrics
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class CachingRestServer(ASGIServer):
+    """
+    The agent's ASGI server plus read-only GET routes for HTTP caches. Route responses carry a strong ETag
+    (a hash of the body) and Cache-Control, and conditional requests whose ETag still matches get a
+    bodyless 304. Everything else (envelopes, uagents REST handlers) is passed to ASGIServer unchanged.
+    """
+
+    def __init__(self, *args, max_age_seconds: int = 60, stale_while_revalidate_seconds: int = 300, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age_seconds}, stale-while-revalidate={stale_while_revalidate_seconds}"
+        self.get_routes = []
+
+    def get(self, pattern: str):
+        """
+        Register a GET route. pattern is a regex matched against the whole path; its named groups and the
+        query string (name -> last value) are passed to the handler, which returns the body as str or bytes
+        of JSON, or raises HttpError.
+        """
+        compiled = re.compile(pattern)
+
+        def decorator(handler):
+            self.get_routes.append((compiled, handler))
+            return handler
+
+        return decorator
+
+    def _match(self, path: str):
+        for pattern, handler in self.get_routes:
+            match = pattern.fullmatch(path)
+            if match:
+                return pattern.pattern, handler, match.groupdict()
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await super().__call__(scope, receive, send)
+        route = self._match(scope["path"])
+        if route is None:
+            return await super().__call__(scope, receive, send)
+
+        name, handler, params = route
+        query = {key: values[-1] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+        try:
+            body = await handler(query=query, **params)
+            status = 200
+        except HttpError as err:
+            body, status = json.dumps({"error": err.message}), err.status
+        if isinstance(body, str):
+            body = body.encode()
+
+        headers = [[b"content-type", b"application/json"]]
+        if status == 200:
+            etag = strong_etag(body)
+            headers += [[b"etag", etag.encode()], [b"cache-control", self.cache_control.encode()]]
+            request_headers = {key.lower(): value for key, value in scope.get("headers", [])}
+            if_none_match = request_headers.get(b"if-none-match")
+            if if_none_match is not None and _etag_matches(if_none_match.decode(), etag):
+                status, body = 304, b""
+                headers = headers[1:]
+        else:
+            headers.append([b"cache-control", b"no-store"])
+
+        metrics.increment("rest_requests_total", route=name, status=status)
+        if status != 304:
+            headers.append([b"content-length", str(len(body)).encode()])
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+
+# uagents has no public hook for the HTTP server, so install_rest_server() replaces the private Agent._server.
+# requirements.txt pins the uagents release this was checked against; these checks catch a release that moved it.
+def install_rest_server(agent, server: CachingRestServer):
+    """Serve an agent through a CachingRestServer, keeping the REST handlers already registered"""
+    current = getattr(agent, "_server", None)
+    if not isinstance(current, ASGIServer) or not isinstance(getattr(current, "_rest_handler_map", None), dict):
+        raise RuntimeError(f"uagents {version('uagents')} has no Agent._server to replace; update rest_api.py")
+    server._rest_handler_map.update(current._rest_handler_map)
+    agent._server = server
+
+
+def check_rest_server(agent, server: CachingRestServer):
+    """Raise if uagents replaced the server install_rest_server() set"""
+    if getattr(agent, "_server", None) is not server:
+        raise RuntimeError(f"uagents {version('uagents')} isn't serving the caching REST server; update rest_api.py")
+
+
+def install_bureau_rest_server(bureau, server: CachingRestServer) -> CachingRestServer:
+    """
+    Serve a Bureau through a CachingRestServer with server's GET routes. A Bureau serves its agents from
+    its own server and only copies their uagents REST handlers, so an agent's routes are lost without this.
+    """
+    bureau_server = CachingRestServer(port=bureau._port, loop=bureau._loop, queries=bureau._queries, logger=bureau._logger)
+    bureau_server.cache_control = server.cache_control
+    bureau_server.get_routes = server.get_routes
+    install_rest_server(bureau, bureau_server)
+    return bureau_server
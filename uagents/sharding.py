@@ -0,0 +1,131 @@
+import bisect
+import hashlib
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from defi_protocol import DEFI_CATALOG, resolve_protocol_locally
+
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring of node names. Each node owns virtual_nodes points on the ring, so adding or
+    removing a node only moves the keys nearest its points (about 1/n of them).
+    """
+
+    def __init__(self, nodes: Optional[list] = None, virtual_nodes: int = 64):
+        self.virtual_nodes = virtual_nodes
+        self.points = []
+        self.owners = []
+        for node in nodes or []:
+            self.add(node)
+
+    @property
+    def nodes(self) -> set:
+        return set(self.owners)
+
+    def add(self, node: str):
+        if node in self.owners:
+            return
+        for i in range(self.virtual_nodes):
+            point = _point(f"{node}#{i}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node: str):
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != node]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, _point(key)) % len(self.points)
+        return self.owners[index]
+
+
+class Shard(NamedTuple):
+    name: str
+    address: str
+    ecosystems: tuple = ()  # Catalog ecosystems this shard owns; protocols elsewhere are placed by hash
+
+
+def parse_shards(spec: str) -> list:
+    """Parse "name=address@Ecosystem|Ecosystem,name=address" into Shards"""
+    shards = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, rest = item.partition("=")
+        address, _, ecosystems = rest.partition("@")
+        if not name or not address:
+            raise ValueError(f"Invalid shard '{item}', expected name=address[@Ecosystem|Ecosystem]")
+        shards.append(Shard(name.strip(), address.strip(), tuple(e.strip() for e in ecosystems.split("|") if e.strip())))
+    return shards
+
+
+class ShardRouter:
+    """
+    Pick the shard for a request. Protocol requests go to the shard owning the protocol's ecosystem,
+    and chat sessions and everything else are placed on a hash ring. A session stays on the shard it
+    started on until it has been idle for session_ttl_seconds, so updating the shard list doesn't move
+    conversations that are in progress.
+    """
+
+    def __init__(self, shards: list, virtual_nodes: int = 64, session_ttl_seconds: float = 600, max_sessions: int = 100000):
+        self.virtual_nodes = virtual_nodes
+        self.session_ttl_seconds = session_ttl_seconds
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session id -> (shard name, last used)
+        self.update(shards)
+
+    def update(self, shards: list):
+        """Replace the shard list; sessions on shards that are still listed keep their shard"""
+        self.shards = {shard.name: shard for shard in shards}
+        self.by_address = {shard.address: shard for shard in shards}
+        self.ring = HashRing(list(self.shards), self.virtual_nodes)
+        self.ecosystems = {}
+        for shard in shards:
+            for ecosystem in shard.ecosystems:
+                self.ecosystems.setdefault(ecosystem.lower(), shard.name)
+
+    def is_shard(self, address: str) -> bool:
+        return address in self.by_address
+
+    def for_ecosystem(self, ecosystem: Optional[str]) -> Optional[Shard]:
+        name = self.ecosystems.get((ecosystem or "").lower())
+        return self.shards[name] if name else None
+
+    def for_protocol(self, protocol_name: str) -> Optional[Shard]:
+        if not self.shards:
+            return None
+        key = protocol_name.lower() if protocol_name.lower() in DEFI_CATALOG else resolve_protocol_locally(protocol_name)
+        entry = DEFI_CATALOG.get(key) if key else None
+        if entry is not None and entry.ecosystem:
+            # "Solana, Cosmos" style ecosystems go to the first one that has an owner
+            for ecosystem in entry.ecosystem.split(","):
+                shard = self.for_ecosystem(ecosystem.strip())
+                if shard is not None:
+                    return shard
+        return self.shards[self.ring.node_for(key or protocol_name.lower())]
+
+    def for_session(self, session_id: str) -> Optional[Shard]:
+        if not self.shards:
+            return None
+        now = time.monotonic()
+        assigned = self.sessions.get(session_id)
+        if assigned is not None and assigned[0] in self.shards and now - assigned[1] < self.session_ttl_seconds:
+            name = assigned[0]
+        else:
+            name = self.ring.node_for(session_id)
+        self.sessions[session_id] = (name, now)
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return self.shards[name]
@@ -13,7 +13,8 @@ echo "-------------------------------------------------------------------------"
 echo "➡️  Server Port: $PORT"
 echo "➡️  Endpoint URL: $RAILWAY_URL"
 echo "-------------------------------------------------------------------------"
-echo "💡 Note: The uAgent serves as a messaging system, not an HTTP API server."
+echo "💡 Note: The uAgent is mainly a messaging system; it also serves cacheable"
+echo "   read-only GET routes (/protocols, /protocols/<name>, /search)."
 echo "   The frontend uses static data to avoid connection issues."
 echo "-------------------------------------------------------------------------"
 
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from uagents import Model
+from uagents.experimental.quota import AccessControlList, RateLimit
+from uagents_core.models import ErrorMessage
+
+from dedup import MessageDedupCache, request_message_id
+from quota_ledger import QuotaLedger, WeightedQuotaProtocol
+from wire_cache import encode_message
+
+AGENT = "agent1qshard"
+SENDER = "agent1qclient"
+BLOCKED = "agent1qblocked"
+
+
+class Request(Model):
+    text: str
+
+
+class Reply(Model):
+    text: str
+
+
+class RecordingContext:
+    """The parts of Context the quota and dedup wrappers use; records every message sent"""
+
+    def __init__(self):
+        self.agent = SimpleNamespace(address=AGENT)
+        self.logger = logging.getLogger("test_quota_ledger")
+        self.sent = []
+
+    async def send(self, destination: str, message: Model):
+        self.sent.append((destination, message))
+
+    async def send_raw(self, destination: str, message_schema_digest: str, message_body, **kwargs):
+        self.sent.append((destination, message_body))
+
+
+def build_handler(tmp_path, max_requests: int):
+    dedup = MessageDedupCache("test")
+    proto = WeightedQuotaProtocol(
+        QuotaLedger(str(tmp_path / "quota.json")),
+        name="test",
+        version="0.1.0",
+        default_rate_limit=RateLimit(window_size_minutes=60, max_requests=max_requests),
+        default_acl=AccessControlList(default=True, blocked={BLOCKED}),
+    )
+
+    @proto.on_message(Request, replies={Reply, ErrorMessage}, dedup=dedup)
+    async def echo(ctx, sender: str, msg: Request):
+        return encode_message(Reply(text=msg.text))
+
+    return echo, dedup
+
+
+def test_answered_request_is_cached_and_replayed(tmp_path):
+    handler, dedup = build_handler(tmp_path, max_requests=1)
+    ctx = RecordingContext()
+    asyncio.run(handler(ctx, SENDER, Request(text="a")))
+    asyncio.run(handler(ctx, SENDER, Request(text="a")))
+
+    assert ctx.sent == [(SENDER, encode_message(Reply(text="a")).body)] * 2
+    assert (AGENT, SENDER, request_message_id(Request(text="a"))) in dedup.entries
+
+
+def test_rate_limited_request_is_refused_and_not_cached(tmp_path):
+    handler, dedup = build_handler(tmp_path, max_requests=1)
+    ctx = RecordingContext()
+    asyncio.run(handler(ctx, SENDER, Request(text="a")))
+    for _ in range(2):  # A retry of the refused request is refused again rather than failing
+        asyncio.run(handler(ctx, SENDER, Request(text="b")))
+
+    refusals = [message for _, message in ctx.sent[1:]]
+    assert len(refusals) == 2
+    assert all(isinstance(message, ErrorMessage) and "Rate limit" in message.error for message in refusals)
+    assert (AGENT, SENDER, request_message_id(Request(text="b"))) not in dedup.entries
+
+
+def test_access_denied_request_is_refused_and_not_cached(tmp_path):
+    handler, dedup = build_handler(tmp_path, max_requests=10)
+    ctx = RecordingContext()
+    asyncio.run(handler(ctx, BLOCKED, Request(text="a")))
+
+    [(destination, message)] = ctx.sent
+    assert destination == BLOCKED and isinstance(message, ErrorMessage)
+    assert not dedup.entries
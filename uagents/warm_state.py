@@ -0,0 +1,50 @@
+import os
+import time
+from typing import Optional
+
+from uagents import Context
+
+from chat_proto import llm_breaker, pending_turns, rate_limiter, requeue_turns, response_times
+from persistence import read_json, write_json_atomic
+from resolver_cache import endpoint_resolver
+
+WARM_STATE_VERSION = 1
+
+
+def save_warm_state(path: str, storage) -> dict:
+    """
+    Snapshot state that would otherwise be lost on restart: LLM latency history (which sets fallback
+    deadlines and hedge delays), the circuit breaker, the chat rate limiter, resolved endpoints and the
+    chat turns still owed an answer.
+    """
+    now = time.time()
+    state = {
+        "version": WARM_STATE_VERSION,
+        "saved_at": now,
+        "response_times": response_times.to_dict(),
+        "llm_breaker": llm_breaker.to_dict(),
+        "rate_limiter": [t for t in rate_limiter.request_times if now - t < 3600],
+        "resolver": endpoint_resolver.to_dict(),
+        "pending_turns": pending_turns(storage),
+    }
+    write_json_atomic(path, state)
+    return state
+
+
+async def restore_warm_state(path: str, ctx: Context) -> Optional[dict]:
+    """
+    Restore a snapshot written by save_warm_state and send its pending chat turns to the LLM again.
+    The file is removed afterwards, so a later crash can't replay the same state twice.
+    """
+    state = read_json(path)
+    if not state or state.get("version") != WARM_STATE_VERSION:
+        return None
+
+    downtime_seconds = max(0.0, time.time() - state["saved_at"])
+    response_times.restore(state["response_times"])
+    llm_breaker.restore(state["llm_breaker"], downtime_seconds)
+    rate_limiter.request_times = sorted(set(rate_limiter.request_times) | set(state["rate_limiter"]))
+    endpoint_resolver.restore(state["resolver"], downtime_seconds)
+    os.remove(path)
+    requeued = await requeue_turns(ctx, state["pending_turns"])
+    return {"downtime_seconds": downtime_seconds, "requeued_turns": requeued, "resolved_endpoints": len(state["resolver"]["entries"])}
@@ -0,0 +1,61 @@
+import json
+from functools import lru_cache
+from typing import NamedTuple
+
+from uagents import Context, Model
+
+from catalog import on_catalog_reload
+from metrics import metrics
+
+
+class EncodedMessage(NamedTuple):
+    schema_digest: str
+    body: str
+
+
+@lru_cache(maxsize=None)
+def schema_digest(model_class: type) -> str:
+    """Schema digest of a message model; computing it re-serializes the whole JSON schema, so do it once"""
+    return Model.build_schema_digest(model_class)
+
+
+def encode_message(message: Model) -> EncodedMessage:
+    return EncodedMessage(schema_digest(type(message)), message.model_dump_json())
+
+
+def json_fragment(value) -> str:
+    """Encode a value exactly like Model.model_dump_json does, for splicing into a cached body"""
+    return json.dumps(value)
+
+
+async def send_encoded(ctx: Context, destination: str, message: EncodedMessage):
+    """Send a pre-encoded message body, skipping per-message model validation and JSON encoding"""
+    # Mirrors ExternalContext.send, which passes the protocol digest and pending sync queries through
+    protocol = getattr(ctx, "_protocol", None)
+    return await ctx.send_raw(
+        destination=destination,
+        message_schema_digest=message.schema_digest,
+        message_body=message.body,
+        protocol_digest=protocol[0] if protocol else None,
+        queries=getattr(ctx, "_queries", None),
+    )
+
+
+class WirePayloadCache:
+    """Pre-encoded JSON fragments for catalog replies; cleared whenever the catalog is reloaded"""
+
+    def __init__(self):
+        self.fragments = {}
+        on_catalog_reload(self.clear)
+
+    def get(self, key, build) -> str:
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            metrics.increment("wire_cache_misses_total")
+            fragment = self.fragments[key] = build()
+        else:
+            metrics.increment("wire_cache_hits_total")
+        return fragment
+
+    def clear(self):
+        self.fragments.clear()